@@ -1,8 +1,8 @@
 import os
 import threading
-import sqlite3
-import pandas as pd
-from flask import Flask, request, jsonify
+import asyncio
+from flask import Flask, Response, request, jsonify, stream_with_context
+from werkzeug.utils import secure_filename
 try:
     from flask_cors import CORS
     cors_available = True
@@ -10,13 +10,26 @@ except ImportError:
     cors_available = False
 import requests
 from dotenv import load_dotenv
-import smtplib
-from email.mime.text import MIMEText
-from email.utils import formataddr
 import datetime
 import time
 import random
 import uuid
+import json
+from rate_limit import SendScheduler
+from send_engine import SendEngine, QuotaBook, Throughput, parse_accounts
+from suppression import SuppressionIndex, invalid_entries, is_mailbox_unknown, normalize
+from generation_cache import GenerationCache
+from llm_router import LLMRouter, parse_backends
+from jobs import JobQueue, UNFINISHED
+import ingest
+import metrics
+import email_template
+import email_logs
+import rendering
+import progress
+import db
+from schema import MIGRATIONS
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # --- Load environment variables ---
 load_dotenv()
@@ -27,14 +40,78 @@ if cors_available:
     CORS(app)
 
 # --- Config ---
-DB_FILE = 'backend/email_log.db'
-UPLOAD_FOLDER = 'backend/uploads'
-OLLAMA_URL = 'http://localhost:11434/api/generate'
+DB_FILE = os.getenv('DB_FILE', 'backend/email_log.db')
+UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'backend/uploads')
+OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434/api/generate')
 SMTP_SERVER = os.getenv('SMTP_SERVER')
 SMTP_PORT = int(os.getenv('SMTP_PORT', 465))
 SMTP_USER = os.getenv('SMTP_USER')
 SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
-LLAMA3_MODEL = 'llama3'
+SMTP_USE_SSL = os.getenv('SMTP_USE_SSL', 'true').lower() != 'false'
+# SMTP session pool: open sessions, messages per session before rotating, idle seconds before a NOOP probe
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', 2))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv('SMTP_MAX_MESSAGES_PER_CONNECTION', 100))
+SMTP_NOOP_AFTER = int(os.getenv('SMTP_NOOP_AFTER', 30))
+# Sender accounts: JSON list of {"user", "password", "host", "port", "use_ssl", "daily_quota", "sessions"};
+# keys left out (or no list at all) come from the SMTP_* settings. Recipients are spread over accounts
+# by rendezvous hashing; SEND_CONCURRENCY caps deliveries in flight (default: total sessions).
+SMTP_ACCOUNTS = os.getenv('SMTP_ACCOUNTS', '')
+SMTP_DAILY_QUOTA = int(os.getenv('SMTP_DAILY_QUOTA', 0))
+SEND_CONCURRENCY = int(os.getenv('SEND_CONCURRENCY', 0))
+# Adaptive send rate: starting messages/sec per sender account and per recipient domain (per-domain
+# overrides as JSON, e.g. {"gmail.com": 2}); rates climb on success and halve on 4xx deferrals.
+# Deferred messages are retried after SEND_BACKOFF_SECONDS (doubling) up to SEND_MAX_ATTEMPTS tries.
+SEND_RATE_PER_ACCOUNT = float(os.getenv('SEND_RATE_PER_ACCOUNT', 1.0))
+SEND_RATE_PER_DOMAIN = float(os.getenv('SEND_RATE_PER_DOMAIN', 0.5))
+SEND_DOMAIN_RATES = json.loads(os.getenv('SEND_DOMAIN_RATES', '{}'))
+SEND_BACKOFF_SECONDS = float(os.getenv('SEND_BACKOFF_SECONDS', 30))
+SEND_MAX_ATTEMPTS = int(os.getenv('SEND_MAX_ATTEMPTS', 5))
+# A message whose domain is throttled for longer than this is set aside instead of blocking the batch
+SEND_MAX_INLINE_WAIT = float(os.getenv('SEND_MAX_INLINE_WAIT', 2))
+LLAMA3_MODEL = os.getenv('LLAMA3_MODEL', 'llama3')
+# Extra Ollama generation options (temperature, num_predict, ...) as JSON; part of the cache key
+OLLAMA_OPTIONS = json.loads(os.getenv('OLLAMA_OPTIONS', '{}'))
+GENERATION_CACHE_FILE = os.getenv('GENERATION_CACHE_FILE', os.path.join(os.path.dirname(DB_FILE), 'generation_cache.db'))
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv('GENERATION_CACHE_MAX_ENTRIES', 50000))
+GENERATION_CACHE_MAX_MB = int(os.getenv('GENERATION_CACHE_MAX_MB', 200))
+# Generation concurrency: worker threads per job, and max requests in flight per model endpoint
+GENERATION_WORKERS = int(os.getenv('GENERATION_WORKERS', 4))
+GENERATION_MAX_WORKERS = int(os.getenv('GENERATION_MAX_WORKERS', 32))  # cap on a job's own worker count
+OLLAMA_MAX_IN_FLIGHT = int(os.getenv('OLLAMA_MAX_IN_FLIGHT', 4))
+# Several Ollama instances serving LLAMA3_MODEL: JSON list of {"url", "weight", "max_concurrency"} or
+# comma-separated URLs (default: just OLLAMA_URL). Failing backends are ejected and health-checked back in.
+OLLAMA_BACKENDS = os.getenv('OLLAMA_BACKENDS', '')
+OLLAMA_EJECT_AFTER = int(os.getenv('OLLAMA_EJECT_AFTER', 3))
+OLLAMA_EJECT_SECONDS = int(os.getenv('OLLAMA_EJECT_SECONDS', 30))
+OLLAMA_HEALTH_INTERVAL = int(os.getenv('OLLAMA_HEALTH_INTERVAL', 15))
+# 'full': the model writes the whole email; 'template': it only fills subject/opening/hook as JSON and
+# the fixed parts come from email_template.EMAIL_TEMPLATE (a fraction of the output tokens)
+GENERATION_MODE = os.getenv('GENERATION_MODE', 'full')
+# Stream tokens from Ollama and validate while generating (abort early on bad output)
+OLLAMA_STREAM = os.getenv('OLLAMA_STREAM', 'true').lower() != 'false'
+# 'generate' (/api/generate, one prompt) or 'chat' (/api/chat, the fixed instructions as a system message
+# and the lead's data as the user message). Either way every request starts with the same instructions,
+# which Ollama keeps in its KV cache; OLLAMA_KEEP_ALIVE (e.g. '30m') keeps the model and that cache loaded
+# between campaigns ('' = the server's default, 5 minutes)
+OLLAMA_API = os.getenv('OLLAMA_API', 'generate')
+OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '')
+# Template mode only: leads per Ollama request (1 = one request per lead). Leads whose part of a batched
+# answer is missing or invalid are generated again on their own
+GENERATION_BATCH_SIZE = int(os.getenv('GENERATION_BATCH_SIZE', 1))
+# Generations longer than this are cut off and retried; every email ends with EMAIL_SIGN_OFF
+MAX_EMAIL_WORDS = int(os.getenv('MAX_EMAIL_WORDS', 220))
+EMAIL_SIGN_OFF = 'www.pixelsolve.co'
+# Progress feed: min seconds between partial-text updates per recipient, SSE keepalive interval
+PARTIAL_PUBLISH_INTERVAL = float(os.getenv('PARTIAL_PUBLISH_INTERVAL', 0.5))
+SSE_KEEPALIVE_SECONDS = int(os.getenv('SSE_KEEPALIVE_SECONDS', 15))
+# Finished campaigns kept in memory (least recently used beyond this many, or idle this long, are
+# dropped and rebuilt from the DB on their next request)
+progress.MAX_SESSIONS = int(os.getenv('PROGRESS_MAX_SESSIONS', progress.MAX_SESSIONS))
+progress.SESSION_IDLE_SECONDS = int(os.getenv('PROGRESS_IDLE_SECONDS', progress.SESSION_IDLE_SECONDS))
+# Job queue: seconds a worker may hold a work item before it is handed to another worker,
+# and how many rows are parsed, normalized and enqueued per chunk while a sheet is being read
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 300))
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 10000))
 
 PROMPT_TEMPLATE = '''
 You are helping me generate a catchy, concise, and visually appealing cold email for my digital agency, PixelSolve.
@@ -91,62 +168,61 @@ Now, using the data below, generate the email as specified above. Output only th
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# --- SQLite Setup ---
+# --- SQLite Setup (schema versioned in schema.py, migrated on startup) ---
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS emails (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        email TEXT,
-        business_type TEXT,
-        status TEXT,
-        model_output TEXT,
-        error TEXT,
-        sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        session_id TEXT
-    )''')
-    # New table for sent log
-    c.execute('''CREATE TABLE IF NOT EXISTS sent_log (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        email TEXT,
-        subject TEXT,
-        body TEXT,
-        sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )''')
-    conn.commit()
-    conn.close()
+    return db.migrate(DB_FILE, MIGRATIONS)
 init_db()
 
-# --- In-memory progress cache ---
-progress_cache = {
-    'total': 0,
-    'done': 0,
-    'emails': {},  # email: {name, business, model_output, status, error}
-    'status': 'idle',
-    'error': '',
-    'filename': '',
-    'message': '',
-    'batch_total': 0,
-    'batch_current': 0,
-    'wait_time': 0,
-    'current_session_id': None
-}
+# --- Generation cache (lives next to the email log DB) ---
+generation_cache = GenerationCache(GENERATION_CACHE_FILE, max_entries=GENERATION_CACHE_MAX_ENTRIES,
+                                   max_bytes=GENERATION_CACHE_MAX_MB * 1024 * 1024)
+
+# --- Send engine: sender accounts, each with its own SMTP sessions (opened lazily on first send) ---
+send_scheduler = SendScheduler(account_rate=SEND_RATE_PER_ACCOUNT, domain_rate=SEND_RATE_PER_DOMAIN,
+                               domain_rates=SEND_DOMAIN_RATES, backoff_base=SEND_BACKOFF_SECONDS)
+send_engine = SendEngine(parse_accounts(SMTP_ACCOUNTS, {
+                             'user': SMTP_USER, 'password': SMTP_PASSWORD, 'host': SMTP_SERVER, 'port': SMTP_PORT,
+                             'use_ssl': SMTP_USE_SSL, 'daily_quota': SMTP_DAILY_QUOTA, 'sessions': SMTP_POOL_SIZE,
+                             'max_messages': SMTP_MAX_MESSAGES_PER_CONNECTION, 'noop_after': SMTP_NOOP_AFTER}),
+                         QuotaBook(DB_FILE), send_scheduler, concurrency=SEND_CONCURRENCY,
+                         max_inline_wait=SEND_MAX_INLINE_WAIT)
+
+# --- Upload dedup against earlier campaigns, plus bounce/unsubscribe suppression ---
+suppression_index = SuppressionIndex(DB_FILE)
+
+# --- Durable job queue (jobs + leased work items live in the email log DB) ---
+job_queue = JobQueue(DB_FILE, lease_seconds=JOB_LEASE_SECONDS)
+llm_router = LLMRouter(parse_backends(OLLAMA_BACKENDS, OLLAMA_URL, OLLAMA_MAX_IN_FLIGHT),
+                       eject_after=OLLAMA_EJECT_AFTER, eject_seconds=OLLAMA_EJECT_SECONDS,
+                       health_interval=OLLAMA_HEALTH_INTERVAL)
 
-# --- Helper: Extract email from contact field ---
-def extract_email(contact):
-    if not isinstance(contact, str):
-        return ''
-    import re
-    match = re.search(r'[\w\.-]+@[\w\.-]+', contact)
-    return match.group(0) if match else ''
+# --- Per-session progress, rebuilt from the DB after a restart ---
+def load_session_progress(session_id):
+    db.flush(DB_FILE)
+    rows = db.query(DB_FILE, 'SELECT name, email, business_type, model_output, status, error FROM emails WHERE session_id = ?', (session_id,))
+    jobs = job_queue.list_jobs(session_id=session_id, limit=1)
+    if not rows and not jobs:
+        return None
+    state = progress.new_state(session_id)
+    for name, email, business, model_output, status, error in rows:
+        state.set_email(email, {'name': name, 'business': business, 'model_output': model_output, 'status': status, 'error': error or ''}, publish=False)
+    state['done'] = state['total'] = len(rows)
+    if jobs:
+        job = jobs[0]
+        state['job_id'] = job['id']
+        state['status'] = 'done' if job['status'] == 'done' else job['status']
+        state['error'] = job['error'] or ''
+        state['filename'] = job['params'].get('filename', '')
+    return state
+
+def session_progress(session_id):
+    return progress.get_state(session_id, loader=load_session_progress)
 
 # --- Helper: Generate prompt for a recipient ---
-def build_prompt(recipient):
-    # Build the data block with LOCATION as a single field
-    location = f"{recipient.get('City', '').strip()}, {recipient.get('Country', '').strip()}".strip(', ')
-    data_block = f"""
+def build_data_block(recipient):
+    # Build the data block with LOCATION as a single field (combined once per chunk at ingest)
+    location = email_template.recipient_location(recipient)
+    return f"""
 Business Name: {recipient.get('Business Name', '')}
 Type: {recipient.get('Type', '')}
 LOCATION: {location}
@@ -156,47 +232,215 @@ Has Website: {recipient.get('Has Website', '')}
 Instagram Presence: {recipient.get('Instagram Presence', '')}
 Personalized Hook / Observation: {recipient.get('Personalized Hook / Observation', '')}
 """
-    return PROMPT_TEMPLATE + data_block
+
+def ollama_payload(instructions, data, json_format=False):
+    # instructions + data is the prompt (and the generation cache key) in both APIs
+    if OLLAMA_API == 'chat':
+        payload = {'model': LLAMA3_MODEL, 'stream': False,
+                   'messages': [{'role': 'system', 'content': instructions}, {'role': 'user', 'content': data}]}
+    else:
+        payload = {'model': LLAMA3_MODEL, 'prompt': instructions + data, 'stream': False}
+    if json_format:
+        payload['format'] = 'json'
+    if OLLAMA_OPTIONS:
+        payload['options'] = OLLAMA_OPTIONS
+    if OLLAMA_KEEP_ALIVE:
+        payload['keep_alive'] = OLLAMA_KEEP_ALIVE
+    return payload
+
+def response_text(chunk):
+    # /api/generate answers in 'response', /api/chat in 'message.content'
+    if 'message' in chunk:
+        return (chunk['message'] or {}).get('content', '')
+    return chunk.get('response', '')
+
+# --- Streaming generation ---
+def cut_at_sign_off(text):
+    # A full email ends with the 'Best regards / The PixelSolve Team / EMAIL_SIGN_OFF' block: returns the
+    # text up to it (dropping anything the model adds after), or None when it hasn't been reached
+    end = rendering.sign_off_end(text)
+    return text[:end] if end is not None else None
+
+def stream_generation(url, payload, check_output, on_partial=None, require_sign_off=False):
+    # Consumes Ollama's NDJSON chunks and validates the text as it grows. Returns (text, problem);
+    # leaving the `with` block closes the connection, which makes Ollama stop generating.
+    text = ''
+    with requests.post(url, json=dict(payload, stream=True), stream=True, timeout=90) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            text += response_text(chunk)
+            problem = check_output(text)
+            if problem:
+                return text, problem
+            if on_partial:
+                on_partial(text)
+            if require_sign_off:
+                complete = cut_at_sign_off(text)
+                # Only once the site's line has ended, so 'www.pixelsolve.co/...' isn't cut mid-URL
+                if complete is not None and (len(complete) < len(text) or chunk.get('done')):
+                    # Email is complete; stop generating here
+                    return complete, None
+            if chunk.get('done'):
+                break
+    if require_sign_off:
+        complete = cut_at_sign_off(text)
+        if complete is not None:
+            return complete, None
+        # Ran to the end without the sign-off: the email is cut short or rambled off
+        return text, 'no_sign_off'
+    return text, None
+
+def ollama_complete(payload, check_output, on_partial=None, stream=True, require_sign_off=False):
+    # One request to whichever backend the router picks; returns (text, problem).
+    # require_sign_off: the text is a full email, trimmed after EMAIL_SIGN_OFF and rejected without it
+    with llm_router.slot() as backend:
+        url = backend.base_url + '/api/chat' if 'messages' in payload else backend.url
+        if stream:
+            return stream_generation(url, payload, check_output, on_partial, require_sign_off)
+        response = requests.post(url, json=payload, timeout=90)
+        response.raise_for_status()
+        result = response_text(response.json())
+        if require_sign_off:
+            complete = cut_at_sign_off(result)
+            if complete is None:
+                return result, check_output(result) or 'no_sign_off'
+            result = complete
+        return result, check_output(result)
 
 # --- AI Email Generation ---
-def generate_email_with_llama3(recipient):
-    def contains_placeholder(text):
-        import re
-        # Check for [Location], [LOCATION], [City], [Country] (case-insensitive)
-        return bool(re.search(r'\[(location|city|country)\]', text, re.IGNORECASE))
+def generate_email_with_llama3(recipient, on_partial=None):
+    if GENERATION_MODE == 'template':
+        return generate_email_from_template(recipient)
+
+    def check_output(text):
+        if rendering.contains_placeholder(text):
+            return 'placeholder'
+        if len(text.split()) > MAX_EMAIL_WORDS:
+            return 'too_long'
+        return None
 
-    prompt = build_prompt(recipient)
+    data_block = build_data_block(recipient)
     max_attempts = 3
     attempt = 0
     extra_instruction = ("\nIMPORTANT: If you are about to use a placeholder like [Location], [LOCATION], [City], or [Country], instead use the real location provided in the data, or omit the location if not available. Never output any placeholder in the email. Regenerate the email accordingly.\n")
     last_result = ''
     last_error = None
+    last_problem = None
+    failovers = 0
     while attempt < max_attempts:
         try:
-            this_prompt = prompt
+            instructions = PROMPT_TEMPLATE
             if attempt > 0:
                 # Add extra instruction for subsequent attempts
-                this_prompt = PROMPT_TEMPLATE + "\n" + extra_instruction + build_prompt(recipient).split(PROMPT_TEMPLATE, 1)[-1]
-            response = requests.post(
-                OLLAMA_URL,
-                json={'model': LLAMA3_MODEL, 'prompt': this_prompt, 'stream': False},
-                timeout=90
-            )
-            result = response.json().get('response', '')
+                instructions = PROMPT_TEMPLATE + "\n" + extra_instruction
+            cache_key = generation_cache.make_key(LLAMA3_MODEL, instructions + data_block, OLLAMA_OPTIONS)
+            cached = generation_cache.get(cache_key)
+            if cached is not None:
+                return cached, None
+            payload = ollama_payload(instructions, data_block)
+            result, problem = ollama_complete(payload, check_output, on_partial, stream=OLLAMA_STREAM, require_sign_off=True)
             last_result = result
             last_error = None
-            if not contains_placeholder(result):
+            last_problem = problem
+            if not problem:
+                # Only clean outputs are cached, so a bad generation is never replayed
+                generation_cache.put(cache_key, LLAMA3_MODEL, result)
                 return result, None
+        except requests.RequestException as e:
+            # That backend is down or erroring; try the same prompt on another one
+            if failovers < len(llm_router.backends) - 1 and llm_router.live_count():
+                failovers += 1
+                metrics.GENERATION_RETRIES.inc(reason='failover')
+                continue
+            last_result = ''
+            last_error = f"[AI GENERATION ERROR: {e}]"
+            break
         except Exception as e:
             last_result = ''
             last_error = f"[AI GENERATION ERROR: {e}]"
             break
         attempt += 1
-    # If we reach here, either error or still contains placeholder after max attempts
-    if last_result and contains_placeholder(last_result):
+        if attempt < max_attempts:
+            metrics.GENERATION_RETRIES.inc(reason=last_problem)
+    # If we reach here, either error or still invalid after max attempts
+    if last_result and last_problem == 'placeholder':
         last_error = '[AI GENERATION ERROR: Placeholder like [Location] still present after retries.]'
+    elif last_result and last_problem == 'too_long':
+        last_error = f'[AI GENERATION ERROR: Output still longer than {MAX_EMAIL_WORDS} words after retries.]'
+    elif last_result and last_problem == 'no_sign_off':
+        last_error = f"[AI GENERATION ERROR: Output still missing the '{EMAIL_SIGN_OFF}' sign-off after retries.]"
     return last_result, last_error
 
+def generate_email_from_template(recipient):
+    # The model returns {"subject", "opening", "hook"}; Ollama's JSON mode keeps it to a parseable object
+    data_block = email_template.slot_data_block(recipient)
+    extra_instruction = '\nIMPORTANT: Your previous answer was not usable. Reply with the JSON object only, using real values and no [placeholders], within the length limits.\n'
+    options = dict(OLLAMA_OPTIONS, format='json')
+    attempt = 0
+    failovers = 0
+    problem = None
+    while attempt < 3:
+        this_data = data_block if attempt == 0 else data_block + extra_instruction
+        cache_key = generation_cache.make_key(LLAMA3_MODEL, email_template.SLOT_PROMPT + this_data, options)
+        raw = generation_cache.get(cache_key)
+        cached = raw is not None
+        if not cached:
+            payload = ollama_payload(email_template.SLOT_PROMPT, this_data, json_format=True)
+            try:
+                raw, _ = ollama_complete(payload, lambda text: None, stream=False)
+            except requests.RequestException as e:
+                if failovers < len(llm_router.backends) - 1 and llm_router.live_count():
+                    failovers += 1
+                    metrics.GENERATION_RETRIES.inc(reason='failover')
+                    continue
+                return '', f"[AI GENERATION ERROR: {e}]"
+            except Exception as e:
+                return '', f"[AI GENERATION ERROR: {e}]"
+        slots, problem = email_template.parse_slots(raw)
+        if not problem:
+            if not cached:
+                generation_cache.put(cache_key, LLAMA3_MODEL, raw)
+            return email_template.render_email(recipient, slots), None
+        attempt += 1
+        if attempt < 3:
+            metrics.GENERATION_RETRIES.inc(reason=problem)
+    if problem == 'placeholder':
+        return '', '[AI GENERATION ERROR: Placeholder like [Location] still present after retries.]'
+    if problem == 'too_long':
+        return '', '[AI GENERATION ERROR: Personalized fields still too long after retries.]'
+    return '', '[AI GENERATION ERROR: Model did not return the expected JSON fields.]'
+
+def generate_emails_from_template(recipients):
+    # Template mode, several leads in one request: the shared instructions are processed once per batch
+    # instead of once per lead. Each lead's slots are validated on their own and cached under the same key
+    # as a single-lead request; leads the batch didn't produce cleanly fall back to generate_email_from_template.
+    options = dict(OLLAMA_OPTIONS, format='json')
+    results = [None] * len(recipients)
+    keys = [generation_cache.make_key(LLAMA3_MODEL, email_template.build_slot_prompt(r), options) for r in recipients]
+    todo = []
+    for i, key in enumerate(keys):
+        slots, problem = email_template.parse_slots(generation_cache.get(key))
+        if problem:
+            todo.append(i)
+        else:
+            results[i] = (email_template.render_email(recipients[i], slots), None)
+    if len(todo) > 1:
+        payload = ollama_payload(email_template.BATCH_SLOT_PROMPT, email_template.batch_data_block([recipients[i] for i in todo]), json_format=True)
+        try:
+            raw, _ = ollama_complete(payload, lambda text: None, stream=False)
+        except Exception:
+            raw = ''
+        for i, (slots, problem) in zip(todo, email_template.parse_batch(raw, [recipients[i] for i in todo])):
+            if problem:
+                metrics.GENERATION_RETRIES.inc(reason='batch_fallback')
+                continue
+            generation_cache.put(keys[i], LLAMA3_MODEL, json.dumps(slots, ensure_ascii=False))
+            results[i] = (email_template.render_email(recipients[i], slots), None)
+    return [result or generate_email_from_template(r) for r, result in zip(recipients, results)]
+
 # --- Helper: Generate a new session ID ---
 def generate_session_id():
     return str(uuid.uuid4())
@@ -205,211 +449,443 @@ def generate_session_id():
 @app.route('/api/upload', methods=['POST'])
 def upload_excel():
     file = request.files.get('file')
-    if not file or not file.filename.endswith('.xlsx'):
+    if not file or not ingest.is_supported(file.filename):
         return jsonify({'error': 'Invalid file type'}), 400
-    filepath = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(filepath)
-    df = pd.read_excel(filepath, engine='openpyxl')
-    recipients = []
-    seen_emails = set()
+    workers = request.form.get('workers', '').strip()
+    if workers and not (workers.isdigit() and int(workers) >= 1):
+        return jsonify({'error': 'workers must be a positive whole number'}), 400
+    workers = min(int(workers), GENERATION_MAX_WORKERS) if workers else None
     session_id = generate_session_id()
-    # Connect to DB to check for already sent/ready emails
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('SELECT email FROM emails WHERE status IN ("SENT", "Ready")')
-    already_in_db = set(row[0].lower() for row in c.fetchall() if row[0])
-    conn.close()
-    for _, row in df.iterrows():
-        r = {k.strip(): str(row.get(k, '')).strip() for k in df.columns}
-        r['Email'] = r.get('Email', extract_email(r.get('Contact', '')))
-        email = r['Email'].lower()
-        # Skip if email is missing, empty, nan, duplicate in file, or already in db
-        if not email or email == 'nan' or email in seen_emails or email in already_in_db:
-            continue
-        seen_emails.add(email)
-        r['session_id'] = session_id
-        recipients.append(r)
-    progress_cache['filename'] = file.filename
-    progress_cache['message'] = f"File '{file.filename}' uploaded. {len(recipients)} unique, valid emails will be generated and sent."
-    progress_cache['current_session_id'] = session_id
-    thread = threading.Thread(target=background_generate_emails, args=(recipients, session_id), daemon=True)
-    thread.start()
-    return jsonify({'status': 'started', 'total': len(recipients), 'filename': file.filename, 'message': progress_cache['message'], 'session_id': session_id})
+    # One file per job, so a re-uploaded name can't overwrite a sheet another job is still reading
+    filename = secure_filename(file.filename)
+    if not ingest.is_supported(filename):
+        # secure_filename drops non-ASCII characters, and with an all non-ASCII name the extension's dot too
+        filename = 'leads' + os.path.splitext(file.filename)[1].lower()
+    filepath = os.path.join(UPLOAD_FOLDER, f'{session_id}_{filename}')
+    file.save(filepath)
+    # Rows are parsed lazily by the generation job; this is only an upper bound
+    estimated_rows = ingest.estimate_rows(filepath)
+    job_id = job_queue.create_job('generate', session_id, {'filepath': filepath, 'filename': file.filename, 'workers': workers})
+    state = session_progress(session_id)
+    state['filename'] = file.filename
+    rows_msg = f"Up to {estimated_rows} rows are" if estimated_rows is not None else "Rows are"
+    state['message'] = f"File '{file.filename}' uploaded. {rows_msg} being parsed; unique, valid emails will be generated as they are read."
+    state['job_id'] = job_id
+    state['status'] = 'generating'
+    progress.set_latest(session_id)
+    start_job(job_id)
+    return jsonify({'status': 'started', 'total': estimated_rows, 'filename': file.filename, 'message': state['message'], 'session_id': session_id, 'job_id': job_id})
 
 @app.route('/api/progress', methods=['GET'])
 def get_progress():
+    # Full snapshot by default; ?mode=summary drops the email rows, ?offset=&limit= pages through them.
+    # 'seq' is the last delta included, for resuming /api/progress/stream.
+    session_id = request.args.get('session_id') or progress.latest_session_id
+    mode = request.args.get('mode', 'full')
+    offset = request.args.get('offset', type=int)
+    limit = request.args.get('limit', type=int)
     try:
-        return jsonify(progress_cache)
+        state = session_progress(session_id) if session_id else progress.new_state(None)
+        snap = state.snapshot()
+        counts = {}
+        for row in snap['emails'].values():
+            counts[row['status']] = counts.get(row['status'], 0) + 1
+        snap['status_counts'] = counts
+        if mode == 'summary':
+            snap['emails'] = {}
+        elif offset is not None or limit is not None:
+            items = list(snap['emails'].items())
+            offset = offset or 0
+            page = items[offset:offset + limit] if limit is not None else items[offset:]
+            snap['emails'] = dict(page)
+            snap['emails_total'] = len(items)
+            snap['offset'] = offset
+        return jsonify(snap)
     except Exception as e:
         return jsonify({'total': 0, 'done': 0, 'emails': {}, 'status': 'error', 'error': str(e)})
 
-# --- Background Thread for AI Generation ---
-def background_generate_emails(recipients, session_id):
-    progress_cache['status'] = 'generating'
-    progress_cache['done'] = 0
-    progress_cache['total'] = len(recipients)
-    progress_cache['emails'] = {}
-    progress_cache['error'] = ''
-    for r in recipients:
-        email = r['Email']
-        name = r.get('Business Name', '')
-        business = r.get('Type', '')
-        model_output, error = generate_email_with_llama3(r)
-        status = 'Ready' if not error else 'FAILED'
-        progress_cache['emails'][email] = {
-            'name': name,
-            'business': business,
-            'model_output': model_output,
-            'status': status,
-            'error': error or ''
-        }
-        # Save to DB with session_id
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute('''INSERT INTO emails (name, email, business_type, status, model_output, error, session_id) VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                  (name, email, business, status, model_output, error or '', session_id))
-        conn.commit()
-        conn.close()
-        progress_cache['done'] += 1
-    progress_cache['status'] = 'done'
+@app.route('/api/progress/events', methods=['GET'])
+def get_progress_events():
+    # Long-poll: deltas after ?since=, waiting up to ?timeout= seconds for the first one
+    session_id = request.args.get('session_id') or progress.latest_session_id
+    since = request.args.get('since', 0, type=int)
+    timeout = min(request.args.get('timeout', 25, type=float), 60)
+    if not session_id:
+        return jsonify({'events': [], 'seq': 0, 'reset': False})
+    feed = session_progress(session_id).feed
+    events, reset = feed.since(since, timeout)
+    return jsonify({'events': events, 'seq': events[-1]['seq'] if events else feed.seq, 'reset': reset})
+
+@app.route('/api/progress/stream', methods=['GET'])
+def stream_progress():
+    # Server-sent events: one 'message' per delta (id = seq); resumes from Last-Event-ID or ?since=
+    session_id = request.args.get('session_id') or progress.latest_session_id
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', 0, type=int)
+    if not session_id:
+        return jsonify({'error': 'No session_id provided or found.'}), 400
+    feed = session_progress(session_id).feed
+
+    def events():
+        seq = since
+        yield 'retry: 2000\n\n'
+        while True:
+            batch, reset = feed.since(seq, timeout=SSE_KEEPALIVE_SECONDS)
+            if reset:
+                # Client fell too far behind; it should reload /api/progress and reconnect
+                yield f'event: reset\ndata: {json.dumps({"seq": feed.seq})}\n\n'
+                return
+            if not batch:
+                yield ': keepalive\n\n'
+                continue
+            for event in batch:
+                yield f'id: {event["seq"]}\ndata: {json.dumps(event)}\n\n'
+            seq = batch[-1]['seq']
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify({'jobs': job_queue.list_jobs(session_id=request.args.get('session_id'))})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found.'}), 404
+    if request.args.get('timings'):
+        # Where this job's time went (seconds per phase), for jobs run by this process
+        job['timings'] = metrics.job_timings.get(job_id)
+    return jsonify(job)
+
+# --- Job runner ---
+def start_job(job_id):
+    thread = threading.Thread(target=run_job, args=(job_id,), daemon=True)
+    thread.start()
+    return thread
+
+def run_job(job_id):
+    job = job_queue.get_job(job_id)
+    if not job or job['status'] not in UNFINISHED:
+        return
+    state = session_progress(job['session_id'])
+    metrics.job_timings.start(job_id)
+    start = time.perf_counter()
+    status = 'done'
+    try:
+        with metrics.job_context(job_id):
+            JOB_HANDLERS[job['kind']](job, state)
+        job_queue.set_status(job_id, 'done', state['error'])
+    except Exception as e:
+        status = 'failed'
+        state['status'] = 'error'
+        state['error'] = str(e)
+        job_queue.set_status(job_id, 'failed', str(e))
+    finally:
+        metrics.job_timings.stop(job_id)
+        metrics.JOB_SECONDS.observe(time.perf_counter() - start, kind=job['kind'], status=status)
+
+def resume_jobs():
+    # Restart every job a previous process left queued or running; expired leases are re-leased
+    for job in job_queue.unfinished_jobs():
+        start_job(job['id'])
+
+# --- Background Job for AI Generation ---
+def record_generated_email(recipient, model_output, error, session_id, state):
+    email = recipient['Email']
+    name = recipient.get('Business Name', '')
+    business = recipient.get('Type', '')
+    status = 'Ready' if not error else 'FAILED'
+    state.set_email(email, {
+        'name': name,
+        'business': business,
+        'model_output': model_output,
+        'status': status,
+        'error': error or ''
+    })
+    # Row for the DB with session_id and the subject/body the send path will use; the caller commits it
+    # together with the job item's completion
+    subject, body = rendering.parse_model_output(model_output)
+    insert = ('''INSERT INTO emails (name, email, business_type, status, model_output, error, session_id, country, subject, body) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                 ON CONFLICT DO NOTHING''',
+              (name, email, business, status, model_output, error or '', session_id, ingest.recipient_country(recipient), subject, body))
+    state['done'] += 1
+    return status, [insert]
+
+def ingest_job_rows(job, state):
+    # Streams the uploaded sheet into job items; resumes after the last row a previous run enqueued
+    job_id, session_id = job['id'], job['session_id']
+    try:
+        start_row = job_queue.last_seq(job_id) + 1
+        seen = job_queue.item_values(job_id, 'Email') if start_row else None
+        with metrics.job_context(job_id):
+            chunk_start = time.perf_counter()
+            # First row goes out on its own so generation starts while the rest is parsed
+            for frame in ingest.iter_recipient_chunks(job['params']['filepath'], session_id, start_row=start_row,
+                                                      chunk_size=INGEST_BATCH_SIZE, first_chunk=1, seen=seen):
+                # One bulk lookup per chunk against earlier campaigns and the suppression list
+                blocked = suppression_index.blocked(frame[ingest.KEY])
+                fresh = frame[~frame[ingest.KEY].isin(list(blocked))]
+                state['total'] += job_queue.add_items(job_id, ingest.to_payloads(fresh), seqs=fresh['_row'].tolist())
+                metrics.INGEST_CHUNK_SECONDS.observe(time.perf_counter() - chunk_start)
+                chunk_start = time.perf_counter()
+    except Exception as e:
+        # A parse error stops ingestion; rows already queued still finish
+        state['error'] = f'Failed to read lead sheet: {e}'
+    job_queue.mark_ingest_done(job_id)
+
+def run_generate_job(job, state, read_sheet=True):
+    # read_sheet=False: only generate items queued by another process (pixelsolve.py --processes)
+    job_id, session_id = job['id'], job['session_id']
+    # Jobs started from the CLI (or before the cap) can carry any count
+    workers = min(max(job['params'].get('workers') or GENERATION_WORKERS, 1), GENERATION_MAX_WORKERS)
+    state['status'] = 'generating'
+    state['job_id'] = job_id
+    state['total'] = job['total']
+    state['done'] = job['done']
+    state['error'] = ''
+    if read_sheet and not job['ingest_done']:
+        threading.Thread(target=ingest_job_rows, args=(job, state), daemon=True).start()
+
+    def show_partial(r):
+        # Partial text appears in the progress feed while the model is still writing,
+        # published at most every PARTIAL_PUBLISH_INTERVAL seconds per recipient
+        last_published = [0.0]
+
+        def on_partial(text):
+            now = time.monotonic()
+            if now - last_published[0] < PARTIAL_PUBLISH_INTERVAL:
+                return
+            last_published[0] = now
+            state.set_email(r['Email'], {
+                'name': r.get('Business Name', ''),
+                'business': r.get('Type', ''),
+                'model_output': text,
+                'status': 'Generating',
+                'error': ''
+            })
+        return on_partial
+
+    def generate(batch):
+        # batch: [(item_id, recipient)], more than one only in template mode with GENERATION_BATCH_SIZE > 1
+        with metrics.job_context(job_id):
+            start = time.perf_counter()
+            if len(batch) > 1:
+                outputs = generate_emails_from_template([r for _, r in batch])
+            else:
+                outputs = [generate_email_with_llama3(batch[0][1], on_partial=show_partial(batch[0][1]))]
+            seconds = (time.perf_counter() - start) / len(batch)
+            for _, error in outputs:
+                metrics.GENERATION_SECONDS.observe(seconds, mode=GENERATION_MODE, outcome='failed' if error else 'ok')
+        return [(item_id, r, output) for (item_id, r), output in zip(batch, outputs)]
+
+    batch_size = max(GENERATION_BATCH_SIZE, 1) if GENERATION_MODE == 'template' else 1
+    # Only lease what a worker can start right away, and keep renewing the leases of batches in flight: one
+    # generation can outlast a lease (retries, waiting for a backend slot), and a lapsed lease would let the
+    # item be generated twice
+    renew_every = job_queue.lease_seconds / 3
+    next_renew = time.monotonic() + renew_every
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='generate') as pool:
+        pending = {}  # future: item ids
+        while True:
+            if len(pending) < workers:
+                leased = job_queue.lease(job_id, (workers - len(pending)) * batch_size)
+                for i in range(0, len(leased), batch_size):
+                    batch = leased[i:i + batch_size]
+                    pending[pool.submit(generate, batch)] = [item_id for item_id, _ in batch]
+            if not pending:
+                if job_queue.get_job(job_id)['ingest_done'] and not job_queue.outstanding(job_id):
+                    break
+                time.sleep(0.2)
+                continue
+            if time.monotonic() >= next_renew:
+                job_queue.renew([item_id for ids in pending.values() for item_id in ids])
+                next_renew = time.monotonic() + renew_every
+            done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            for f in done:
+                del pending[f]
+                for item_id, r, (model_output, error) in f.result():
+                    status, writes = record_generated_email(r, model_output, error, session_id, state)
+                    job_queue.complete(job_id, item_id, 'done' if status == 'Ready' else 'failed', error or '', writes)
+    state['status'] = 'done'
+
+def background_generate_emails(recipients, session_id, workers=None):
+    # Generate a known list of recipients as a job, in the calling thread
+    job_id = job_queue.create_job('generate', session_id, {'workers': workers}, ingest_done=True)
+    job_queue.add_items(job_id, list(recipients))
+    progress.set_latest(session_id)
+    run_job(job_id)
+    return job_id
 
 # --- Email Sending Logic ---
+# Per job kind: progress status while running, status written on success, and whether successes go to
+# sent_log (the rows each kind picks up are chosen in enqueue_send_job)
+SEND_JOB_KINDS = {
+    'send': {'status': 'sending', 'sent_status': 'SENT', 'log_sent': True},
+    'retry_failed': {'status': 'retrying', 'sent_status': 'SENT', 'log_sent': True},
+    'resend': {'status': 'resending', 'sent_status': 'RESENT', 'log_sent': False},
+}
+
+def enqueue_send_job(kind, session_id, batch_size, delay_range, emails=None):
+    # Make rows still sitting in the group-commit window visible first
+    db.flush(DB_FILE)
+    c = db.get_conn(DB_FILE).cursor()
+    if kind == 'send' and session_id:
+        c.execute('SELECT id, name, email, business_type, model_output, session_id, country, subject, body FROM emails WHERE status = "Ready" AND session_id = ?', (session_id,))
+    elif kind == 'send':
+        c.execute('SELECT id, name, email, business_type, model_output, session_id, country, subject, body FROM emails WHERE status = "Ready"')
+    elif kind == 'retry_failed':
+        c.execute('SELECT id, name, email, business_type, model_output, session_id, country, subject, body FROM emails WHERE status = "FAILED"')
+    else:
+        placeholders = ','.join('?' for _ in emails)
+        c.execute(f'SELECT id, name, email, business_type, model_output, session_id, country, subject, body FROM emails WHERE email IN ({placeholders}) AND status = "SENT"', tuple(emails))
+    rows = c.fetchall()
+    # Never send to addresses that bounced or unsubscribed since the email was generated
+    suppressed = suppression_index.blocked((row[2] for row in rows), include_contacted=False)
+    rows = [row for row in rows if normalize(row[2]) not in suppressed]
+    params = {'batch_size': batch_size, 'delay_range': list(delay_range)}
+    job_id = job_queue.create_job(kind, session_id, params, ingest_done=True)
+    job_queue.add_items(job_id, [dict(zip(['id', 'name', 'email', 'business_type', 'model_output', 'session_id', 'country', 'subject', 'body'], row)) for row in rows])
+    # Report the new status right away so pollers don't see the previous job's 'done'
+    state = session_progress(session_id)
+    state['status'] = SEND_JOB_KINDS[kind]['status']
+    state['job_id'] = job_id
+    return job_id
+
+def run_send_job(job, state):
+    asyncio.run(deliver_send_job(job, state))
+
+async def deliver_send_job(job, state):
+    # Keeps up to send_engine.concurrency deliveries in flight across all sender accounts; after every
+    # batch_size attempted messages, dispatching pauses for a random delay_range wait (0, 0 = no pauses)
+    job_id, kind = job['id'], job['kind']
+    cfg = SEND_JOB_KINDS[kind]
+    batch_size = job['params']['batch_size']
+    delay_range = tuple(job['params']['delay_range'])
+    state['status'] = cfg['status']
+    state['job_id'] = job_id
+    state['batch_total'] = -(-job['total'] // batch_size)
+    state['batch_current'] = job['done'] // batch_size
+    sent_emails = set()
+    throughput = Throughput()
+    sessions = send_engine.sessions()
+
+    async def send_item(item_id, row):
+        email, model_output = row['email'], row['model_output']
+        subject, body = row.get('subject'), row.get('body')
+        if subject is None or body is None:
+            # Rows and queued items from before subject/body were stored
+            subject, body = rendering.parse_model_output(model_output)
+        attempts = await asyncio.to_thread(job_queue.attempts, item_id)
+        delivery = await send_engine.deliver(sessions, email, subject, body, attempts, SEND_MAX_ATTEMPTS)
+        throughput.record(delivery)
+        if delivery.outcome in ('deferred', 'held'):
+            # Requeued: 4xx from the provider, or held back by our own rate limit / the daily quotas
+            sent_emails.discard(email)
+            await asyncio.to_thread(job_queue.defer, item_id, delivery.delay, delivery.error, refund=delivery.outcome == 'held')
+            if delivery.error:
+                state.update_email(email, status='DEFERRED', error=delivery.error)
+            return delivery.outcome == 'deferred'
+        writes = []
+        if delivery.outcome == 'sent':
+            status, error = cfg['sent_status'], ''
+            if cfg['log_sent']:
+                writes += sent_log_writes(row, subject, body, delivery.account.user)
+        else:
+            status, error = 'FAILED', delivery.error
+            if is_mailbox_unknown(delivery.code, delivery.error):
+                await asyncio.to_thread(suppression_index.add, [email], 'bounce', f'{delivery.code} from {delivery.account.user}')
+        if 'id' in row:
+            writes.append(('UPDATE emails SET status=?, error=? WHERE id=?', (status, error, row['id'])))
+        else:
+            # Items queued before rows were keyed by id
+            writes.append(('UPDATE emails SET status=?, error=? WHERE email=? AND model_output=?', (status, error, email, model_output)))
+        state.update_email(email, status=status, error=error)
+        # Sent log, rollup, email status and the item's completion commit together
+        job_queue.complete(job_id, item_id, 'failed' if status == 'FAILED' else 'done', error, writes)
+        return True
+
+    # Queue and suppression calls block on SQLite, so they run in worker threads (asyncio.to_thread) rather
+    # than stall every delivery in flight on the event loop
+    in_flight = set()
+    attempted = 0
+    next_batch_at = batch_size
+    try:
+        while True:
+            items = []
+            if len(in_flight) < send_engine.concurrency:
+                items = await asyncio.to_thread(job_queue.lease, job_id, send_engine.concurrency - len(in_flight))
+            for item_id, row in items:
+                if kind == 'send' and row['email'] in sent_emails:
+                    job_queue.complete(job_id, item_id, 'skipped')
+                    continue  # Deduplicate within session
+                sent_emails.add(row['email'])
+                in_flight.add(asyncio.create_task(send_item(item_id, row)))
+            if not in_flight:
+                if items:
+                    continue
+                if not await asyncio.to_thread(job_queue.outstanding, job_id):
+                    break
+                # Items deferred for a retry, or still leased by a previous (crashed) run; wait for their leases to lapse
+                await asyncio.sleep(1)
+                continue
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            attempted += sum(1 for task in done if task.result())
+            state['throughput'] = throughput.snapshot()
+            if attempted >= next_batch_at:
+                next_batch_at += batch_size
+                state['batch_current'] = min(state['batch_current'] + 1, state['batch_total'])
+                if any(delay_range) and await asyncio.to_thread(job_queue.outstanding, job_id):
+                    # Deliveries already in flight finish during the pause; nothing new starts
+                    state['status'] = f'waiting_batch_{state["batch_current"]}'
+                    wait_time = random.randint(*delay_range)
+                    state['wait_time'] = wait_time
+                    await asyncio.sleep(wait_time)
+                    state['status'] = cfg['status']
+    finally:
+        for task in in_flight:
+            task.cancel()
+        await sessions.close()
+    send_engine.close_idle()
+    state['status'] = 'done'
+    state['batch_current'] = state['batch_total']
+    state['wait_time'] = 0
+
+def sent_log_writes(row, subject, body, account=''):
+    # Sent log row plus the matching stats rollup bump, for the caller to commit together
+    session_id = row.get('session_id') or ''
+    country = row.get('country') or 'Unknown'
+    business_type = row.get('business_type') or 'Unknown'
+    send_day = datetime.date.today().isoformat()
+    return [
+        ('''INSERT INTO sent_log (name, email, subject, body, country, business_type, send_day, session_id, account) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+         (row['name'], row['email'], subject, body, country, business_type, send_day, session_id, account)),
+        ('''INSERT INTO stats_rollup (session_id, day, country, business_type, sent) VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT (session_id, day, country, business_type) DO UPDATE SET sent = sent + 1''',
+         (session_id, send_day, country, business_type)),
+    ]
+
+JOB_HANDLERS = {
+    'generate': run_generate_job,
+    'send': run_send_job,
+    'retry_failed': run_send_job,
+    'resend': run_send_job,
+}
+
 @app.route('/api/send', methods=['POST'])
 def send_emails():
     data = request.get_json(silent=True) or {}
     batch_size = int(data.get('batch_size', 10))
     delay_min = int(data.get('delay_min', 8))
     delay_max = int(data.get('delay_max', 15))
-    session_id = data.get('session_id') or progress_cache.get('current_session_id')
+    session_id = data.get('session_id') or progress.latest_session_id
     if not session_id:
         return jsonify({'error': 'No session_id provided or found.'}), 400
-    thread = threading.Thread(target=send_all_emails, args=(batch_size, (delay_min, delay_max), session_id), daemon=True)
-    thread.start()
-    return jsonify({'status': 'sending', 'batch_size': batch_size, 'delay_range': [delay_min, delay_max], 'session_id': session_id})
-
-def send_all_emails(batch_size=10, delay_range=(8, 15), session_id=None):
-    progress_cache['status'] = 'sending'
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    if session_id:
-        c.execute('SELECT name, email, business_type, model_output FROM emails WHERE status = "Ready" AND session_id = ?', (session_id,))
-    else:
-        c.execute('SELECT name, email, business_type, model_output FROM emails WHERE status = "Ready"')
-    rows = c.fetchall()
-    total = len(rows)
-    batches = [rows[i:i+batch_size] for i in range(0, total, batch_size)]
-    progress_cache['batch_total'] = len(batches)
-    progress_cache['batch_current'] = 0
-    import re  # For post-processing
-    sent_emails = set()
-    for batch_num, batch in enumerate(batches, 1):
-        progress_cache['batch_current'] = batch_num
-        for row in batch:
-            name, email, business, model_output = row
-            if email in sent_emails:
-                continue  # Deduplicate within session
-            sent_emails.add(email)
-            try:
-                lines = model_output.splitlines()
-                subject_line = next((l for l in lines if l.strip().lower().startswith('subject:')), lines[0] if lines else 'PixelSolve Cold Email')
-                subject = subject_line.replace('**', '').replace('Subject:', '').strip()
-                body_start = next((i for i, l in enumerate(lines) if l.strip().lower().startswith('hi') or l.strip().lower().startswith('hello')), 1)
-                body = '\n'.join(lines[body_start:]).lstrip('\n')
-                # Post-process: remove 'in ,' or 'in  ' (with nothing after 'in')
-                body = re.sub(r'\bin\s*,', '', body)
-                body = re.sub(r'\bin\s+$', '', body)
-                # Post-process: ensure 'with:' is always followed by a newline
-                body = re.sub(r'(with:)\s*', r'\1\n', body)
-                msg = MIMEText(body, 'plain')
-                msg['Subject'] = subject
-                msg['From'] = formataddr(("The PixelSolve Team", SMTP_USER))
-                msg['To'] = email
-                with smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT) as server:
-                    server.login(SMTP_USER, SMTP_PASSWORD)
-                    server.sendmail(SMTP_USER, [email], msg.as_string())
-                status, error = 'SENT', ''
-                # Log sent email after successful send
-                c.execute('''INSERT INTO sent_log (name, email, subject, body) VALUES (?, ?, ?, ?)''', (name, email, subject, body))
-                conn.commit()
-            except Exception as e:
-                if 'rate' in str(e).lower() or 'limit' in str(e).lower():
-                    progress_cache['status'] = 'rate_limited_waiting'
-                    time.sleep(60)
-                    continue
-                status, error = 'FAILED', str(e)
-            c.execute('UPDATE emails SET status=?, error=? WHERE email=? AND model_output=?', (status, error, email, model_output))
-            conn.commit()
-            if email in progress_cache['emails']:
-                progress_cache['emails'][email]['status'] = status
-                progress_cache['emails'][email]['error'] = error
-        if batch_num < len(batches):
-            progress_cache['status'] = f'waiting_batch_{batch_num}'
-            wait_time = random.randint(*delay_range)
-            progress_cache['wait_time'] = wait_time
-            time.sleep(wait_time)
-            progress_cache['status'] = 'sending'
-    conn.close()
-    progress_cache['status'] = 'done'
-    progress_cache['batch_current'] = progress_cache['batch_total']
-    progress_cache['wait_time'] = 0
-
-def retry_failed_emails(batch_size=10, delay_range=(8, 15)):
-    progress_cache['status'] = 'retrying'
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('SELECT name, email, business_type, model_output FROM emails WHERE status = "FAILED"')
-    rows = c.fetchall()
-    total = len(rows)
-    batches = [rows[i:i+batch_size] for i in range(0, total, batch_size)]
-    progress_cache['batch_total'] = len(batches)
-    progress_cache['batch_current'] = 0
-    retried = []
-    import re  # For post-processing
-    for batch_num, batch in enumerate(batches, 1):
-        progress_cache['batch_current'] = batch_num
-        for row in batch:
-            name, email, business, model_output = row
-            try:
-                lines = model_output.splitlines()
-                subject_line = next((l for l in lines if l.strip().lower().startswith('subject:')), lines[0] if lines else 'PixelSolve Cold Email')
-                subject = subject_line.replace('**', '').replace('Subject:', '').strip()
-                body_start = next((i for i, l in enumerate(lines) if l.strip().lower().startswith('hi') or l.strip().lower().startswith('hello')), 1)
-                body = '\n'.join(lines[body_start:]).lstrip('\n')
-                # Post-process: remove 'in ,' or 'in  ' (with nothing after 'in')
-                body = re.sub(r'\bin\s*,', '', body)
-                body = re.sub(r'\bin\s+$', '', body)
-                # Post-process: ensure 'with:' is always followed by a newline
-                body = re.sub(r'(with:)\s*', r'\1\n', body)
-                msg = MIMEText(body, 'plain')
-                msg['Subject'] = subject
-                msg['From'] = formataddr(("The PixelSolve Team", SMTP_USER))
-                msg['To'] = email
-                with smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT) as server:
-                    server.login(SMTP_USER, SMTP_PASSWORD)
-                    server.sendmail(SMTP_USER, [email], msg.as_string())
-                status, error = 'SENT', ''
-            except Exception as e:
-                if 'rate' in str(e).lower() or 'limit' in str(e).lower():
-                    progress_cache['status'] = 'rate_limited_waiting'
-                    time.sleep(60)
-                    continue
-                status, error = 'FAILED', str(e)
-            c.execute('UPDATE emails SET status=?, error=? WHERE email=? AND model_output=?', (status, error, email, model_output))
-            conn.commit()
-            if email in progress_cache['emails']:
-                progress_cache['emails'][email]['status'] = status
-                progress_cache['emails'][email]['error'] = error
-        if batch_num < len(batches):
-            progress_cache['status'] = f'waiting_batch_{batch_num}'
-            wait_time = random.randint(*delay_range)
-            progress_cache['wait_time'] = wait_time
-            time.sleep(wait_time)
-            progress_cache['status'] = 'retrying'
-    conn.close()
-    progress_cache['status'] = 'done'
-    progress_cache['batch_current'] = progress_cache['batch_total']
-    progress_cache['wait_time'] = 0
-    return retried
+    job_id = enqueue_send_job('send', session_id, batch_size, (delay_min, delay_max))
+    start_job(job_id)
+    return jsonify({'status': 'sending', 'batch_size': batch_size, 'delay_range': [delay_min, delay_max], 'session_id': session_id, 'job_id': job_id})
 
 # --- Resend Endpoint ---
 @app.route('/api/resend', methods=['POST'])
@@ -421,153 +897,158 @@ def resend_emails():
     resend_to = data.get('emails')  # List of emails to resend to
     if not resend_to:
         return jsonify({'error': 'No emails provided for resend.'}), 400
-    thread = threading.Thread(target=send_resend_emails, args=(batch_size, (delay_min, delay_max), resend_to), daemon=True)
-    thread.start()
-    return jsonify({'status': 'resending', 'batch_size': batch_size, 'delay_range': [delay_min, delay_max], 'emails': resend_to})
-
-def send_resend_emails(batch_size, delay_range, resend_to):
-    progress_cache['status'] = 'resending'
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    placeholders = ','.join('?' for _ in resend_to)
-    c.execute(f'SELECT name, email, business_type, model_output FROM emails WHERE email IN ({placeholders}) AND status = "SENT"', tuple(resend_to))
-    rows = c.fetchall()
-    total = len(rows)
-    batches = [rows[i:i+batch_size] for i in range(0, total, batch_size)]
-    progress_cache['batch_total'] = len(batches)
-    progress_cache['batch_current'] = 0
-    import re
-    for batch_num, batch in enumerate(batches, 1):
-        progress_cache['batch_current'] = batch_num
-        for row in batch:
-            name, email, business, model_output = row
-            try:
-                lines = model_output.splitlines()
-                subject_line = next((l for l in lines if l.strip().lower().startswith('subject:')), lines[0] if lines else 'PixelSolve Cold Email')
-                subject = subject_line.replace('**', '').replace('Subject:', '').strip()
-                body_start = next((i for i, l in enumerate(lines) if l.strip().lower().startswith('hi') or l.strip().lower().startswith('hello')), 1)
-                body = '\n'.join(lines[body_start:]).lstrip('\n')
-                body = re.sub(r'\bin\s*,', '', body)
-                body = re.sub(r'\bin\s+$', '', body)
-                body = re.sub(r'(with:)\s*', r'\1\n', body)
-                msg = MIMEText(body, 'plain')
-                msg['Subject'] = subject
-                msg['From'] = formataddr(("The PixelSolve Team", SMTP_USER))
-                msg['To'] = email
-                with smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT) as server:
-                    server.login(SMTP_USER, SMTP_PASSWORD)
-                    server.sendmail(SMTP_USER, [email], msg.as_string())
-                status, error = 'RESENT', ''
-            except Exception as e:
-                status, error = 'FAILED', str(e)
-            c.execute('UPDATE emails SET status=?, error=? WHERE email=? AND model_output=?', (status, error, email, model_output))
-            conn.commit()
-        if batch_num < len(batches):
-            progress_cache['status'] = f'waiting_batch_{batch_num}'
-            wait_time = random.randint(*delay_range)
-            progress_cache['wait_time'] = wait_time
-            time.sleep(wait_time)
-            progress_cache['status'] = 'resending'
-    conn.close()
-    progress_cache['status'] = 'done'
-    progress_cache['batch_current'] = progress_cache['batch_total']
-    progress_cache['wait_time'] = 0
+    session_id = data.get('session_id') or progress.latest_session_id
+    job_id = enqueue_send_job('resend', session_id, batch_size, (delay_min, delay_max), emails=resend_to)
+    start_job(job_id)
+    return jsonify({'status': 'resending', 'batch_size': batch_size, 'delay_range': [delay_min, delay_max], 'emails': resend_to, 'job_id': job_id})
 
-# --- API Endpoints ---
 @app.route('/api/retry_failed', methods=['POST'])
 def retry_failed_emails_api():
     data = request.get_json(silent=True) or {}
     batch_size = int(data.get('batch_size', 10))
     delay_min = int(data.get('delay_min', 8))
     delay_max = int(data.get('delay_max', 15))
-    def run():
-        retried = retry_failed_emails(batch_size, (delay_min, delay_max))
-        return retried
-    thread = threading.Thread(target=run, daemon=True)
-    thread.start()
-    return jsonify({'status': 'retrying', 'batch_size': batch_size, 'delay_range': [delay_min, delay_max]})
+    session_id = data.get('session_id') or progress.latest_session_id
+    job_id = enqueue_send_job('retry_failed', session_id, batch_size, (delay_min, delay_max))
+    start_job(job_id)
+    return jsonify({'status': 'retrying', 'batch_size': batch_size, 'delay_range': [delay_min, delay_max], 'job_id': job_id})
+
+@app.route('/api/cache', methods=['GET'])
+def get_cache_stats():
+    return jsonify(generation_cache.stats())
+
+@app.route('/api/cache', methods=['DELETE'])
+def clear_cache():
+    generation_cache.clear()
+    return jsonify({'status': 'cleared', **generation_cache.stats()})
+
+@app.route('/api/suppressions', methods=['GET'])
+def list_suppressions():
+    # Unparseable values fall back to the defaults; a negative LIMIT would mean "no limit" to SQLite
+    limit = min(max(request.args.get('limit', 100, type=int), 0), 1000)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    return jsonify(suppression_index.listing(limit, offset))
+
+def string_list(data, key):
+    # data[key] as a list of strings (missing = empty), or None for anything else: a bare string would
+    # otherwise be taken one character at a time
+    values = data.get(key) or []
+    return values if isinstance(values, list) and all(isinstance(v, str) for v in values) else None
+
+@app.route('/api/suppressions', methods=['POST'])
+def add_suppressions():
+    # {"emails": [...], "domains": [...], "reason": "unsubscribe"}
+    data = request.get_json(silent=True) or {}
+    emails, domains = string_list(data, 'emails'), string_list(data, 'domains')
+    if emails is None or domains is None:
+        return jsonify({'error': 'emails and domains must be lists of strings'}), 400
+    invalid = invalid_entries(emails, domains)
+    if invalid:
+        return jsonify({'error': 'Invalid email addresses or domains', 'invalid': invalid}), 400
+    reason = data.get('reason') or 'manual'
+    added = suppression_index.add(emails, reason, 'api')
+    added_domains = suppression_index.add_domains(domains, reason)
+    return jsonify({'added': added, 'added_domains': added_domains})
+
+@app.route('/api/suppressions', methods=['DELETE'])
+def remove_suppressions():
+    # No syntax check here, so entries stored before there was one can still be removed
+    data = request.get_json(silent=True) or {}
+    emails, domains = string_list(data, 'emails'), string_list(data, 'domains')
+    if emails is None or domains is None:
+        return jsonify({'error': 'emails and domains must be lists of strings'}), 400
+    suppression_index.remove(emails, domains)
+    return jsonify({'status': 'removed'})
+
+@app.route('/api/suppressions/check', methods=['POST'])
+def check_suppressions():
+    # {"emails": [...]} -> which of them an upload would skip, and why
+    data = request.get_json(silent=True) or {}
+    emails = string_list(data, 'emails')
+    if emails is None:
+        return jsonify({'error': 'emails must be a list of strings'}), 400
+    return jsonify({'blocked': suppression_index.blocked(emails)})
+
+@app.route('/api/accounts', methods=['GET'])
+def get_accounts():
+    # Sender accounts with today's quota usage and this process's delivery counts
+    return jsonify({'accounts': send_engine.report(), 'concurrency': send_engine.concurrency,
+                    'rates': send_scheduler.snapshot()})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Prometheus text exposition: generation, Ollama, SMTP, rate limiting, SQLite and job timings
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/backends', methods=['GET'])
+def get_backends():
+    # Per-backend load, health and latency histogram (cumulative bucket counts, seconds)
+    return jsonify({'backends': llm_router.snapshot()})
 
 @app.route('/api/logs', methods=['GET'])
 def get_logs():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('SELECT name, email, business_type, status, model_output, error, sent_at FROM emails ORDER BY sent_at DESC LIMIT 100')
-    rows = c.fetchall()
-    conn.close()
-    logs = [dict(zip(['name','email','business_type','status','model_output','error','sent_at'], row)) for row in rows]
-    return jsonify({'logs': logs})
+    # Newest first, one page per request; pass next_cursor back as ?cursor= for the next page.
+    # Filters: session_id, status (comma-separated), since/until (dates), domain, q (full text);
+    # fields= picks columns (e.g. fields=name,email,status,sent_at to leave out the bodies)
+    args = request.args
+    fields = [f for f in (args.get('fields') or '').split(',') if f] or email_logs.DEFAULT_FIELDS
+    try:
+        logs, next_cursor = email_logs.search(
+            DB_FILE, session_id=args.get('session_id'), statuses=[s for s in (args.get('status') or '').split(',') if s],
+            since=args.get('since'), until=args.get('until'), domain=args.get('domain'), text=args.get('q'),
+            fields=fields, cursor=args.get('cursor'), limit=args.get('limit', 100, type=int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'logs': logs, 'next_cursor': next_cursor})
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+    # Aggregates come from stats_rollup, maintained at send time, so this never touches email bodies
+    session_id = request.args.get('session_id')
+    breakdown = set(filter(None, (request.args.get('breakdown') or '').split(',')))
+    where, args = ('WHERE session_id = ?', (session_id,)) if session_id else ('', ())
+    c = db.get_conn(DB_FILE).cursor()
     # Total sent today
-    today = datetime.datetime.now().strftime('%Y-%m-%d')
-    c.execute("SELECT COUNT(*) FROM sent_log WHERE DATE(sent_at)=?", (today,))
+    today = datetime.date.today().isoformat()
+    c.execute(f"SELECT COALESCE(SUM(sent), 0) FROM stats_rollup {where} {'AND' if where else 'WHERE'} day = ?", args + (today,))
     total_sent_today = c.fetchone()[0]
     # Total sent all time
-    c.execute("SELECT COUNT(*) FROM sent_log")
+    c.execute(f"SELECT COALESCE(SUM(sent), 0) FROM stats_rollup {where}", args)
     total_sent_all = c.fetchone()[0]
-    # Breakdown by country (top 5)
-    c.execute("SELECT body FROM sent_log")
-    country_counts = {}
-    business_type_counts = {}
-    top_recipients_by_country = []
-    for row in c.fetchall():
-        body = row[0]
-        # Try to extract country and business type from body (fallback: unknown)
-        country = 'Unknown'
-        business_type = 'Unknown'
-        lines = body.split('\n')
-        for l in lines:
-            if 'café in' in l or 'coffee shop in' in l:
-                parts = l.split(' in ')
-                if len(parts) > 1:
-                    loc = parts[1].split(' and')[0].split(',')
-                    if len(loc) > 1:
-                        country = loc[-1].strip()
-                    else:
-                        country = loc[0].strip()
-            if 'help coffee shops like yours' in l or 'help businesses like yours' in l:
-                if 'coffee shop' in l:
-                    business_type = 'Coffee Shop'
-                elif 'café' in l:
-                    business_type = 'Café'
-                elif 'restaurant' in l:
-                    business_type = 'Restaurant'
-        country_counts[country] = country_counts.get(country, 0) + 1
-        business_type_counts[business_type] = business_type_counts.get(business_type, 0) + 1
     # Top 5 countries and business types
-    countries = sorted(country_counts.items(), key=lambda x: -x[1])[:5]
-    business_types = sorted(business_type_counts.items(), key=lambda x: -x[1])[:5]
+    c.execute(f"SELECT country, SUM(sent) AS n FROM stats_rollup {where} GROUP BY country ORDER BY n DESC LIMIT 5", args)
+    countries = c.fetchall()
+    c.execute(f"SELECT business_type, SUM(sent) AS n FROM stats_rollup {where} GROUP BY business_type ORDER BY n DESC LIMIT 5", args)
+    business_types = c.fetchall()
     # Top recipients by country (first 5 unique)
-    c.execute("SELECT email, body FROM sent_log")
+    c.execute(f"SELECT email, country FROM sent_log {where} ORDER BY id", args)
+    top_recipients_by_country = []
     seen = set()
-    for email, body in c.fetchall():
-        country = 'Unknown'
-        lines = body.split('\n')
-        for l in lines:
-            if 'café in' in l or 'coffee shop in' in l:
-                parts = l.split(' in ')
-                if len(parts) > 1:
-                    loc = parts[1].split(' and')[0].split(',')
-                    if len(loc) > 1:
-                        country = loc[-1].strip()
-                    else:
-                        country = loc[0].strip()
+    for email, country in c:
         if (email, country) not in seen:
-            top_recipients_by_country.append((email, country))
+            top_recipients_by_country.append((email, country or 'Unknown'))
             seen.add((email, country))
         if len(top_recipients_by_country) >= 5:
             break
-    conn.close()
-    return jsonify({
+    stats = {
         'total_sent_today': total_sent_today,
         'total_sent_all': total_sent_all,
         'countries': countries,
         'business_types': business_types,
         'top_recipients_by_country': top_recipients_by_country
-    })
+    }
+    # Optional breakdowns: ?breakdown=day,session
+    if 'day' in breakdown:
+        c.execute(f"SELECT day, SUM(sent) FROM stats_rollup {where} GROUP BY day ORDER BY day DESC LIMIT 90", args)
+        stats['by_day'] = c.fetchall()
+    if 'session' in breakdown:
+        c.execute(f"SELECT session_id, SUM(sent) AS n FROM stats_rollup {where} GROUP BY session_id ORDER BY n DESC LIMIT 100", args)
+        stats['by_session'] = c.fetchall()
+    return jsonify(stats)
 
 if __name__ == '__main__':
+    # With the debug reloader only the child process (WERKZEUG_RUN_MAIN) should pick jobs back up
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        llm_router.start_health_checks()
+        resume_jobs()
     app.run(debug=True, port=5050) 
\ No newline at end of file
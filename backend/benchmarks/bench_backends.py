@@ -0,0 +1,55 @@
+# Generation throughput as Ollama backends are added. Each fake backend runs in its own process and
+# serves --parallel generations at a time, like a GPU box with OLLAMA_NUM_PARALLEL set.
+# --down-one adds one more backend that answers 503, to show it being ejected.
+#   python backend/benchmarks/bench_backends.py --rows 120 --backends 1 2 4 --parallel 2 --latency 0.5
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import spawn_ollama, synthetic_recipients
+from llm_router import Backend
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=120)
+    parser.add_argument('--backends', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--parallel', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--down-one', action='store_true')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='pixelsolve-bench-')
+    os.environ['DB_FILE'] = os.path.join(tmp, 'email_log.db')
+    os.environ['UPLOAD_FOLDER'] = os.path.join(tmp, 'uploads')
+    os.environ['OLLAMA_STREAM'] = 'false'
+    import app
+
+    print(f'{"backends":>8} {"rows":>6} {"seconds":>8} {"rows/min":>10} {"failed":>7}  requests per backend')
+    for count in args.backends:
+        procs = [spawn_ollama(latency=args.latency, parallel=args.parallel) for _ in range(count + int(args.down_one))]
+        if args.down_one:
+            procs[-1][1].send('down')
+        app.llm_router.set_backends([Backend(url, max_concurrency=args.parallel) for _, _, url in procs])
+        app.generation_cache.clear()
+        session_id = f'bench-{count}'
+        start = time.perf_counter()
+        app.background_generate_emails(synthetic_recipients(args.rows, session_id), session_id,
+                                       workers=args.parallel * len(procs))
+        elapsed = time.perf_counter() - start
+        failed = sum(1 for e in app.session_progress(session_id)['emails'].values() if e['status'] == 'FAILED')
+        served = [f'{b["requests"]}{"(ejected)" if not b["healthy"] else ""}' for b in app.llm_router.snapshot()]
+        print(f'{count:>8} {args.rows:>6} {elapsed:>8.2f} {args.rows / elapsed * 60:>10.1f} {failed:>7}  {" ".join(served)}')
+        for proc, conn, _ in procs:
+            conn.send(None)
+            proc.join()
+
+
+if __name__ == '__main__':
+    main()
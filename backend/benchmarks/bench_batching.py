@@ -0,0 +1,73 @@
+# Prompt-prefix reuse and batched template generation against a fake Ollama that charges for prompt
+# processing (prefill) and for loading the model. The fake keeps each slot's last prompt in its KV cache,
+# unloads after --server-keep-alive idle seconds, and the leads arrive in --bursts separated by --idle
+# seconds (uploads spread over a day). A setup is API:BATCH[:KEEP_ALIVE], e.g. chat:8:30m.
+#   python backend/benchmarks/bench_batching.py --rows 96 --setups generate:1 chat:1:30m chat:4:30m chat:8:30m
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import FakeOllama, synthetic_recipients
+from llm_router import Backend
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=96)
+    parser.add_argument('--setups', nargs='+', default=['generate:1', 'chat:1:30m', 'chat:4:30m', 'chat:8:30m'])
+    parser.add_argument('--mode', choices=('template', 'full'), default='template')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.1, help='fixed seconds per request before prefill')
+    parser.add_argument('--token-rate', type=float, default=200, help='output tokens/s')
+    parser.add_argument('--prefill-rate', type=float, default=800, help='prompt tokens/s')
+    parser.add_argument('--no-prefix-cache', action='store_true', help='fake reprocesses every prompt in full')
+    parser.add_argument('--load-seconds', type=float, default=2.0)
+    parser.add_argument('--server-keep-alive', type=float, default=1.0, help='idle seconds before the fake unloads')
+    parser.add_argument('--bursts', type=int, default=3)
+    parser.add_argument('--idle', type=float, default=1.5, help='seconds between bursts')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='pixelsolve-bench-')
+    os.environ['DB_FILE'] = os.path.join(tmp, 'email_log.db')
+    os.environ['UPLOAD_FOLDER'] = os.path.join(tmp, 'uploads')
+    import app
+    app.GENERATION_MODE = args.mode
+
+    print(f'{"setup":<14} {"rows":>5} {"requests":>8} {"loads":>5} {"prefill tok/email":>17} {"ttft s":>7} {"busy s":>7} {"emails/min":>10} {"failed":>6}')
+    for setup in args.setups:
+        api, batch, keep_alive = (setup.split(':') + [''])[:3]
+        with FakeOllama(latency=args.latency, token_rate=args.token_rate, prefill_rate=args.prefill_rate,
+                        prefix_cache=not args.no_prefix_cache, load_seconds=args.load_seconds,
+                        keep_alive=args.server_keep_alive, parallel=args.workers) as ollama:
+            app.llm_router.set_backends([Backend(ollama.url, max_concurrency=args.workers)])
+            app.OLLAMA_API = api
+            app.OLLAMA_KEEP_ALIVE = keep_alive
+            app.GENERATION_BATCH_SIZE = int(batch)
+            app.generation_cache.clear()
+            busy = 0.0
+            failed = 0
+            per_burst = -(-args.rows // args.bursts)
+            for burst in range(args.bursts):
+                if burst:
+                    time.sleep(args.idle)
+                session_id = f'bench-{setup}-{burst}'
+                recipients = synthetic_recipients(args.rows, session_id)[burst * per_burst:(burst + 1) * per_burst]
+                start = time.perf_counter()
+                app.background_generate_emails(recipients, session_id, workers=args.workers)
+                busy += time.perf_counter() - start
+                failed += sum(1 for e in app.session_progress(session_id)['emails'].values() if e['status'] == 'FAILED')
+            prefill = (ollama.prompt_tokens - ollama.cached_tokens) / args.rows
+            ttft = ollama.ttft_seconds / max(ollama.requests, 1)
+            # Throughput while generating; the idle gaps between bursts aren't counted
+            print(f'{setup:<14} {args.rows:>5} {ollama.requests:>8} {ollama.loads:>5} {prefill:>17.1f} {ttft:>7.3f} '
+                  f'{busy:>7.2f} {args.rows / busy * 60:>10.1f} {failed:>6}')
+
+
+if __name__ == '__main__':
+    main()
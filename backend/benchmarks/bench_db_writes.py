@@ -0,0 +1,87 @@
+# Write throughput into the emails table: connect + commit per row (old path) vs the db module
+# (WAL, reused connection, commit per row) vs the group-commit writer.
+#   python backend/benchmarks/bench_db_writes.py --rows 10000 100000 1000000
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import db
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS emails (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    email TEXT,
+    business_type TEXT,
+    status TEXT,
+    model_output TEXT,
+    error TEXT,
+    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    session_id TEXT
+)'''
+INSERT = 'INSERT INTO emails (name, email, business_type, status, model_output, error, session_id) VALUES (?, ?, ?, ?, ?, ?, ?)'
+BODY = 'Subject: Hello\n\nHi Team,\n' + 'Lorem ipsum dolor sit amet. ' * 20
+
+
+def row(i):
+    return (f'Cafe {i}', f'lead{i}@example.com', 'Coffee Shop', 'Ready', BODY, '', 'bench')
+
+
+def fresh_db(label):
+    path = os.path.join(tempfile.mkdtemp(prefix='pixelsolve-bench-'), f'{label}.db')
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def connect_per_row(path, n):
+    for i in range(n):
+        conn = sqlite3.connect(path)
+        conn.execute(INSERT, row(i))
+        conn.commit()
+        conn.close()
+
+
+def wal_commit_per_row(path, n):
+    for i in range(n):
+        db.execute(path, INSERT, row(i))
+
+
+def group_commit(path, n):
+    for i in range(n):
+        db.write(path, INSERT, row(i))
+    db.flush(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--baseline-max', type=int, default=100000,
+                        help='skip the per-row-commit modes above this many rows (they take minutes)')
+    args = parser.parse_args()
+
+    modes = [('connect+commit per row', connect_per_row, True),
+             ('WAL, commit per row', wal_commit_per_row, True),
+             ('WAL, group commit', group_commit, False)]
+    print(f'{"mode":<26} {"rows":>9} {"seconds":>9} {"rows/s":>10}')
+    for n in args.rows:
+        for label, fn, per_row in modes:
+            if per_row and n > args.baseline_max:
+                print(f'{label:<26} {n:>9} {"skipped":>9}')
+                continue
+            path = fresh_db(label.split()[0].strip(','))
+            start = time.perf_counter()
+            fn(path, n)
+            elapsed = time.perf_counter() - start
+            print(f'{label:<26} {n:>9} {elapsed:>9.2f} {n / elapsed:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# Per-upload dedup cost as campaign history grows: the old full scan of emails into a Python set vs
+# batched indexed lookups (suppression.SuppressionIndex). The upload has --upload addresses, half of
+# them already in history, checked in ingest-sized batches.
+#   python backend/benchmarks/bench_dedup.py --history 1000 100000 1000000 --upload 10000
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import db
+from schema import MIGRATIONS
+from suppression import SuppressionIndex, normalize
+
+
+def build_history(n):
+    path = os.path.join(tempfile.mkdtemp(prefix='pixelsolve-bench-'), 'email_log.db')
+    db.migrate(path, MIGRATIONS)
+    conn = db.get_conn(path)
+    for start in range(0, n, 100000):
+        conn.executemany('INSERT INTO emails (name, email, status, session_id) VALUES (?, ?, ?, ?)',
+                         ((f'Lead {i}', f'Lead{i}@Example.com', 'SENT' if i % 2 else 'Ready', 'history')
+                          for i in range(start, min(start + 100000, n))))
+        conn.commit()
+    conn.execute('ANALYZE')
+    return path
+
+
+def legacy(path, upload, batch_size):
+    rows = db.query(path, 'SELECT email FROM emails WHERE status IN ("SENT", "Ready")')
+    already_in_db = set(row[0].lower() for row in rows if row[0])
+    return sum(1 for email in upload if email.lower() not in already_in_db)
+
+
+def indexed(path, upload, batch_size):
+    index = SuppressionIndex(path)
+    fresh = 0
+    for i in range(0, len(upload), batch_size):
+        batch = upload[i:i + batch_size]
+        blocked = index.blocked(batch)
+        fresh += sum(1 for email in batch if normalize(email) not in blocked)
+    return fresh
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--history', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--upload', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f'{"history":>10} {"mode":<8} {"upload":>7} {"new":>6} {"seconds":>8}')
+    for n in args.history:
+        path = build_history(n)
+        # Half the upload was contacted before (when history is big enough), half is new
+        upload = [f'lead{i}@example.com' for i in range(0, min(n, args.upload // 2))]
+        upload += [f'fresh{i}@example.com' for i in range(args.upload - len(upload))]
+        for label, fn in (('legacy', legacy), ('indexed', indexed)):
+            start = time.perf_counter()
+            fresh = fn(path, upload, args.batch_size)
+            print(f'{n:>10} {label:<8} {len(upload):>7} {fresh:>6} {time.perf_counter() - start:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
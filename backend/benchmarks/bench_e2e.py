@@ -0,0 +1,207 @@
+# End-to-end campaign run through the real Flask endpoints: POST /api/upload with a synthetic lead sheet,
+# generation against a fake Ollama (in its own process), then POST /api/send into a local SMTP sink.
+# Each sheet size runs in a fresh process with its own DB, so peak memory is per run. Results are written
+# as JSON; pass an earlier file as --baseline to print the change per metric.
+#   python backend/benchmarks/bench_e2e.py --rows 1000 10000 100000 --output e2e.json --baseline e2e-prev.json
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import SMTPSink, spawn_ollama
+
+# Higher is better for these; everything else (seconds, bytes) is better lower
+THROUGHPUT_METRICS = ('parse_rows_per_s', 'generate_rows_per_min', 'send_messages_per_min')
+
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # ru_maxrss is KiB on Linux
+
+
+def file_size(path):
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+
+
+def wait_for_job(client, job_id, until, poll=0.1, timeout=None):
+    # Polls /api/jobs/<id> until until(job) is true; returns (job, seconds waited)
+    start = time.perf_counter()
+    while True:
+        job = client.get(f'/api/jobs/{job_id}').get_json()
+        if until(job) or job['status'] == 'failed':
+            return job, time.perf_counter() - start
+        if timeout and time.perf_counter() - start > timeout:
+            raise TimeoutError(f'job {job_id} still {job["status"]} after {timeout}s')
+        time.sleep(poll)
+
+
+def run_campaign(rows, args, conn):
+    tmp = tempfile.mkdtemp(prefix='pixelsolve-bench-')
+    os.environ.update({
+        'DB_FILE': os.path.join(tmp, 'email_log.db'),
+        'UPLOAD_FOLDER': os.path.join(tmp, 'uploads'),
+        'GENERATION_WORKERS': str(args.workers),
+        # Measure the pipeline, not the provider limits
+        'SEND_RATE_PER_ACCOUNT': '100000',
+        'SEND_RATE_PER_DOMAIN': '100000',
+    })
+    if args.format == 'csv':
+        from bench_normalize import write_sheet
+    else:
+        from bench_ingest import write_sheet
+    sheet = os.path.join(tmp, f'leads_{rows}.{args.format}')
+    write_sheet(sheet, rows)
+
+    ollama, ollama_conn, ollama_url = spawn_ollama(latency=args.latency, token_rate=args.token_rate, parallel=args.parallel)
+    try:
+        with SMTPSink(message_latency=args.message_latency) as sink:
+            import app
+            import metrics
+            from llm_router import Backend
+            from send_engine import Account
+            app.llm_router.set_backends([Backend(ollama_url, max_concurrency=args.workers)])
+            app.send_engine.set_accounts([Account(f'sender{i}@pixelsolve.co', 'secret', *sink.address, use_ssl=False,
+                                                  sessions=args.sessions) for i in range(args.accounts)])
+            client = app.app.test_client()
+            rss_before = peak_rss()
+
+            start = time.perf_counter()
+            with open(sheet, 'rb') as f:
+                upload = client.post('/api/upload', data={'file': (f, os.path.basename(sheet))},
+                                     content_type='multipart/form-data').get_json()
+            upload_seconds = time.perf_counter() - start
+            job_id = upload['job_id']
+            # Ingest runs alongside generation; "parsed" is when the last chunk was queued
+            job, _ = wait_for_job(client, job_id, lambda j: j['ingest_done'], poll=0.02, timeout=args.timeout)
+            parse_seconds = time.perf_counter() - start
+            job, _ = wait_for_job(client, job_id, lambda j: j['status'] == 'done', timeout=args.timeout)
+            generate_seconds = time.perf_counter() - start
+            generate_job = client.get(f'/api/jobs/{job_id}?timings=1').get_json()
+
+            start = time.perf_counter()
+            send = client.post('/api/send', json={'session_id': upload['session_id'], 'batch_size': 1000,
+                                                  'delay_min': 0, 'delay_max': 0}).get_json()
+            send_job, _ = wait_for_job(client, send['job_id'], lambda j: j['status'] == 'done', timeout=args.timeout)
+            send_seconds = time.perf_counter() - start
+            send_job = client.get(f'/api/jobs/{send["job_id"]}?timings=1').get_json()
+
+            import db
+            db.flush(app.DB_FILE)
+            ingest = metrics.INGEST_CHUNK_SECONDS.labels().snapshot()
+            sent = sink.stats['messages']
+            conn.send({
+                'rows': rows,
+                'leads': generate_job['total'],
+                'generated': generate_job['done'],
+                'sent': sent,
+                'upload_request_seconds': round(upload_seconds, 3),
+                'parse_seconds': round(parse_seconds, 3),
+                'parse_rows_per_s': round(rows / parse_seconds, 1),
+                'ingest_cpu_seconds': ingest['sum'],
+                'generate_seconds': round(generate_seconds, 3),
+                'generate_rows_per_min': round(generate_job['done'] / generate_seconds * 60, 1),
+                'send_seconds': round(send_seconds, 3),
+                'send_messages_per_min': round(sent / send_seconds * 60, 1),
+                'db_bytes': file_size(app.DB_FILE),
+                'cache_bytes': file_size(app.GENERATION_CACHE_FILE),
+                'rss_after_import_bytes': rss_before,
+                'peak_rss_bytes': peak_rss(),
+                'ollama_requests': app.llm_router.backends[0].requests,
+                'phases': {'generate': (generate_job.get('timings') or {}).get('phases', {}),
+                           'send': (send_job.get('timings') or {}).get('phases', {})},
+            })
+    finally:
+        ollama_conn.send(None)
+        ollama.join(5)
+
+
+def revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(runs, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {run['rows']: run for run in json.load(f)['runs']}
+    print(f'\nvs {baseline_path}')
+    print(f'{"rows":>8} {"metric":<24} {"before":>14} {"after":>14} {"change":>8}')
+    for run in runs:
+        before = baseline.get(run['rows'])
+        if not before:
+            continue
+        for key in ('parse_rows_per_s', 'generate_rows_per_min', 'send_messages_per_min', 'db_bytes', 'peak_rss_bytes'):
+            if not before.get(key):
+                continue
+            change = (run[key] - before[key]) / before[key] * 100
+            worse = change < 0 if key in THROUGHPUT_METRICS else change > 0
+            flag = '  <-' if worse and abs(change) >= 10 else ''
+            print(f'{run["rows"]:>8} {key:<24} {before[key]:>14,.1f} {run[key]:>14,.1f} {change:>+7.1f}%{flag}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--format', choices=('xlsx', 'csv'), default='xlsx')
+    parser.add_argument('--workers', type=int, default=8, help='generation workers (and Ollama requests in flight)')
+    parser.add_argument('--latency', type=float, default=0.0, help='fake Ollama seconds to first token')
+    parser.add_argument('--token-rate', type=float, default=0, help='fake Ollama tokens/s (0 = instant)')
+    parser.add_argument('--parallel', type=int, default=0, help='fake Ollama generations at once (0 = unlimited)')
+    parser.add_argument('--accounts', type=int, default=1)
+    parser.add_argument('--sessions', type=int, default=4, help='SMTP sessions per account')
+    parser.add_argument('--message-latency', type=float, default=0.0, help='SMTP sink seconds per message')
+    parser.add_argument('--timeout', type=float, default=3600, help='seconds allowed per phase')
+    parser.add_argument('--output', default='bench_e2e.json')
+    parser.add_argument('--baseline', help='earlier --output file to compare against')
+    args = parser.parse_args()
+
+    runs = []
+    print(f'{"rows":>8} {"leads":>8} {"parse s":>8} {"rows/s":>9} {"gen/min":>9} {"send/min":>9} {"db MB":>7} {"peak MB":>8}')
+    for rows in args.rows:
+        conn, child = multiprocessing.Pipe(duplex=False)
+        proc = multiprocessing.Process(target=run_campaign, args=(rows, args, child))
+        proc.start()
+        child.close()
+        try:
+            run = conn.recv()
+        except EOFError:
+            run = None
+        proc.join()
+        if run is None:
+            print(f'{rows:>8} run failed (exit code {proc.exitcode})')
+            continue
+        runs.append(run)
+        print(f'{rows:>8} {run["leads"]:>8} {run["parse_seconds"]:>8.2f} {run["parse_rows_per_s"]:>9.0f} '
+              f'{run["generate_rows_per_min"]:>9.0f} {run["send_messages_per_min"]:>9.0f} '
+              f'{run["db_bytes"] / 2 ** 20:>7.1f} {run["peak_rss_bytes"] / 2 ** 20:>8.1f}')
+
+    report = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'settings': {k: v for k, v in vars(args).items() if k not in ('rows', 'output', 'baseline')},
+        'runs': runs,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nwrote {args.output}')
+    if args.baseline:
+        compare(runs, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
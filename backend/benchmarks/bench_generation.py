@@ -0,0 +1,43 @@
+# Generation throughput (rows/minute) at several worker-pool sizes, against a fake Ollama.
+#   python backend/benchmarks/bench_generation.py --rows 200 --latency 0.5 --workers 1 2 4 8 16
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import FakeOllama, synthetic_recipients
+from llm_router import Backend
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='pixelsolve-bench-')
+    os.environ['DB_FILE'] = os.path.join(tmp, 'email_log.db')
+    os.environ['UPLOAD_FOLDER'] = os.path.join(tmp, 'uploads')
+    import app
+
+    with FakeOllama(latency=args.latency) as ollama:
+        # Let the worker count be the only limit being measured
+        app.llm_router.set_backends([Backend(ollama.url, max_concurrency=max(args.workers))])
+        print(f'{"workers":>8} {"rows":>6} {"seconds":>8} {"rows/min":>10}')
+        for workers in args.workers:
+            app.generation_cache.clear()
+            recipients = synthetic_recipients(args.rows, session_id=f'bench-{workers}')
+            start = time.perf_counter()
+            app.background_generate_emails(recipients, f'bench-{workers}', workers=workers)
+            elapsed = time.perf_counter() - start
+            print(f'{workers:>8} {args.rows:>6} {elapsed:>8.2f} {args.rows / elapsed * 60:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# Upload ingestion: pd.read_excel + iterrows (old path) vs streaming openpyxl read_only.
+# Reports parse time, peak RSS and time-to-first-generated-email (fake Ollama), each mode in its own process.
+#   python backend/benchmarks/bench_ingest.py --rows 100000
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+COLUMNS = ['Business Name', 'Type', 'City', 'Country', 'Contact', 'WhatsApp', 'Has Website',
+           'Instagram Presence', 'Personalized Hook / Observation']
+
+
+def write_sheet(path, rows):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(COLUMNS)
+    for i in range(rows):
+        ws.append([f'Cafe {i}', 'Coffee Shop', 'Austin', 'USA', f'Owner <lead{i}@example.com>', '+1 555 0100',
+                   'Yes', 'Yes', 'Great latte art on Instagram'])
+    wb.save(path)
+
+
+def legacy_recipients(path, session_id):
+    # The pre-streaming upload path, kept here as the baseline
+    import pandas as pd
+    from ingest import extract_email
+    df = pd.read_excel(path, engine='openpyxl')
+    recipients = []
+    seen_emails = set()
+    for _, row in df.iterrows():
+        r = {k.strip(): str(row.get(k, '')).strip() for k in df.columns}
+        r['Email'] = r.get('Email', extract_email(r.get('Contact', '')))
+        email = r['Email'].lower()
+        if not email or email == 'nan' or email in seen_emails:
+            continue
+        seen_emails.add(email)
+        r['session_id'] = session_id
+        recipients.append(r)
+    return recipients
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def run_mode(mode, path, latency):
+    tmp = tempfile.mkdtemp(prefix='pixelsolve-bench-')
+    os.environ['DB_FILE'] = os.path.join(tmp, 'email_log.db')
+    os.environ['UPLOAD_FOLDER'] = os.path.join(tmp, 'uploads')
+    import app
+    import ingest
+    from fakes import FakeOllama
+    from llm_router import Backend
+
+    with FakeOllama(latency=latency) as ollama:
+        app.llm_router.set_backends([Backend(ollama.url)])
+        baseline_rss = peak_rss_mb()
+        start = time.perf_counter()
+        if mode == 'legacy':
+            recipients = iter(legacy_recipients(path, 'bench'))
+        else:
+            recipients = ingest.iter_recipients(path, 'bench')
+        first = next(recipients)
+        app.generate_email_with_llama3(first)
+        first_email = time.perf_counter() - start
+        count = 1 + sum(1 for _ in recipients)
+        parse_total = time.perf_counter() - start - latency
+    print(json.dumps({'mode': mode, 'rows': count, 'parse_seconds': round(parse_total, 2),
+                      'first_email_seconds': round(first_email, 3),
+                      'peak_rss_mb': round(peak_rss_mb(), 1), 'baseline_rss_mb': round(baseline_rss, 1)}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--latency', type=float, default=0.2, help='fake Ollama seconds per request')
+    parser.add_argument('--mode', choices=['legacy', 'streaming'])
+    parser.add_argument('--file')
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.file, args.latency)
+        return
+
+    path = os.path.join(tempfile.mkdtemp(prefix='pixelsolve-bench-'), f'leads_{args.rows}.xlsx')
+    print(f'writing {args.rows} rows to {path} ...')
+    write_sheet(path, args.rows)
+    print(f'{"mode":<10} {"rows":>8} {"parse s":>8} {"1st email s":>12} {"peak RSS MB":>12}')
+    for mode in ('legacy', 'streaming'):
+        out = subprocess.run([sys.executable, __file__, '--mode', mode, '--file', path, '--latency', str(args.latency)],
+                             capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f'{r["mode"]:<10} {r["rows"]:>8} {r["parse_seconds"]:>8} {r["first_email_seconds"]:>12} {r["peak_rss_mb"]:>12}')
+
+
+if __name__ == '__main__':
+    main()
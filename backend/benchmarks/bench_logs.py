@@ -0,0 +1,89 @@
+# Log browsing cost as the emails table grows: the old OFFSET-style page (deep pages re-read every row
+# before them) vs keyset cursors (email_logs.search), filtered pages, and FTS5 search vs a LIKE scan.
+#   python backend/benchmarks/bench_logs.py --rows 10000 100000
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import db
+import email_logs
+from schema import MIGRATIONS
+
+DOMAINS = ('example.com', 'bakery.co', 'shop.net', 'mail.org')
+STATUSES = ('SENT', 'SENT', 'SENT', 'Ready', 'FAILED')
+WORDS = ('croissant', 'plumbing', 'dental', 'fitness', 'roofing', 'catering', 'florist', 'tailor')
+
+
+def build_log(n):
+    path = os.path.join(tempfile.mkdtemp(prefix='pixelsolve-bench-'), 'email_log.db')
+    db.migrate(path, MIGRATIONS)
+    conn = db.get_conn(path)
+    start = datetime.datetime(2025, 1, 1)
+    for first in range(0, n, 100000):
+        conn.executemany('INSERT INTO emails (name, email, business_type, session_id, status, sent_at, subject, body) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         ((f'Lead {i}', f'lead{i}@{DOMAINS[i % len(DOMAINS)]}', 'Shop', f'session-{i // 1000}', STATUSES[i % len(STATUSES)],
+                           (start + datetime.timedelta(seconds=i * 7)).strftime('%Y-%m-%d %H:%M:%S'),
+                           f'Quick idea for your {WORDS[i % len(WORDS)]} business',
+                           f'Hi Lead {i}, we help {WORDS[(i // 3) % len(WORDS)]} shops like yours get found online.')
+                          for i in range(first, min(first + 100000, n))))
+        conn.commit()
+    conn.execute('ANALYZE')
+    return path
+
+
+def offset_page(path, offset, limit=100):
+    return db.query(path, 'SELECT name, email, business_type, status, model_output, error, sent_at FROM emails ORDER BY sent_at DESC LIMIT ? OFFSET ?', (limit, offset))
+
+
+def keyset_page(path, offset, limit=100):
+    # Cursor of the row just before the page, as a client paging from the top would hold it
+    row = db.query_one(path, 'SELECT sent_at, id FROM emails ORDER BY sent_at DESC, id DESC LIMIT 1 OFFSET ?', (offset - 1,)) if offset else None
+    cursor = email_logs.encode_cursor(*row) if row else None
+    start = time.perf_counter()
+    email_logs.search(path, cursor=cursor, limit=limit)
+    return time.perf_counter() - start
+
+
+def like_search(path, text, limit=100):
+    where = ' AND '.join("(name || ' ' || email || ' ' || subject || ' ' || body) LIKE ?" for _ in text.split())
+    return db.query(path, f'SELECT id FROM emails WHERE {where} ORDER BY sent_at DESC, id DESC LIMIT ?', [f'%{w}%' for w in text.split()] + [limit])
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    print(f'{"rows":>9} {"query":<28} {"ms":>9}')
+    for n in args.rows:
+        path = build_log(n)
+        cases = []
+        for depth in (0, n // 2, n - 100):
+            cases.append((f'offset page @{depth}', timed(offset_page, path, depth)))
+            cases.append((f'keyset page @{depth}', keyset_page(path, depth)))
+        cases.append(('session filter', timed(email_logs.search, path, session_id='session-3')))
+        cases.append(('status=FAILED', timed(email_logs.search, path, statuses=['FAILED'])))
+        cases.append(('domain=shop.net', timed(email_logs.search, path, domain='shop.net')))
+        cases.append(('since/until (one day)', timed(email_logs.search, path, since='2025-01-02', until='2025-01-03')))
+        cases.append(('like "florist dental"', timed(like_search, path, 'florist dental')))
+        cases.append(('fts "florist dental"', timed(email_logs.search, path, text='florist dental')))
+        cases.append(('like "lead 4242"', timed(like_search, path, 'Lead 4242')))
+        cases.append(('fts "lead 4242"', timed(email_logs.search, path, text='Lead 4242')))
+        for label, seconds in cases:
+            print(f'{n:>9} {label:<28} {seconds * 1000:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# Runs a real send job against an SMTP sink that throttles per recipient domain (451 past its limit)
+# and hangs up with 421 now and then. Every message must end up delivered exactly once; the table shows
+# how long that took and the per-domain rates the scheduler settled on.
+#   python backend/benchmarks/bench_rate_limit.py --messages 200 --start-rates 0.5 20
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import CANNED_EMAIL, SMTPSink, synthetic_recipients
+
+DOMAIN_LIMITS = {'gmail.com': 8, 'outlook.com': 3, 'yahoo.com': 2}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--start-rates', type=float, nargs='+', default=[0.5, 20],
+                        help='initial per-domain rates (msg/s) to start the scheduler from')
+    parser.add_argument('--account-rate', type=float, default=50)
+    parser.add_argument('--drop-every', type=int, default=40)
+    parser.add_argument('--backoff', type=float, default=1)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='pixelsolve-bench-')
+    os.environ['DB_FILE'] = os.path.join(tmp, 'email_log.db')
+    os.environ['UPLOAD_FOLDER'] = os.path.join(tmp, 'uploads')
+    import app
+    import db
+    from rate_limit import SendScheduler
+    from send_engine import Account
+
+    domains = tuple(DOMAIN_LIMITS) + ('example.com',)
+    print(f'{"start rate":>10} {"messages":>8} {"seconds":>8} {"msg/s":>7} {"451s":>5} {"421s":>5} {"lost":>5} {"dupes":>5}  final domain rates')
+    for start_rate in args.start_rates:
+        with SMTPSink(domain_limits=DOMAIN_LIMITS, drop_every=args.drop_every) as sink:
+            host, port = sink.address
+            app.send_engine.set_accounts([Account('bench@pixelsolve.co', 'secret', host, port, use_ssl=False, sessions=1)])
+            app.send_engine.scheduler = SendScheduler(account_rate=args.account_rate, domain_rate=start_rate, backoff_base=args.backoff)
+            app.SEND_MAX_ATTEMPTS = 50
+            session_id = f'bench-{start_rate}'
+            state = app.session_progress(session_id)
+            recipients = synthetic_recipients(args.messages, session_id, domains=domains)
+            for r in recipients:
+                _, writes = app.record_generated_email(r, CANNED_EMAIL.format(name=r['Business Name']), '', session_id, state)
+                db.write_many(app.DB_FILE, writes)
+            db.flush(app.DB_FILE)
+
+            start = time.perf_counter()
+            job_id = app.enqueue_send_job('send', session_id, batch_size=25, delay_range=(0, 0))
+            app.run_job(job_id)
+            elapsed = time.perf_counter() - start
+
+            expected = {r['Email'] for r in recipients}
+            lost = len(expected - set(sink.delivered))
+            dupes = sum(1 for count in sink.delivered.values() if count > 1)
+            rates = app.send_engine.scheduler.snapshot()['domains']
+            print(f'{start_rate:>10} {args.messages:>8} {elapsed:>8.2f} {args.messages / elapsed:>7.1f} '
+                  f'{sink.stats["rejected_451"]:>5} {sink.stats["dropped_421"]:>5} {lost:>5} {dupes:>5}  {rates}')
+
+
+if __name__ == '__main__':
+    main()
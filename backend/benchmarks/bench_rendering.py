@@ -0,0 +1,62 @@
+# Message assembly cost: the old per-send path (import re, two splitlines() scans, re.sub with
+# uncompiled patterns, then MIME) vs rendering.parse_model_output once + build_message per send.
+#   python backend/benchmarks/bench_rendering.py --messages 100000
+import argparse
+import os
+import sys
+import time
+from email.mime.text import MIMEText
+from email.utils import formataddr
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import CANNED_EMAIL
+import rendering
+
+SENDER = 'bench@pixelsolve.co'
+
+
+def legacy_message(model_output, email):
+    import re  # For post-processing
+    lines = model_output.splitlines()
+    subject_line = next((l for l in lines if l.strip().lower().startswith('subject:')), lines[0] if lines else 'PixelSolve Cold Email')
+    subject = subject_line.replace('**', '').replace('Subject:', '').strip()
+    body_start = next((i for i, l in enumerate(lines) if l.strip().lower().startswith('hi') or l.strip().lower().startswith('hello')), 1)
+    body = '\n'.join(lines[body_start:]).lstrip('\n')
+    body = re.sub(r'\bin\s*,', '', body)
+    body = re.sub(r'\bin\s+$', '', body)
+    body = re.sub(r'(with:)\s*', r'\1\n', body)
+    msg = MIMEText(body, 'plain')
+    msg['Subject'] = subject
+    msg['From'] = formataddr(("The PixelSolve Team", SENDER))
+    msg['To'] = email
+    return msg.as_string()
+
+
+def timed(label, n, fn):
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    print(f'{label:<34} {n:>8} {elapsed:>8.2f} {n / elapsed:>10.0f}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=100000)
+    args = parser.parse_args()
+    n = args.messages
+    outputs = [CANNED_EMAIL.format(name=f'Cafe {i}') for i in range(n)]
+    rendered = []
+
+    print(f'{"stage":<34} {"messages":>8} {"seconds":>8} {"msg/s":>10}')
+    timed('legacy: parse + MIME per send', n, lambda i: legacy_message(outputs[i], f'lead{i}@example.com'))
+    timed('parse once (generation time)', n, lambda i: rendered.append(rendering.parse_model_output(outputs[i])))
+    timed('send path: build_message only', n, lambda i: rendering.build_message(*rendered[i], SENDER, f'lead{i}@example.com'))
+    timed('send path: parse + build_message', n, lambda i: rendering.build_message(*rendering.parse_model_output(outputs[i]), SENDER, f'lead{i}@example.com'))
+
+
+if __name__ == '__main__':
+    main()
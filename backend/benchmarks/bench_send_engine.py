@@ -0,0 +1,72 @@
+# Send-job throughput through the async engine as sender accounts and sessions are added. Each account
+# talks to its own SMTP sink (think one mailbox per provider) that takes --message-latency per message.
+# 1 account x 1 session is the old one-message-at-a-time loop.
+#   python backend/benchmarks/bench_send_engine.py --messages 400 --setups 1x1 1x4 4x4 --quota 0
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import CANNED_EMAIL, SMTPSink, synthetic_recipients
+
+DOMAINS = ('gmail.com', 'outlook.com', 'yahoo.com', 'example.com')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=400)
+    parser.add_argument('--setups', nargs='+', default=['1x1', '1x4', '4x4'], help='ACCOUNTSxSESSIONS')
+    parser.add_argument('--message-latency', type=float, default=0.05)
+    parser.add_argument('--connect-latency', type=float, default=0.05)
+    parser.add_argument('--quota', type=int, default=0, help='daily quota per account (0 = unlimited)')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='pixelsolve-bench-')
+    os.environ['DB_FILE'] = os.path.join(tmp, 'email_log.db')
+    os.environ['UPLOAD_FOLDER'] = os.path.join(tmp, 'uploads')
+    import app
+    import db
+    from rate_limit import SendScheduler
+    from send_engine import Account, QuotaBook
+
+    print(f'{"setup":>6} {"messages":>8} {"sent":>6} {"held":>6} {"seconds":>8} {"msg/s":>8}  sent per account')
+    for setup in args.setups:
+        n_accounts, sessions = (int(x) for x in setup.split('x'))
+        sinks = [SMTPSink(connect_latency=args.connect_latency, message_latency=args.message_latency).start()
+                 for _ in range(n_accounts)]
+        app.send_engine.set_accounts([Account(f'sender{i}@pixelsolve.co', 'secret', *sink.address, use_ssl=False,
+                                              daily_quota=args.quota, sessions=sessions) for i, sink in enumerate(sinks)])
+        # Measure the engine, not the provider limits
+        app.send_engine.scheduler = SendScheduler(account_rate=10000, domain_rate=10000)
+        app.send_engine.quota = QuotaBook(app.DB_FILE)
+        db.execute(app.DB_FILE, 'DELETE FROM send_quota')
+        session_id = f'bench-{setup}'
+        state = app.session_progress(session_id)
+        for r in synthetic_recipients(args.messages, session_id, domains=DOMAINS):
+            _, writes = app.record_generated_email(r, CANNED_EMAIL.format(name=r['Business Name']), '', session_id, state)
+            db.write_many(app.DB_FILE, writes)
+        db.flush(app.DB_FILE)
+
+        job_id = app.enqueue_send_job('send', session_id, batch_size=50, delay_range=(0, 0))
+        start = time.perf_counter()
+        if args.quota:
+            # Messages over quota are held until tomorrow, so run the job until only those are left
+            app.start_job(job_id)
+            while sum(s.stats['messages'] for s in sinks) < min(args.messages, args.quota * n_accounts):
+                time.sleep(0.05)
+        else:
+            app.run_job(job_id)
+        elapsed = time.perf_counter() - start
+        sent = [s.stats['messages'] for s in sinks]
+        print(f'{setup:>6} {args.messages:>8} {sum(sent):>6} {args.messages - sum(sent):>6} {elapsed:>8.2f} {sum(sent) / elapsed:>8.1f}  {sent}')
+        for sink in sinks:
+            sink.stop()
+
+
+if __name__ == '__main__':
+    main()
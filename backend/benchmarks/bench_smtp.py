@@ -0,0 +1,64 @@
+# Messages/second with a fresh SMTP login per message (the old send path) vs the pooled sender.
+#   python backend/benchmarks/bench_smtp.py --messages 500 --connect-latency 0.05 --login-latency 0.05
+import argparse
+import os
+import smtplib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import CANNED_EMAIL, SMTPSink
+from smtp_pool import SMTPPool
+
+SENDER = 'bench@pixelsolve.co'
+
+
+def message(i):
+    msg = MIMEText(CANNED_EMAIL.format(name=f'Cafe {i}'), 'plain')
+    msg['Subject'] = 'Benchmark'
+    msg['From'] = SENDER
+    msg['To'] = f'lead{i}@example.com'
+    return msg.as_string()
+
+
+def send_unpooled(host, port, i):
+    with smtplib.SMTP(host, port) as server:
+        server.login(SENDER, 'secret')
+        server.sendmail(SENDER, [f'lead{i}@example.com'], message(i))
+
+
+def run(label, messages, threads, send):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(send, range(messages)))
+    elapsed = time.perf_counter() - start
+    print(f'{label:<28} {messages:>8} {elapsed:>8.2f} {messages / elapsed:>8.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--pool-size', type=int, default=1)
+    parser.add_argument('--connect-latency', type=float, default=0.05)
+    parser.add_argument('--login-latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    with SMTPSink(connect_latency=args.connect_latency, login_latency=args.login_latency) as sink:
+        host, port = sink.address
+        print(f'{"mode":<28} {"messages":>8} {"seconds":>8} {"msg/s":>8}')
+        run('login per message', args.messages, args.threads, lambda i: send_unpooled(host, port, i))
+        pool = SMTPPool(host, port, SENDER, 'secret', size=args.pool_size, use_ssl=False)
+        run(f'pooled (size={args.pool_size})', args.messages, args.threads,
+            lambda i: pool.sendmail(SENDER, [f'lead{i}@example.com'], message(i)))
+        pool.close_idle()
+        print('pool stats:', pool.stats)
+
+
+if __name__ == '__main__':
+    main()
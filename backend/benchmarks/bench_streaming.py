@@ -0,0 +1,49 @@
+# Streaming vs blocking generation against a fake Ollama that sometimes emits a [LOCATION]
+# placeholder and keeps chatting after the sign-off. Streaming aborts those outputs early.
+#   python backend/benchmarks/bench_streaming.py --rows 40 --token-rate 200 --placeholder-every 2
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import FakeOllama, synthetic_recipients
+from llm_router import Backend
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--token-rate', type=float, default=200)
+    parser.add_argument('--placeholder-every', type=int, default=2)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='pixelsolve-bench-')
+    os.environ['DB_FILE'] = os.path.join(tmp, 'email_log.db')
+    os.environ['UPLOAD_FOLDER'] = os.path.join(tmp, 'uploads')
+    import app
+
+    print(f'{"mode":<10} {"rows":>6} {"seconds":>8} {"requests":>9} {"tokens":>8} {"failed":>7}')
+    for stream in (False, True):
+        with FakeOllama(latency=args.latency, token_rate=args.token_rate,
+                        placeholder_every=args.placeholder_every, chatter=True) as ollama:
+            app.llm_router.set_backends([Backend(ollama.url)])
+            app.OLLAMA_STREAM = stream
+            app.generation_cache.clear()
+            session_id = f'bench-{"stream" if stream else "block"}'
+            start = time.perf_counter()
+            app.background_generate_emails(synthetic_recipients(args.rows, session_id), session_id, workers=args.workers)
+            elapsed = time.perf_counter() - start
+            failed = sum(1 for e in app.session_progress(session_id)['emails'].values() if e['status'] == 'FAILED')
+            label = 'stream' if stream else 'blocking'
+            print(f'{label:<10} {args.rows:>6} {elapsed:>8.2f} {ollama.requests:>9} {ollama.tokens_served:>8} {failed:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# Full-email generation vs template-first (model fills subject/opening/hook as JSON, the rest is
+# rendered locally): output tokens and seconds per email against a token-rate-limited fake Ollama.
+#   python backend/benchmarks/bench_template.py --rows 40 --token-rate 60 --workers 4
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import FakeOllama, synthetic_recipients
+from llm_router import Backend
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--token-rate', type=float, default=60)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='pixelsolve-bench-')
+    os.environ['DB_FILE'] = os.path.join(tmp, 'email_log.db')
+    os.environ['UPLOAD_FOLDER'] = os.path.join(tmp, 'uploads')
+    import app
+
+    print(f'{"mode":<10} {"rows":>6} {"seconds":>8} {"s/email":>8} {"tokens/email":>13} {"failed":>7}')
+    for mode in ('full', 'template'):
+        with FakeOllama(latency=args.latency, token_rate=args.token_rate) as ollama:
+            app.llm_router.set_backends([Backend(ollama.url, max_concurrency=args.workers)])
+            app.GENERATION_MODE = mode
+            app.generation_cache.clear()
+            session_id = f'bench-{mode}'
+            start = time.perf_counter()
+            app.background_generate_emails(synthetic_recipients(args.rows, session_id), session_id, workers=args.workers)
+            elapsed = time.perf_counter() - start
+            failed = sum(1 for e in app.session_progress(session_id)['emails'].values() if e['status'] == 'FAILED')
+            # Latency one lead sees, independent of how many run in parallel
+            per_email = elapsed * args.workers / args.rows
+            print(f'{mode:<10} {args.rows:>6} {elapsed:>8.2f} {per_email:>8.2f} {ollama.tokens_served / args.rows:>13.1f} {failed:>7}')
+
+
+if __name__ == '__main__':
+    main()
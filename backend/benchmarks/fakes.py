@@ -0,0 +1,419 @@
+# Local stand-ins for the services the app talks to, used by the benchmarks.
+import collections
+import json
+import multiprocessing
+import re
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_EMAIL = '''Subject: Boost {name}'s Online Reach with a Loyalty App & More ☕️🚀
+
+Hi {name} Team,
+
+What if your regulars came back twice as often?
+
+I recently came across your café in Austin, USA and was impressed by your vibe and strong Instagram presence. Your customers clearly love what you do!
+
+At PixelSolve, we help coffee shops like yours grow with:
+• Branded Loyalty Apps – Reward loyal customers and boost repeat visits 🎉
+• Mobile Ordering – Make it easy for customers to order and pay 📱
+• Local Influencer Marketing – Get your brand noticed by more people 🚀
+
+Many cafés have seen 30–50% more engagement with these solutions.
+
+Open to a quick demo? Even a short reply is welcome.
+
+Best regards,
+The PixelSolve Team
+www.pixelsolve.co'''
+# What the model returns in template mode (GENERATION_MODE=template)
+CANNED_SUBJECT = "Boost {name}'s Online Reach with a Loyalty App & More ☕️🚀"
+CANNED_OPENING = 'What if your regulars came back twice as often?'
+CANNED_HOOK = 'Your Instagram shows how much Austin, USA already loves your coffee.'
+TOKEN_RE = re.compile(r'\S+\s*|\s+')
+
+
+def prompt_text(payload):
+    # /api/generate sends a prompt, /api/chat a list of messages
+    if 'messages' in payload:
+        return ''.join(m.get('content', '') for m in payload['messages'])
+    return payload.get('prompt', '')
+
+
+def parse_duration(value, default):
+    # Ollama's keep_alive: seconds or '30s' / '5m' / '1h'; negative = stay loaded
+    if value in (None, ''):
+        return default
+    if isinstance(value, str) and value[-1:] in 'smh':
+        seconds = float(value[:-1]) * {'s': 1, 'm': 60, 'h': 3600}[value[-1]]
+    else:
+        seconds = float(value)
+    return float('inf') if seconds < 0 else seconds
+
+
+def common_prefix(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+# --- Fake Ollama ---
+class FakeOllama:
+    # latency: seconds before the first token; token_rate: output tokens per second (0 = instant).
+    # placeholder_every: every Nth completion contains a [LOCATION] placeholder;
+    # chatter: the model keeps talking after the sign-off, like llama3 often does.
+    # parallel: generations served at once (OLLAMA_NUM_PARALLEL); 0 = unlimited. healthy=False answers 503.
+    # prefill_rate: prompt tokens processed per second before the first token (0 = free). With prefix_cache,
+    # each slot keeps its last prompt and only the part after the longest shared prefix is processed again.
+    # load_seconds: cold start when the model isn't loaded; it unloads after keep_alive idle seconds (the
+    # request's keep_alive, else this default) and loses the cached prefixes.
+    def __init__(self, latency=0.5, token_rate=0, placeholder_every=0, chatter=False, parallel=0, prefill_rate=0,
+                 prefix_cache=True, load_seconds=0.0, keep_alive=300, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.placeholder_every = placeholder_every
+        self.chatter = chatter
+        self.healthy = True
+        self.slots = threading.Semaphore(parallel) if parallel else None
+        self.prefill_rate = prefill_rate
+        self.prefix_cache = prefix_cache
+        self.load_seconds = load_seconds
+        self.keep_alive = keep_alive
+        self.cached_prompts = []  # one per slot, most recently used last
+        self.cache_slots = parallel or 4
+        self.loaded_until = 0.0
+        self.requests = 0
+        self.tokens_served = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.loads = 0
+        self.ttft_seconds = 0.0
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def unavailable(self):
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_GET(self):
+                if not fake.healthy:
+                    self.unavailable()
+                    return
+                body = json.dumps({'models': [{'name': 'llama3'}]}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                if not fake.healthy:
+                    self.unavailable()
+                    return
+                payload['chat'] = self.path.startswith('/api/chat')
+                if fake.slots:
+                    with fake.slots:
+                        self.generate(payload)
+                else:
+                    self.generate(payload)
+
+            def generate(self, payload):
+                with fake.lock:
+                    fake.requests += 1
+                    n = fake.requests
+                text = fake.completion(payload)
+                if fake.placeholder_every and n % fake.placeholder_every == 0:
+                    text = text.replace('Austin, USA', '[LOCATION]')
+                if fake.chatter:
+                    text += '\n\nLet me know if you would like any changes to this email!'
+                tokens = TOKEN_RE.findall(text)
+                first_token = fake.latency + fake.prefill(payload)
+                if payload.get('stream', True):
+                    self.stream(payload, tokens, first_token)
+                    return
+                time.sleep(first_token + (len(tokens) / fake.token_rate if fake.token_rate else 0))
+                fake.count_tokens(len(tokens))
+                body = json.dumps(fake.chunk(payload, text, done=True, eval_count=len(tokens))).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def stream(self, payload, tokens, first_token):
+                # NDJSON, one chunk per token; stops as soon as the client hangs up
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.end_headers()
+                time.sleep(first_token)
+                try:
+                    for token in tokens:
+                        self.wfile.write(json.dumps(fake.chunk(payload, token, done=False)).encode() + b'\n')
+                        self.wfile.flush()
+                        fake.count_tokens(1)
+                        if fake.token_rate:
+                            time.sleep(1 / fake.token_rate)
+                    self.wfile.write(json.dumps(fake.chunk(payload, '', done=True, eval_count=len(tokens))).encode() + b'\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    def count_tokens(self, n):
+        with self.lock:
+            self.tokens_served += n
+
+    def prefill(self, payload):
+        # Seconds spent before the first token beyond the fixed latency: loading the model, then the prompt
+        # tokens not covered by a cached prefix
+        tokens = TOKEN_RE.findall(prompt_text(payload))
+        keep_alive = parse_duration(payload.get('keep_alive'), self.keep_alive)
+        with self.lock:
+            now = time.monotonic()
+            seconds = 0.0
+            if now > self.loaded_until:
+                seconds += self.load_seconds
+                self.loads += 1
+                self.cached_prompts = []
+            reused, slot = 0, None
+            if self.prefix_cache:
+                for i, cached in enumerate(self.cached_prompts):
+                    shared = common_prefix(cached, tokens)
+                    if shared > reused:
+                        reused, slot = shared, i
+            if slot is not None:
+                del self.cached_prompts[slot]
+            self.cached_prompts = (self.cached_prompts + [tokens])[-self.cache_slots:]
+            if self.prefill_rate:
+                seconds += (len(tokens) - reused) / self.prefill_rate
+            self.loaded_until = now + seconds + keep_alive
+            self.prompt_tokens += len(tokens)
+            self.cached_tokens += reused
+            self.ttft_seconds += self.latency + seconds
+        return seconds
+
+    def chunk(self, payload, text, done, **extra):
+        if payload.get('chat'):
+            return dict({'model': payload.get('model'), 'message': {'role': 'assistant', 'content': text}, 'done': done}, **extra)
+        return dict({'model': payload.get('model'), 'response': text, 'done': done}, **extra)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/api/generate'
+
+    def completion(self, payload):
+        prompt = prompt_text(payload)
+        names = [line.split(':', 1)[1].strip() or 'Your Business' for line in prompt.splitlines() if line.startswith('Business Name:')]
+        name = names[-1] if names else 'Your Business'
+        if payload.get('format') == 'json' and '"emails"' in prompt:
+            # Several businesses in one request (email_template.BATCH_SLOT_PROMPT), each echoing its email
+            emails = [line.split(':', 1)[1].strip() for line in prompt.splitlines() if line.startswith('Email:')]
+            return json.dumps({'emails': [{'id': i, 'email': e, 'subject': CANNED_SUBJECT.format(name=n), 'opening': CANNED_OPENING,
+                                           'hook': CANNED_HOOK} for i, (n, e) in enumerate(zip(names, emails), 1)]}, ensure_ascii=False)
+        if payload.get('format') == 'json':
+            # Template mode: only the personalized slots
+            return json.dumps({'subject': CANNED_SUBJECT.format(name=name), 'opening': CANNED_OPENING,
+                               'hook': CANNED_HOOK}, ensure_ascii=False)
+        return CANNED_EMAIL.format(name=name)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _serve_ollama(conn, kwargs):
+    with FakeOllama(**kwargs) as fake:
+        conn.send(fake.url)
+        while True:
+            try:
+                command = conn.recv()
+            except EOFError:
+                return
+            if command not in ('down', 'up'):
+                return
+            fake.healthy = command == 'up'
+
+
+def spawn_ollama(**kwargs):
+    # A FakeOllama in its own process, so several of them don't share one GIL. Returns (process, conn, url);
+    # conn.send('down') / conn.send('up') toggles its health, conn.send(None) stops it.
+    conn, child = multiprocessing.Pipe()
+    proc = multiprocessing.Process(target=_serve_ollama, args=(child, kwargs), daemon=True)
+    proc.start()
+    return proc, conn, conn.recv()
+
+
+# --- Local SMTP sink ---
+class SMTPSink:
+    # Plain-text SMTP server that accepts AUTH and swallows messages.
+    # connect_latency / login_latency stand in for the TLS handshake and auth round-trips of a real provider.
+    # domain_limits ({'gmail.com': 5}) caps accepted recipients per domain per second and answers the rest
+    # with 451; drop_every=N answers every Nth MAIL FROM with 421 and hangs up, like an overloaded provider.
+    # message_latency is how long the server takes to accept each message after DATA. starttls=True
+    # advertises STARTTLS but refuses it (454), to check that a client upgrades before it logs in.
+    def __init__(self, connect_latency=0.0, login_latency=0.0, domain_limits=None, drop_every=0, message_latency=0.0,
+                 host='127.0.0.1', port=0, starttls=False):
+        self.connect_latency = connect_latency
+        self.login_latency = login_latency
+        self.message_latency = message_latency
+        self.domain_limits = domain_limits or {}
+        self.drop_every = drop_every
+        self.starttls = starttls
+        self.stats = {'connections': 0, 'logins': 0, 'messages': 0, 'mail_from': 0, 'rejected_451': 0, 'dropped_421': 0,
+                      'starttls': 0}
+        self.accepted = collections.defaultdict(collections.deque)  # domain: recent accept times
+        self.delivered = collections.Counter()  # recipient: messages received
+        self.lock = threading.Lock()
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode() + b'\r\n')
+
+            def handle(self):
+                sink.count('connections')
+                time.sleep(sink.connect_latency)
+                self.reply('220 sink ESMTP')
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    response = sink.command(self, line.decode('utf-8', 'replace').rstrip('\r\n'))
+                    if response is None:
+                        return
+                    self.reply(response)
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.server.allow_reuse_address = True
+        self.thread = None
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+            return self.stats[key]
+
+    def admit(self, rcpt):
+        # Sliding one-second window per recipient domain
+        domain = rcpt.rsplit('@', 1)[-1].lower()
+        limit = self.domain_limits.get(domain)
+        if not limit:
+            return True
+        now = time.monotonic()
+        with self.lock:
+            window = self.accepted[domain]
+            while window and now - window[0] >= 1:
+                window.popleft()
+            if len(window) >= limit:
+                self.stats['rejected_451'] += 1
+                return False
+            window.append(now)
+            return True
+
+    def command(self, handler, line):
+        verb = line.split(' ', 1)[0].upper()
+        if verb == 'EHLO':
+            handler.reply('250-sink')
+            if self.starttls:
+                handler.reply('250-STARTTLS')
+            handler.reply('250-AUTH PLAIN LOGIN')
+            return '250 8BITMIME'
+        if verb == 'STARTTLS':
+            self.count('starttls')
+            return '454 4.7.0 TLS not available due to temporary reason'
+        if verb == 'HELO':
+            return '250 sink'
+        if verb == 'AUTH':
+            time.sleep(self.login_latency)
+            parts = line.split()
+            if len(parts) == 2 and parts[1].upper() == 'LOGIN':
+                handler.reply('334 VXNlcm5hbWU6')
+                handler.rfile.readline()
+                handler.reply('334 UGFzc3dvcmQ6')
+                handler.rfile.readline()
+            self.count('logins')
+            return '235 Authentication successful'
+        if verb == 'MAIL':
+            handler.rcpts = []
+            mail_from = self.count('mail_from')
+            if self.drop_every and mail_from % self.drop_every == 0:
+                self.count('dropped_421')
+                handler.reply('421 4.7.0 Too many connections, try again later')
+                return None
+            return '250 OK'
+        if verb == 'RCPT':
+            rcpt = line.split(':', 1)[-1].strip().strip('<>')
+            if not self.admit(rcpt):
+                return '451 4.7.1 Rate limited, try again later'
+            handler.rcpts = getattr(handler, 'rcpts', []) + [rcpt]
+            return '250 OK'
+        if verb == 'DATA':
+            handler.reply('354 End data with <CR><LF>.<CR><LF>')
+            while handler.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                pass
+            time.sleep(self.message_latency)
+            self.count('messages')
+            with self.lock:
+                self.delivered.update(getattr(handler, 'rcpts', []))
+            return '250 OK queued'
+        if verb == 'QUIT':
+            handler.reply('221 Bye')
+            return None
+        return '250 OK'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# --- Synthetic leads ---
+def synthetic_recipients(n, session_id='bench', domains=('example.com',)):
+    return [{
+        'Business Name': f'Cafe {i}',
+        'Type': 'Coffee Shop',
+        'City': 'Austin',
+        'Country': 'USA',
+        'Email': f'lead{i}@{domains[i % len(domains)]}',
+        'session_id': session_id,
+    } for i in range(n)]
@@ -0,0 +1,231 @@
+# --- Data access layer ---
+# Every handler goes through here: SQLite in WAL mode with tuned pragmas, one reused connection per
+# thread for reads and immediate writes, and a group-commit writer that batches inserts and status
+# updates into a single transaction per short time/size window.
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+import metrics
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',  # in WAL mode only checkpoints fsync
+    'PRAGMA busy_timeout=30000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-20000',  # ~20MB page cache
+)
+
+# Group-commit window: commit after this many seconds or statements, whichever comes first
+COMMIT_DELAY = 0.05
+COMMIT_BATCH = 1000
+
+local = threading.local()
+writers = {}
+writers_lock = threading.Lock()
+log = logging.getLogger(__name__)
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_conn(path):
+    # Thread-local connection reuse; closed automatically when the thread exits
+    conns = getattr(local, 'conns', None)
+    if conns is None:
+        conns = local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = connect(path)
+    return conn
+
+
+def query(path, sql, args=()):
+    return get_conn(path).execute(sql, args).fetchall()
+
+
+def query_one(path, sql, args=()):
+    return get_conn(path).execute(sql, args).fetchone()
+
+
+def execute(path, sql, args=()):
+    # Immediate write + commit, for callers that need the result (rowcount, lastrowid) right away
+    conn = get_conn(path)
+    try:
+        with metrics.DB_COMMIT_SECONDS.time(writer='immediate'):
+            cur = conn.execute(sql, args)
+            conn.commit()
+        metrics.DB_STATEMENTS.inc(writer='immediate')
+        return cur
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def executemany(path, sql, rows):
+    conn = get_conn(path)
+    try:
+        with metrics.DB_COMMIT_SECONDS.time(writer='immediate'):
+            cur = conn.executemany(sql, rows)
+            conn.commit()
+        metrics.DB_STATEMENTS.inc(max(cur.rowcount, 0), writer='immediate')
+        return cur
+    except Exception:
+        conn.rollback()
+        raise
+
+
+class GroupCommitWriter:
+    def __init__(self, path, delay=COMMIT_DELAY, batch=COMMIT_BATCH):
+        self.path = path
+        self.delay = delay
+        self.batch = batch
+        self.queue = queue.Queue()
+        self.stats = {'statements': 0, 'commits': 0, 'errors': 0, 'skipped': 0}
+        self.thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self.thread.start()
+
+    def write(self, statements, guarded=False):
+        # statements: [(sql, args)], applied all-or-nothing. guarded: the first statement is a check, and when
+        # it changes no row the group is dropped (not an error)
+        self.queue.put((list(statements), guarded))
+
+    def flush(self, timeout=None):
+        # Blocks until everything written before this call is committed (or has failed and been logged)
+        done = threading.Event()
+        self.queue.put((None, done))
+        return done.wait(timeout)
+
+    def _run(self):
+        conn = connect(self.path)
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.delay
+            while len(batch) < self.batch and batch[-1][0] is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(conn, batch)
+
+    def _commit(self, conn, batch):
+        groups = [(statements, guarded) for statements, guarded in batch if statements]
+        if groups:
+            start = time.perf_counter()
+            committed = 0
+            try:
+                conn.execute('BEGIN')
+                for statements, guarded in groups:
+                    # Each caller's group in its own savepoint: a failing group is rolled back on its own
+                    # and doesn't take the rest of the batch with it
+                    conn.execute('SAVEPOINT grp')
+                    try:
+                        applied = self._apply(conn, statements, guarded)
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO grp')
+                        self._failed(statements, e)
+                    else:
+                        if applied:
+                            committed += len(statements)
+                        else:
+                            conn.execute('ROLLBACK TO grp')
+                            self.stats['skipped'] += 1
+                    conn.execute('RELEASE grp')
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                committed = 0
+                for statements, _ in groups:
+                    self._failed(statements, e)
+            else:
+                self.stats['commits'] += 1
+                metrics.DB_COMMIT_SECONDS.observe(time.perf_counter() - start, writer='group')
+            self.stats['statements'] += committed
+            metrics.DB_STATEMENTS.inc(committed, writer='group')
+        for statements, done in batch:
+            if statements is None:
+                done.set()
+
+    def _apply(self, conn, statements, guarded):
+        for i, (sql, args) in enumerate(statements):
+            cur = conn.execute(sql, args)
+            if guarded and i == 0 and cur.rowcount == 0:
+                return False
+        return True
+
+    def _failed(self, statements, error):
+        self.stats['errors'] += 1
+        metrics.DB_WRITE_ERRORS.inc()
+        log.error('group-commit write to %s failed, %d statement(s) rolled back (%s): %s', self.path,
+                  len(statements), ', '.join(sql.split()[0] for sql, _ in statements), error)
+
+
+def get_writer(path):
+    with writers_lock:
+        if path not in writers:
+            writers[path] = GroupCommitWriter(path)
+        return writers[path]
+
+
+def write(path, sql, args=()):
+    get_writer(path).write([(sql, args)])
+
+
+def write_many(path, statements, guarded=False):
+    # Group-committed like write(), but the statements ([(sql, args)]) commit or roll back together;
+    # guarded=True drops them all when the first one changes no row
+    get_writer(path).write(statements, guarded)
+
+
+def flush(path):
+    if path in writers:
+        with metrics.DB_FLUSH_SECONDS.time():
+            writers[path].flush()
+
+
+@atexit.register
+def flush_all():
+    for writer in list(writers.values()):
+        writer.flush(timeout=5)
+
+
+# --- Schema migrations ---
+def migrate(path, migrations):
+    # migrations: ordered (version, steps); a step is an SQL string or a callable(conn).
+    # Each version is applied once, in its own transaction, and recorded in schema_version.
+    conn = get_conn(path)
+    conn.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)')
+    conn.commit()
+    for version, steps in migrations:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Re-checked under the write lock so two processes starting together don't both apply it
+            current = conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+            if version <= current:
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute('INSERT INTO schema_version (version) VALUES (?)', (version,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return schema_version(path)
+
+
+def schema_version(path):
+    return query_one(path, 'SELECT COALESCE(MAX(version), 0) FROM schema_version')[0]
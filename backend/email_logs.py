@@ -0,0 +1,78 @@
+# --- Browsing the email log ---
+# Keyset (cursor) pagination over emails, newest first by (sent_at, id), with optional filters, a column
+# projection and full-text search. Every filter has an index that yields rows in (sent_at, id) order, so a
+# page costs the same at row 100 and at row 10 million.
+import base64
+import json
+
+import db
+
+DEFAULT_FIELDS = ('name', 'email', 'business_type', 'status', 'model_output', 'error', 'sent_at')
+FIELDS = DEFAULT_FIELDS + ('session_id', 'country', 'subject', 'body')
+MAX_LIMIT = 1000
+# Must match idx_emails_domain_sent_at (schema migration 8) for the index to be used
+DOMAIN_SQL = "lower(substr(email, instr(email, '@') + 1))"
+
+
+def encode_cursor(sent_at, row_id):
+    return base64.urlsafe_b64encode(json.dumps([sent_at, row_id]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        sent_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(sent_at), int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def match_query(text):
+    # Each word as a quoted prefix term, so user input can't trip FTS5 query syntax
+    terms = ['"' + word.replace('"', '""') + '"*' for word in text.split()]
+    return ' '.join(terms)
+
+
+def fts_available(db_file):
+    return db.query_one(db_file, "SELECT 1 FROM sqlite_master WHERE name = 'emails_fts'") is not None
+
+
+def search(db_file, session_id=None, statuses=(), since=None, until=None, domain=None, text=None,
+           fields=DEFAULT_FIELDS, cursor=None, limit=100):
+    # Returns (rows as dicts, next cursor or None). since/until are 'YYYY-MM-DD[ HH:MM:SS]' (until exclusive).
+    fields = [f for f in fields if f in FIELDS] or list(DEFAULT_FIELDS)
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    where, args = [], []
+    if session_id:
+        where.append('session_id = ?')
+        args.append(session_id)
+    if statuses:
+        where.append(f"status IN ({','.join('?' * len(statuses))})")
+        args.extend(statuses)
+    if since:
+        where.append('sent_at >= ?')
+        args.append(since)
+    if until:
+        where.append('sent_at < ?')
+        args.append(until)
+    if domain:
+        where.append(f'{DOMAIN_SQL} = ?')
+        args.append(domain.strip().lower().lstrip('@'))
+    if text and text.strip():
+        if fts_available(db_file):
+            where.append('id IN (SELECT rowid FROM emails_fts WHERE emails_fts MATCH ?)')
+            args.append(match_query(text))
+        else:
+            # SQLite built without FTS5: a scan with substring matches instead of indexed word prefixes
+            for word in text.split():
+                where.append("(COALESCE(name, '') || ' ' || COALESCE(email, '') || ' ' || COALESCE(subject, '') || ' ' || COALESCE(body, '')) LIKE ?")
+                args.append(f'%{word}%')
+    if cursor:
+        where.append('(sent_at, id) < (?, ?)')
+        args.extend(decode_cursor(cursor))
+    columns = ['id', 'sent_at'] + [f for f in fields if f != 'sent_at']
+    sql = f"SELECT {', '.join(columns)} FROM emails {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY sent_at DESC, id DESC LIMIT ?"
+    db.flush(db_file)
+    rows = db.query(db_file, sql, args + [limit + 1])
+    logs = [{k: v for k, v in zip(columns, row) if k == 'id' or k in fields} for row in rows[:limit]]
+    next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+    return logs, next_cursor
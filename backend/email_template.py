@@ -0,0 +1,167 @@
+# --- Template-first generation ---
+# The model only writes the parts that change per lead (subject, opening line, hook) as a small JSON
+# object; the fixed pitch, bullets and signature are filled in locally.
+import json
+import re
+
+SLOT_PROMPT = '''
+You write the personalized parts of a cold email from PixelSolve, a digital agency that builds branded
+loyalty apps, mobile ordering and local influencer marketing for small businesses.
+
+Reply with ONLY a JSON object with exactly these keys:
+- "subject": a subject line that instantly grabs attention and curiosity, mentioning the business name, with 1-2 friendly emojis (max 80 characters)
+- "opening": one opening sentence that makes the owner curious about the opportunity (max 30 words)
+- "hook": one sentence with a personalized observation about this business, or "" if there is nothing specific to say (max 30 words)
+
+Rules:
+- No markdown, no placeholders in square brackets, no greeting or signature.
+- Only mention the location exactly as given, or not at all.
+
+Business data:
+'''
+
+# Same instructions for several businesses in one request (GENERATION_BATCH_SIZE); kept free of anything
+# per-batch so every request starts with the same prefix
+BATCH_SLOT_PROMPT = '''
+You write the personalized parts of cold emails from PixelSolve, a digital agency that builds branded
+loyalty apps, mobile ordering and local influencer marketing for small businesses. You will get several
+businesses, numbered. Write for each one separately and never mix up their details.
+
+Reply with ONLY a JSON object {"emails": [...]} holding one object per business, in the order given, each
+with exactly these keys:
+- "id": the number of the business
+- "email": the business's email address, copied exactly as given
+- "subject": a subject line that instantly grabs attention and curiosity, mentioning the business name, with 1-2 friendly emojis (max 80 characters)
+- "opening": one opening sentence that makes the owner curious about the opportunity (max 30 words)
+- "hook": one sentence with a personalized observation about this business, or "" if there is nothing specific to say (max 30 words)
+
+Rules:
+- No markdown, no placeholders in square brackets, no greeting or signature.
+- Only mention a location exactly as given for that business, or not at all.
+
+Businesses:
+'''
+
+EMAIL_TEMPLATE = '''Subject: {subject}
+
+Hi {name} Team,
+
+{opening}
+
+I recently came across your {place}{location} and was impressed by your vibe and strong Instagram presence. Your customers clearly love what you do!
+{hook}
+At PixelSolve, we help {plural} like yours grow with:
+• Branded Loyalty Apps – Reward loyal customers and boost repeat visits 🎉
+• Mobile Ordering – Make it easy for customers to order and pay 📱
+• Local Influencer Marketing – Get your brand noticed by more people 🚀
+
+Many businesses like yours have seen 30–50% more engagement with these solutions.
+
+Open to a quick demo? Even a short reply is welcome.
+
+Best regards,
+The PixelSolve Team
+www.pixelsolve.co'''
+
+SLOT_LIMITS = {'subject': 80, 'opening': 40, 'hook': 40}  # subject in characters, the rest in words
+PLACEHOLDER_RE = re.compile(r'\[[^\]]*\]')
+JSON_OBJECT_RE = re.compile(r'\{.*\}', re.DOTALL)
+
+
+def recipient_location(recipient):
+    # Rows from ingest.normalize_chunk already carry 'City, Country' (else the sheet's Location) as Location
+    if 'Location' in recipient:
+        return str(recipient['Location'])
+    return f"{str(recipient.get('City', '')).strip()}, {str(recipient.get('Country', '')).strip()}".strip(', ')
+
+
+def slot_data_block(recipient):
+    return f"""
+Business Name: {recipient.get('Business Name', '')}
+Type: {recipient.get('Type', '')}
+Location: {recipient_location(recipient)}
+Has Website: {recipient.get('Has Website', '')}
+Instagram Presence: {recipient.get('Instagram Presence', '')}
+Personalized Hook / Observation: {recipient.get('Personalized Hook / Observation', '')}
+"""
+
+
+def build_slot_prompt(recipient):
+    return SLOT_PROMPT + slot_data_block(recipient)
+
+
+def batch_data_block(recipients):
+    # The email is only there to be echoed back, so each answer can be checked against its business
+    return ''.join(f"\nBusiness {i}:\nEmail: {r.get('Email', '')}{slot_data_block(r)}" for i, r in enumerate(recipients, 1))
+
+
+def load_json_object(text):
+    match = JSON_OBJECT_RE.search(text or '')
+    try:
+        return json.loads(match.group(0)) if match else None
+    except ValueError:
+        return None
+
+
+def parse_slots(text):
+    # Returns (slots, problem); problem is 'invalid_json', 'placeholder' or 'too_long'
+    return check_slots(load_json_object(text))
+
+
+def parse_batch(text, recipients):
+    # One (slots, problem) per recipient of a batch request. The answer is only trusted when its ids are
+    # exactly 1..n: otherwise every business gets 'mismatch', since slots can't be told apart safely.
+    # An entry that doesn't echo its business's email gets 'mismatch' too.
+    count = len(recipients)
+    data = load_json_object(text)
+    entries = data.get('emails') if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        return [(None, 'invalid_json')] * count
+    by_id = {}
+    for entry in entries:
+        entry_id = entry.get('id') if isinstance(entry, dict) else None
+        if not isinstance(entry_id, int) or isinstance(entry_id, bool) or entry_id in by_id:
+            return [(None, 'mismatch')] * count
+        by_id[entry_id] = entry
+    if set(by_id) != set(range(1, count + 1)):
+        return [(None, 'mismatch')] * count
+    results = []
+    for i, recipient in enumerate(recipients, 1):
+        entry = by_id[i]
+        if str(entry.get('email') or '').strip().lower() != str(recipient.get('Email', '')).strip().lower():
+            results.append((None, 'mismatch'))
+        else:
+            results.append(check_slots(entry))
+    return results
+
+
+def check_slots(data):
+    if not isinstance(data, dict) or not str(data.get('subject') or '').strip() or not str(data.get('opening') or '').strip():
+        return None, 'invalid_json'
+    slots = {key: ' '.join(str(data.get(key) or '').replace('**', '').split()) for key in SLOT_LIMITS}
+    if any(PLACEHOLDER_RE.search(value) for value in slots.values()):
+        return slots, 'placeholder'
+    if len(slots['subject']) > SLOT_LIMITS['subject'] * 1.5 or any(len(slots[k].split()) > SLOT_LIMITS[k] for k in ('opening', 'hook')):
+        return slots, 'too_long'
+    return slots, None
+
+
+def pluralize(word):
+    if word.endswith('y') and word[-2:-1] not in 'aeiou':
+        return word[:-1] + 'ies'
+    if word.endswith(('s', 'x', 'ch', 'sh')):
+        return word + 'es'
+    return word + 's'
+
+
+def render_email(recipient, slots):
+    business_type = str(recipient.get('Type', '')).strip()
+    location = recipient_location(recipient)
+    return EMAIL_TEMPLATE.format(
+        subject=slots['subject'],
+        name=str(recipient.get('Business Name', '')).strip() or 'there',
+        opening=slots['opening'],
+        place=business_type.lower() or 'business',
+        location=f' in {location}' if location else '',
+        hook=f"\n{slots['hook']}\n" if slots.get('hook') else '',
+        plural=pluralize(business_type.lower()) if business_type else 'businesses')
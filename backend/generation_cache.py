@@ -0,0 +1,91 @@
+# --- Content-addressed cache for LLM generations ---
+# Keyed by sha256(model, prompt, options); stored in its own SQLite file, evicted least-recently-used.
+import hashlib
+import json
+import threading
+import time
+
+import db
+import metrics
+
+
+class GenerationCache:
+    def __init__(self, path, max_entries=50000, max_bytes=200 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        conn = db.get_conn(self.path)
+        conn.execute('''CREATE TABLE IF NOT EXISTS generation_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            response TEXT,
+            size INTEGER,
+            created_at REAL,
+            last_used REAL
+        )''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_generation_cache_last_used ON generation_cache(last_used)')
+        conn.commit()
+        self.entries, self.bytes = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM generation_cache').fetchone()
+
+    @staticmethod
+    def make_key(model, prompt, options=None):
+        material = json.dumps({'model': model, 'prompt': prompt, 'options': options or {}}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        row = db.query_one(self.path, 'SELECT response FROM generation_cache WHERE key = ?', (key,))
+        if row:
+            # LRU bookkeeping doesn't need to be durable right away
+            db.write(self.path, 'UPDATE generation_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+        with self.lock:
+            self.counters['hits' if row else 'misses'] += 1
+        metrics.GENERATION_CACHE.inc(result='hit' if row else 'miss')
+        return row[0] if row else None
+
+    def put(self, key, model, response):
+        size = len(response.encode('utf-8'))
+        now = time.time()
+        conn = db.get_conn(self.path)
+        with self.lock:
+            existed = conn.execute('SELECT size FROM generation_cache WHERE key = ?', (key,)).fetchone()
+            conn.execute('INSERT OR REPLACE INTO generation_cache (key, model, response, size, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)',
+                         (key, model, response, size, now, now))
+            if existed:
+                self.bytes += size - existed[0]
+            else:
+                self.entries += 1
+                self.bytes += size
+            self.counters['stores'] += 1
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn):
+        # Drop least-recently-used rows until both the entry and byte budgets hold
+        while self.entries > self.max_entries or self.bytes > self.max_bytes:
+            overflow = max(self.entries - self.max_entries, 1)
+            rows = conn.execute('SELECT key, size FROM generation_cache ORDER BY last_used LIMIT ?', (overflow,)).fetchall()
+            if not rows:
+                self.entries, self.bytes = 0, 0
+                return
+            conn.executemany('DELETE FROM generation_cache WHERE key = ?', [(k,) for k, _ in rows])
+            self.entries -= len(rows)
+            self.bytes -= sum(size for _, size in rows)
+            self.counters['evictions'] += len(rows)
+
+    def clear(self):
+        db.flush(self.path)
+        with self.lock:
+            db.execute(self.path, 'DELETE FROM generation_cache')
+            self.entries, self.bytes = 0, 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return dict(self.counters,
+                        entries=self.entries,
+                        bytes=self.bytes,
+                        max_entries=self.max_entries,
+                        max_bytes=self.max_bytes,
+                        hit_rate=round(self.counters['hits'] / lookups, 4) if lookups else 0.0)
@@ -0,0 +1,208 @@
+# --- Streaming lead-sheet ingestion ---
+# Reads .xlsx (openpyxl read_only) or .csv in chunks of rows and normalizes each chunk as a pandas frame
+# (column aliases, stripping, email extraction/validation, dedup) with vectorized string ops, so
+# generation can start while the rest of the file is still being parsed.
+import os
+import re
+
+import pandas as pd
+from openpyxl import load_workbook
+
+try:
+    import pyarrow  # noqa: F401
+    pyarrow_available = True
+except ImportError:
+    pyarrow_available = False
+
+SUPPORTED_EXTENSIONS = ('.xlsx', '.csv')
+# Local parts use the usual RFC 5322 atom characters (plus addressing, apostrophes, ...); the first one must be
+# a word character so quotes around an address in free text aren't taken as part of it
+LOCAL_PART = r"\w[\w.!#$%&'*+/=?^`{|}~-]*"
+# Address inside a free-text Contact field
+EMAIL_RE = re.compile(LOCAL_PART + r'@[\w\.-]+')
+# Full-address check applied to every lead: local part, then a domain with a dotted TLD (lower-cased input)
+DOMAIN_RE = r'[\w-]+(?:\.[\w-]+)*\.[a-z]{2,}'
+VALID_EMAIL_RE = LOCAL_PART + '@' + DOMAIN_RE
+# Header spellings seen in lead sheets (compared lower-cased) -> the column names the app uses
+COLUMN_ALIASES = {
+    'email': 'Email', 'e-mail': 'Email', 'email address': 'Email',
+    'contact': 'Contact', 'contact info': 'Contact', 'contact details': 'Contact',
+    'location': 'Location', 'address': 'Location',
+    'business name': 'Business Name', 'business': 'Business Name', 'company': 'Business Name',
+    'type': 'Type', 'business type': 'Type', 'category': 'Type',
+    'city': 'City', 'country': 'Country',
+}
+# Lower-cased email, used for dedup; dropped before rows become job items
+KEY = '_key'
+# Arrow-backed strings run pandas' str methods in C++; without pyarrow they run per element in Python
+TEXT_DTYPE = 'string[pyarrow]' if pyarrow_available else object
+
+
+# --- Helper: Extract email from contact field ---
+def extract_email(contact):
+    if not isinstance(contact, str):
+        return ''
+    match = EMAIL_RE.search(contact)
+    return match.group(0) if match else ''
+
+
+def cell_to_str(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def recipient_country(recipient):
+    # Country column if present, else the last part of 'City, Country' style Location
+    country = (recipient.get('Country') or '').strip()
+    if not country:
+        location = (recipient.get('Location') or '').strip()
+        country = location.split(',')[-1].strip() if ',' in location else ''
+    return country or 'Unknown'
+
+
+def canonical_column(name):
+    name = cell_to_str(name)
+    return COLUMN_ALIASES.get(name.lower(), name)
+
+
+def column_to_str(column):
+    # cell_to_str for a whole column: missing -> '', whole floats without '.0', stripped
+    if pd.api.types.is_float_dtype(column):
+        whole = column.notna() & (column % 1 == 0)
+        text = column.astype(str).where(~whole, column.where(whole, 0).astype('int64').astype(str))
+        return text.where(column.notna(), '').str.strip()
+    return column.fillna('').astype(str).astype(TEXT_DTYPE).str.strip()
+
+
+def estimate_rows(path):
+    # Cheap upper bound for the progress bar (xlsx dimension tag, or a line count for csv).
+    # Returns None when the workbook does not record its dimensions.
+    if path.lower().endswith('.csv'):
+        with open(path, 'rb') as f:
+            return max(sum(1 for _ in f) - 1, 0)
+    wb = load_workbook(path, read_only=True)
+    try:
+        max_row = wb.active.max_row
+        return max(max_row - 1, 0) if max_row else None
+    finally:
+        wb.close()
+
+
+def iter_row_chunks(path, start_row=0, chunk_size=1000, first_chunk=None):
+    # Yields (frame, first_row_index): up to chunk_size raw rows under the sheet's own headers. Blank rows
+    # don't count towards row indexes. The first chunk can be smaller so the first lead comes out right away.
+    size = first_chunk or chunk_size
+    if path.lower().endswith('.csv'):
+        reader = pd.read_csv(path, dtype=TEXT_DTYPE, keep_default_na=False, encoding='utf-8-sig', iterator=True)
+        row_index = 0
+        try:
+            while True:
+                frame = reader.get_chunk(size)
+                if row_index + len(frame) > start_row:
+                    skip = max(start_row - row_index, 0)
+                    yield frame.iloc[skip:].reset_index(drop=True), row_index + skip
+                row_index += len(frame)
+                size = chunk_size
+        except StopIteration:
+            return
+        finally:
+            reader.close()
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [cell_to_str(h) for h in header]
+
+        def to_frame(chunk):
+            frame = pd.DataFrame(chunk, dtype=object).reindex(columns=range(len(header)))
+            frame.columns = header
+            return frame
+
+        chunk, chunk_start, row_index = [], start_row, 0
+        for values in rows:
+            if values is None or all(v is None for v in values):
+                continue
+            if row_index >= start_row:
+                chunk.append(values)
+                if len(chunk) >= size:
+                    yield to_frame(chunk), chunk_start
+                    chunk_start += len(chunk)
+                    chunk, size = [], chunk_size
+            row_index += 1
+        if chunk:
+            yield to_frame(chunk), chunk_start
+    finally:
+        wb.close()
+
+
+def normalize_chunk(frame, first_row, session_id, seen=None):
+    # One chunk of raw rows -> frame of unique, valid recipients (in sheet order), one column per field.
+    # seen holds the keys of earlier chunks and is updated in place.
+    names = [canonical_column(c) for c in frame.columns]
+    keep = [bool(n) and n not in names[:i] for i, n in enumerate(names)]
+    frame = pd.DataFrame({n: column_to_str(frame.iloc[:, i]) for i, n in enumerate(names) if keep[i]})
+    frame['_row'] = range(first_row, first_row + len(frame))
+
+    # Email column as written (an address that isn't valid drops the row rather than being guessed at),
+    # falling back to the address inside Contact. Extraction is a regex replace (runs natively on Arrow
+    # strings, str.extract doesn't); a sentence-ending '.' is not part of the address.
+    email = frame['Email'] if 'Email' in frame else pd.Series('', index=frame.index, dtype=TEXT_DTYPE)
+    if 'Contact' in frame:
+        text = frame['Contact']
+        found = text.str.replace(f'(?s)^.*?({EMAIL_RE.pattern}).*$', r'\1', regex=True).str.rstrip('.')
+        email = email.where(email != '', found.where(text.str.contains(EMAIL_RE.pattern), ''))
+    frame['Email'] = email
+    frame[KEY] = email.str.lower()
+    frame = frame[frame[KEY].str.fullmatch(VALID_EMAIL_RE)]
+    frame = frame.drop_duplicates(KEY)
+    if seen is not None:
+        # Set membership per key: Series.isin would rebuild a hash table of everything seen on every chunk
+        keys = frame[KEY].tolist()
+        frame = frame[[key not in seen for key in keys]]
+        seen.update(keys)
+
+    # 'City, Country' (else Location) once per chunk, and Country (else the tail of Location) for the log
+    sheet_location = frame['Location'] if 'Location' in frame else pd.Series('', index=frame.index, dtype=TEXT_DTYPE)
+    location = sheet_location
+    if 'City' in frame or 'Country' in frame:
+        combined = (frame.get('City', '') + ', ' + frame.get('Country', '')).str.strip(', ')
+        location = combined.where(combined != '', sheet_location)
+    if 'Country' not in frame:
+        tail = sheet_location.str.replace(r'^.*,', '', regex=True).str.strip()
+        frame['Country'] = tail.where(sheet_location.str.contains(',', regex=False), '')
+    frame['Location'] = location
+    frame['session_id'] = session_id
+    return frame
+
+
+def iter_recipient_chunks(path, session_id, start_row=0, chunk_size=1000, first_chunk=None, seen=None):
+    # Normalized frames, deduplicated across the whole file; each row carries its sheet row index in
+    # '_row' so an interrupted ingest can resume from start_row. A resumed ingest passes the keys (lower-cased
+    # emails) of the rows it already took in as seen, so their later duplicates stay out.
+    seen = set(seen or ())
+    for raw, first_row in iter_row_chunks(path, start_row, chunk_size, first_chunk):
+        frame = normalize_chunk(raw, first_row, session_id, seen)
+        if len(frame):
+            yield frame
+
+
+def to_payloads(frame):
+    # Job item payloads (JSON text, one per row), encoded column-wise by pandas rather than one dict at a time
+    text = frame.drop(columns=KEY).to_json(orient='records', lines=True, force_ascii=False)
+    return text.splitlines()
+
+
+def iter_recipients(path, session_id, already_in_db=(), start_row=0):
+    for frame in iter_recipient_chunks(path, session_id, start_row=start_row, first_chunk=1):
+        if already_in_db:
+            frame = frame[~frame[KEY].isin(already_in_db)]
+        yield from frame.drop(columns=KEY).to_dict('records')
+
+
+def is_supported(filename):
+    return os.path.splitext(filename or '')[1].lower() in SUPPORTED_EXTENSIONS
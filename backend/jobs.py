@@ -0,0 +1,164 @@
+# --- Durable SQLite-backed job queue ---
+# A job (generate / send / retry_failed / resend) owns a list of work items. Workers lease items for a
+# bounded time and mark them done; leases that expire (e.g. after a crash) go back to the pending pool,
+# so a restarted process picks up exactly where the last one stopped.
+import json
+import time
+import uuid
+
+import db
+import metrics
+
+UNFINISHED = ('queued', 'running')
+
+
+class JobQueue:
+    def __init__(self, db_file, lease_seconds=300):
+        self.db_file = db_file
+        self.lease_seconds = lease_seconds
+        # Tables come from schema.MIGRATIONS
+
+    # --- Jobs ---
+    def create_job(self, kind, session_id, params=None, ingest_done=False):
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        db.execute(self.db_file, 'INSERT INTO jobs (id, kind, session_id, status, params, ingest_done, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                   (job_id, kind, session_id, 'queued', json.dumps(params or {}), int(ingest_done), now, now))
+        return job_id
+
+    def get_job(self, job_id):
+        rows = self._query_jobs('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        return rows[0] if rows else None
+
+    def list_jobs(self, session_id=None, statuses=None, limit=100):
+        sql = 'SELECT * FROM jobs'
+        clauses, args = [], []
+        if session_id:
+            clauses.append('session_id = ?')
+            args.append(session_id)
+        if statuses:
+            clauses.append(f'status IN ({",".join("?" for _ in statuses)})')
+            args.extend(statuses)
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY created_at DESC LIMIT ?'
+        args.append(limit)
+        return self._query_jobs(sql, args)
+
+    def unfinished_jobs(self):
+        return list(reversed(self.list_jobs(statuses=UNFINISHED, limit=1000)))
+
+    def set_status(self, job_id, status, error=''):
+        db.flush(self.db_file)
+        db.execute(self.db_file, 'UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?', (status, error, time.time(), job_id))
+
+    def update_params(self, job_id, **changes):
+        # Merged into the stored params (a None value removes the key), e.g. a new worker count on resume
+        db.execute(self.db_file, 'UPDATE jobs SET params = json_patch(params, ?), updated_at = ? WHERE id = ?',
+                   (json.dumps(changes), time.time(), job_id))
+
+    def mark_ingest_done(self, job_id):
+        db.execute(self.db_file, 'UPDATE jobs SET ingest_done = 1, updated_at = ? WHERE id = ?', (time.time(), job_id))
+
+    def _query_jobs(self, sql, args):
+        cur = db.get_conn(self.db_file).execute(sql, args)
+        columns = [d[0] for d in cur.description]
+        jobs = []
+        for row in cur.fetchall():
+            job = dict(zip(columns, row))
+            job['params'] = json.loads(job['params'] or '{}')
+            job['ingest_done'] = bool(job['ingest_done'])
+            jobs.append(job)
+        return jobs
+
+    # --- Work items ---
+    def add_items(self, job_id, payloads, seqs=None):
+        # payloads are dicts, or JSON text already encoded by the caller
+        seqs = seqs if seqs is not None else range(len(payloads))
+        rows = [(job_id, seq, p if isinstance(p, str) else json.dumps(p)) for seq, p in zip(seqs, payloads)]
+        if not rows:
+            return 0
+        conn = db.get_conn(self.db_file)
+        try:
+            with metrics.DB_COMMIT_SECONDS.time(writer='immediate'):
+                conn.executemany('INSERT INTO job_items (job_id, seq, payload) VALUES (?, ?, ?)', rows)
+                conn.execute('UPDATE jobs SET total = total + ?, updated_at = ? WHERE id = ?', (len(rows), time.time(), job_id))
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return len(rows)
+
+    def item_values(self, job_id, field):
+        # Lower-cased payload[field] of every item queued so far, e.g. to keep deduplicating a resumed ingest
+        rows = db.query(self.db_file, "SELECT json_extract(payload, '$.' || ?) FROM job_items WHERE job_id = ?", (field, job_id))
+        return {str(value).lower() for value, in rows if value is not None}
+
+    def last_seq(self, job_id):
+        row = db.query_one(self.db_file, 'SELECT MAX(seq) FROM job_items WHERE job_id = ?', (job_id,))
+        return row[0] if row[0] is not None else -1
+
+    def lease(self, job_id, limit=1):
+        # Claim up to `limit` pending (or lease-expired) items; BEGIN IMMEDIATE serializes competing workers
+        now = time.time()
+        conn = db.get_conn(self.db_file)
+        start = time.perf_counter()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute('''SELECT id, payload FROM job_items
+                                   WHERE job_id = ? AND (status = 'pending' OR (status = 'leased' AND lease_until < ?))
+                                   ORDER BY seq LIMIT ?''', (job_id, now, limit)).fetchall()
+            conn.executemany('UPDATE job_items SET status = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?',
+                             [('leased', now + self.lease_seconds, item_id) for item_id, _ in rows])
+            if rows:
+                conn.execute("UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'", (now, job_id))
+            conn.commit()
+            metrics.DB_COMMIT_SECONDS.observe(time.perf_counter() - start, writer='lease')
+        except Exception:
+            conn.rollback()
+            raise
+        return [(item_id, json.loads(payload)) for item_id, payload in rows]
+
+    def complete(self, job_id, item_id, status='done', error='', writes=()):
+        # writes: the caller's own statements for this item ([(sql, args)]), committed atomically with the
+        # item's completion, so a crash can't leave a result recorded but its item still leased (or the reverse).
+        # Only the first completion of an item applies: if its lease lapsed and another worker took it too,
+        # the later one is dropped along with its writes.
+        db.write_many(self.db_file, [
+            ("UPDATE job_items SET status = ?, error = ? WHERE id = ? AND status = 'leased'", (status, error, item_id)),
+            ('UPDATE jobs SET done = done + 1, updated_at = ? WHERE id = ?', (time.time(), job_id)),
+        ] + list(writes), guarded=True)
+
+    def renew(self, item_ids):
+        # Extend the leases of items still being worked on, so they aren't handed to another worker
+        item_ids = list(item_ids)
+        until = time.time() + self.lease_seconds
+        for i in range(0, len(item_ids), 500):
+            chunk = item_ids[i:i + 500]
+            db.execute(self.db_file, f"UPDATE job_items SET lease_until = ? WHERE status = 'leased' AND id IN ({','.join('?' * len(chunk))})",
+                       [until] + chunk)
+
+    def defer(self, item_id, delay, error='', refund=False):
+        # Keep the item leased but let the lease lapse after `delay` seconds, so it is re-leased then.
+        # refund=True means it was never tried (held back by our own rate limit): don't count the attempt.
+        db.write(self.db_file, "UPDATE job_items SET lease_until = ?, error = ?, attempts = attempts - ? WHERE id = ? AND status = 'leased'",
+                 (time.time() + delay, error, int(refund), item_id))
+
+    def release_leases(self, job_id):
+        # Hand items leased by a process known to be gone (e.g. a killed CLI run) straight back to the pool
+        # instead of waiting for their leases to expire
+        return db.execute(self.db_file, "UPDATE job_items SET status = 'pending', lease_until = 0 WHERE job_id = ? AND status = 'leased'",
+                          (job_id,)).rowcount
+
+    def counts(self, job_id):
+        db.flush(self.db_file)
+        return dict(db.query(self.db_file, 'SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status', (job_id,)))
+
+    def attempts(self, item_id):
+        row = db.query_one(self.db_file, 'SELECT attempts FROM job_items WHERE id = ?', (item_id,))
+        return row[0] if row else 0
+
+    def outstanding(self, job_id):
+        db.flush(self.db_file)
+        row = db.query_one(self.db_file, "SELECT COUNT(*) FROM job_items WHERE job_id = ? AND status IN ('pending', 'leased')", (job_id,))
+        return row[0]
@@ -0,0 +1,154 @@
+# --- Routing generations across several Ollama instances ---
+# Each request goes to the healthy backend with the fewest outstanding requests relative to its weight,
+# never exceeding its max_concurrency. A backend that fails eject_after times in a row is ejected for
+# eject_seconds; a background health check (GET /api/tags) brings it back early once it answers again.
+import contextlib
+import json
+import threading
+import time
+
+import requests
+
+import metrics
+
+
+class Backend:
+    def __init__(self, url, weight=1.0, max_concurrency=4):
+        self.url = url
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        # Shared with /metrics (pixelsolve_ollama_request_seconds{backend=url})
+        self.latency = metrics.OLLAMA_REQUEST_SECONDS.labels(backend=url)
+
+    @property
+    def base_url(self):
+        return self.url.split('/api/', 1)[0]
+
+    def ejected(self, now):
+        return self.ejected_until > now
+
+    def snapshot(self, now):
+        return {
+            'url': self.url,
+            'weight': self.weight,
+            'max_concurrency': self.max_concurrency,
+            'outstanding': self.outstanding,
+            'healthy': not self.ejected(now),
+            'ejected_for': round(max(self.ejected_until - now, 0), 1),
+            'consecutive_failures': self.consecutive_failures,
+            'requests': self.requests,
+            'failures': self.failures,
+            'latency': self.latency.snapshot()
+        }
+
+
+def parse_backends(spec, default_url, default_concurrency):
+    # OLLAMA_BACKENDS is either a JSON list of {"url", "weight", "max_concurrency"} objects
+    # or a comma-separated list of URLs; empty means the single OLLAMA_URL endpoint
+    spec = (spec or '').strip()
+    if not spec:
+        return [Backend(default_url, max_concurrency=default_concurrency)]
+    if spec.startswith('['):
+        return [Backend(b['url'], weight=float(b.get('weight', 1)), max_concurrency=int(b.get('max_concurrency', default_concurrency)))
+                for b in json.loads(spec)]
+    return [Backend(url.strip(), max_concurrency=default_concurrency) for url in spec.split(',') if url.strip()]
+
+
+class LLMRouter:
+    def __init__(self, backends, eject_after=3, eject_seconds=30, health_interval=15):
+        self.backends = list(backends)
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.health_interval = health_interval
+        self.cond = threading.Condition()
+        self.health_thread = None
+
+    def set_backends(self, backends):
+        with self.cond:
+            self.backends = list(backends)
+            self.cond.notify_all()
+
+    def _pick(self, now):
+        live = [b for b in self.backends if not b.ejected(now)]
+        # Every backend ejected: keep trying all of them rather than stalling generation
+        candidates = [b for b in (live or self.backends) if b.outstanding < b.max_concurrency]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda b: ((b.outstanding + 1) / b.weight, b.latency.sum / (b.latency.count or 1)))
+
+    def acquire(self):
+        with self.cond:
+            while True:
+                backend = self._pick(time.monotonic())
+                if backend:
+                    backend.outstanding += 1
+                    backend.requests += 1
+                    return backend
+                self.cond.wait(1)
+
+    def release(self, backend, ok, seconds):
+        with self.cond:
+            backend.outstanding -= 1
+            if ok:
+                backend.consecutive_failures = 0
+                backend.ejected_until = 0.0
+                metrics.OLLAMA_REQUEST_SECONDS.observe(seconds, backend=backend.url)
+            else:
+                metrics.OLLAMA_FAILURES.inc(backend=backend.url)
+                backend.failures += 1
+                backend.consecutive_failures += 1
+                if backend.consecutive_failures >= self.eject_after:
+                    backend.ejected_until = time.monotonic() + self.eject_seconds
+            self.cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self):
+        backend = self.acquire()
+        start = time.perf_counter()
+        try:
+            yield backend
+        except Exception:
+            self.release(backend, False, time.perf_counter() - start)
+            raise
+        self.release(backend, True, time.perf_counter() - start)
+
+    def live_count(self):
+        now = time.monotonic()
+        with self.cond:
+            return sum(1 for b in self.backends if not b.ejected(now))
+
+    # --- Health checks ---
+    def check_health(self):
+        for backend in list(self.backends):
+            if not backend.ejected(time.monotonic()):
+                continue
+            try:
+                requests.get(backend.base_url + '/api/tags', timeout=5).raise_for_status()
+            except Exception:
+                continue
+            with self.cond:
+                backend.ejected_until = 0.0
+                backend.consecutive_failures = 0
+                self.cond.notify_all()
+
+    def start_health_checks(self):
+        if self.health_thread or not self.health_interval:
+            return
+
+        def loop():
+            while True:
+                time.sleep(self.health_interval)
+                self.check_health()
+
+        self.health_thread = threading.Thread(target=loop, daemon=True)
+        self.health_thread.start()
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.cond:
+            return [b.snapshot(now) for b in self.backends]
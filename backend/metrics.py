@@ -0,0 +1,246 @@
+# --- Instrumentation ---
+# Process-wide counters and histograms with Prometheus-style labels, rendered in its text exposition
+# format for /metrics. Timed phases can also be charged to the job running in the current context, which
+# gives the per-job breakdown of where a campaign's wall-clock time went.
+import bisect
+import collections
+import contextlib
+import contextvars
+import threading
+import time
+
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)  # Ollama requests, whole generations
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)  # SMTP phases, SQLite
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+
+class LatencyHistogram:
+    # One labelled series: bucket counts (last slot is +Inf), count and sum
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def snapshot(self):
+        with self.lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        cumulative, running = {}, 0
+        for bound, n in zip(list(self.buckets) + ['+Inf'], counts):
+            running += n
+            cumulative[str(bound)] = running
+        return {'buckets': cumulative, 'count': count, 'sum': round(total, 3)}
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def render(self):
+        with self.lock:
+            series = sorted(self.series.items())
+        return self.header() + [f'{self.name}{format_labels(dict(zip(self.label_names, key)))} {value:g}' for key, value in series]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS, job_phase=None):
+        super().__init__(name, help_text, labels)
+        self.buckets = buckets
+        # Name the per-job breakdown entry observations are charged to; may use labels, e.g. 'smtp_{phase}'
+        self.job_phase = job_phase
+
+    def labels(self, **labels):
+        key = self.key(labels)
+        with self.lock:
+            if key not in self.series:
+                self.series[key] = LatencyHistogram(self.buckets)
+            return self.series[key]
+
+    def observe(self, seconds, **labels):
+        self.labels(**labels).observe(seconds)
+        if self.job_phase:
+            job_timings.add(self.job_phase.format(**labels), seconds)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = self.header()
+        with self.lock:
+            series = sorted(self.series.items())
+        for key, histogram in series:
+            labels = dict(zip(self.label_names, key))
+            snap = histogram.snapshot()
+            for bound, count in snap['buckets'].items():
+                lines.append(f'{self.name}_bucket{format_labels(dict(labels, le=bound))} {count}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {histogram.sum:.6f}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {snap["count"]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS, job_phase=None):
+        metric = Histogram(name, help_text, labels, buckets, job_phase)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# --- Per-job timing breakdown ---
+current_job = contextvars.ContextVar('current_job', default=None)
+
+
+class JobTimings:
+    # Seconds and counts per phase for the most recent jobs run by this process. Phases overlap (a job
+    # runs many generations/deliveries at once), so they add up to more than the wall clock.
+    def __init__(self, keep=200):
+        self.keep = keep
+        self.jobs = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def start(self, job_id):
+        with self.lock:
+            entry = self.jobs.setdefault(job_id, {'started': time.time(), 'wall_seconds': 0.0, 'phases': {}})
+            entry['resumed'] = time.monotonic()
+            self.jobs.move_to_end(job_id)
+            while len(self.jobs) > self.keep:
+                self.jobs.popitem(last=False)
+
+    def stop(self, job_id):
+        with self.lock:
+            entry = self.jobs.get(job_id)
+            if entry:
+                entry['wall_seconds'] += time.monotonic() - entry.pop('resumed', time.monotonic())
+
+    def add(self, phase, seconds):
+        job_id = current_job.get()
+        if job_id is None:
+            return
+        with self.lock:
+            entry = self.jobs.get(job_id)
+            if entry is None:
+                return
+            totals = entry['phases'].setdefault(phase, {'seconds': 0.0, 'count': 0})
+            totals['seconds'] += seconds
+            totals['count'] += 1
+
+    def get(self, job_id):
+        with self.lock:
+            entry = self.jobs.get(job_id)
+            if entry is None:
+                return None
+            wall = entry['wall_seconds'] + (time.monotonic() - entry['resumed'] if 'resumed' in entry else 0)
+            phases = {name: {'seconds': round(t['seconds'], 3), 'count': t['count'],
+                             'avg_ms': round(t['seconds'] / t['count'] * 1000, 2) if t['count'] else 0}
+                      for name, t in sorted(entry['phases'].items(), key=lambda item: -item[1]['seconds'])}
+            return {'started': entry['started'], 'wall_seconds': round(wall, 3), 'running': 'resumed' in entry, 'phases': phases}
+
+
+job_timings = JobTimings()
+
+
+@contextlib.contextmanager
+def job_context(job_id):
+    # Charges timed phases on this thread (and asyncio tasks started from it) to job_id
+    token = current_job.set(job_id)
+    try:
+        yield
+    finally:
+        current_job.reset(token)
+
+
+# --- The metrics ---
+REGISTRY = Registry()
+
+GENERATION_SECONDS = REGISTRY.histogram(
+    'pixelsolve_generation_seconds', 'Time to produce one email, retries and cache lookups included.',
+    ('mode', 'outcome'), job_phase='generate')
+GENERATION_RETRIES = REGISTRY.counter(
+    'pixelsolve_generation_retries_total', 'Generation attempts repeated: rejected output (placeholder, too_long, no_sign_off, invalid_json) or backend failover.',
+    ('reason',))
+GENERATION_CACHE = REGISTRY.counter(
+    'pixelsolve_generation_cache_lookups_total', 'Generation cache lookups.', ('result',))
+OLLAMA_REQUEST_SECONDS = REGISTRY.histogram(
+    'pixelsolve_ollama_request_seconds', 'Successful Ollama requests, per backend.', ('backend',), job_phase='ollama')
+OLLAMA_FAILURES = REGISTRY.counter(
+    'pixelsolve_ollama_failures_total', 'Failed Ollama requests, per backend.', ('backend',))
+SMTP_SECONDS = REGISTRY.histogram(
+    'pixelsolve_smtp_seconds', 'SMTP phases: connect, login, noop probe, message transfer.',
+    ('phase',), buckets=FAST_BUCKETS, job_phase='smtp_{phase}')
+SEND_MESSAGES = REGISTRY.counter(
+    'pixelsolve_send_messages_total', 'Delivery attempts by outcome (sent, failed, deferred).', ('account', 'outcome'))
+RATE_LIMIT_EVENTS = REGISTRY.counter(
+    'pixelsolve_rate_limit_events_total', 'Sends slowed by rate limiting: inline waits, held items, provider deferrals, quota holds.',
+    ('event',))
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.histogram(
+    'pixelsolve_rate_limit_wait_seconds', 'Inline waits for a send token.', buckets=FAST_BUCKETS, job_phase='rate_limit_wait')
+DB_COMMIT_SECONDS = REGISTRY.histogram(
+    'pixelsolve_db_commit_seconds', 'SQLite write transactions: group-commit batches, immediate writes and job item leases.',
+    ('writer',), buckets=FAST_BUCKETS, job_phase='db_{writer}')
+DB_STATEMENTS = REGISTRY.counter(
+    'pixelsolve_db_statements_total', 'Statements committed to SQLite.', ('writer',))
+DB_WRITE_ERRORS = REGISTRY.counter(
+    'pixelsolve_db_write_errors_total', 'Group-commit statement groups rolled back because a statement (or the commit) failed.')
+DB_FLUSH_SECONDS = REGISTRY.histogram(
+    'pixelsolve_db_flush_wait_seconds', 'Time spent waiting for the group-commit writer to catch up.',
+    buckets=FAST_BUCKETS, job_phase='db_flush')
+INGEST_CHUNK_SECONDS = REGISTRY.histogram(
+    'pixelsolve_ingest_chunk_seconds', 'Reading, normalizing, deduplicating and queueing one chunk of an uploaded sheet.',
+    buckets=FAST_BUCKETS, job_phase='ingest')
+JOB_SECONDS = REGISTRY.histogram(
+    'pixelsolve_job_seconds', 'Job run time, per kind and final status.', ('kind', 'status'),
+    buckets=(1, 10, 60, 300, 900, 1800, 3600, 7200, 21600, 86400))
@@ -0,0 +1,210 @@
+# --- Headless campaign runner ---
+# Runs the same generate / send jobs as the Flask app from the command line (cron, batch hosts), against
+# the same SQLite store and .env settings. A generate job can be spread over several processes: the first
+# one reads the sheet into the job queue and every process leases rows from it, so they share the work
+# without splitting the file up front. Interrupted jobs continue from the last committed row.
+#   python backend/pixelsolve.py generate leads.xlsx --workers 8 --processes 4
+#   python backend/pixelsolve.py send --session <session_id> --batch-size 50 --delay 0 0
+#   python backend/pixelsolve.py resume --reclaim
+#   python backend/pixelsolve.py status
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+
+
+def configure(args):
+    # app reads its settings at import time, so overrides go into the environment first (and are
+    # inherited by worker processes)
+    if getattr(args, 'db', None):
+        os.environ['DB_FILE'] = args.db
+    if getattr(args, 'mode', None):
+        os.environ['GENERATION_MODE'] = args.mode
+
+
+def set_workers(app, job, workers):
+    # A generate job runs with the worker count stored in its params (every process reads it from there),
+    # so an override on resume is written back to the job
+    if workers and job['kind'] == 'generate':
+        app.job_queue.update_params(job['id'], workers=workers)
+
+
+def generate_worker(job_id):
+    # Extra process for a generate job: leases and generates rows, leaves reading the sheet to the parent
+    import app
+    import db
+    import metrics
+    job = app.job_queue.get_job(job_id)
+    with metrics.job_context(job_id):
+        app.run_generate_job(job, app.session_progress(job['session_id']), read_sheet=False)
+    db.flush(app.DB_FILE)
+
+
+def print_progress(app, job_id, started, done_before):
+    job = app.job_queue.get_job(job_id)
+    elapsed = time.monotonic() - started
+    rate = (job['done'] - done_before) / elapsed * 60 if elapsed else 0
+    total = f"{job['total']}" if job['ingest_done'] else f"{job['total']}+"
+    print(f"{elapsed:8.0f}s  {job['kind']:<12} {job['done']:>8}/{total:<9} {rate:>9.1f}/min", flush=True)
+
+
+def run(app, job_id, processes=1, interval=10):
+    # Runs a job to completion (with processes - 1 helper processes for generate jobs), printing progress
+    # every `interval` seconds and a throughput summary at the end
+    import metrics
+    job = app.job_queue.get_job(job_id)
+    done_before = job['done']
+    print(f"job {job_id} ({job['kind']}, session {job['session_id']}): {job['done']}/{job['total']} done before this run", flush=True)
+    helpers = []
+    if job['kind'] == 'generate' and processes > 1:
+        spawn = multiprocessing.get_context('spawn')
+        helpers = [spawn.Process(target=generate_worker, args=(job_id,)) for _ in range(processes - 1)]
+    started = time.monotonic()
+    thread = app.start_job(job_id)
+    for helper in helpers:
+        helper.start()
+    try:
+        while thread.is_alive():
+            thread.join(interval)
+            if thread.is_alive():
+                print_progress(app, job_id, started, done_before)
+        for helper in helpers:
+            helper.join()
+    except KeyboardInterrupt:
+        for helper in helpers:
+            helper.terminate()
+        print_progress(app, job_id, started, done_before)
+        print('interrupted; run `pixelsolve.py resume --reclaim` to continue from the last committed row')
+        # Leave without interpreter shutdown: the job thread would fail its next submit and mark the job
+        # failed, and resume only picks up unfinished jobs
+        import db
+        db.flush_all()
+        sys.stdout.flush()
+        os._exit(130)
+
+    elapsed = time.monotonic() - started
+    job = app.job_queue.get_job(job_id)
+    counts = app.job_queue.counts(job_id)
+    processed = job['done'] - done_before
+    print(f"\njob {job_id} {job['status']}{': ' + job['error'] if job['error'] else ''}")
+    print(f"  {processed} rows in {elapsed:.1f}s ({processed / max(elapsed, 1e-6) * 60:.1f}/min) "
+          f"across {processes} process{'es' if processes > 1 else ''}")
+    print('  items: ' + ', '.join(f'{status} {n}' for status, n in sorted(counts.items())))
+    timings = metrics.job_timings.get(job_id)
+    if timings and timings['phases']:
+        print('  this process: ' + ', '.join(f"{phase} {t['seconds']:.1f}s" for phase, t in list(timings['phases'].items())[:6]))
+    if job['kind'] != 'generate':
+        for account in app.send_engine.report():
+            print(f"  {account['user']}: sent {account['sent']}, failed {account['failed']}, deferred {account['deferred']}, "
+                  f"{account['sent_today']} today")
+    return job['status'] == 'done'
+
+
+def cmd_generate(args):
+    import app
+    filepath = os.path.abspath(args.file)
+    if not os.path.exists(filepath):
+        sys.exit(f'No such file: {args.file}')
+    if not app.ingest.is_supported(filepath):
+        sys.exit('Lead sheets must be .xlsx or .csv')
+    job = None
+    if not args.new:
+        # The same sheet again picks its unfinished job back up instead of starting over
+        for candidate in app.job_queue.list_jobs(statuses=app.UNFINISHED, limit=1000):
+            if candidate['kind'] == 'generate' and candidate['params'].get('filepath') == filepath:
+                job = candidate
+                break
+    if job:
+        print(f"resuming after row {app.job_queue.last_seq(job['id'])} of {args.file}")
+        if args.reclaim:
+            print(f"reclaimed {app.job_queue.release_leases(job['id'])} leased rows")
+        set_workers(app, job, args.workers)
+        job_id = job['id']
+    else:
+        session_id = args.session or str(uuid.uuid4())
+        job_id = app.job_queue.create_job('generate', session_id, {'filepath': filepath, 'filename': os.path.basename(filepath),
+                                                                   'workers': args.workers})
+    return run(app, job_id, args.processes, args.interval)
+
+
+def cmd_send(args):
+    import app
+    kind = 'retry_failed' if args.retry_failed else 'send'
+    if kind == 'send' and not args.session:
+        sys.exit('send needs --session (or --retry-failed)')
+    job_id = app.enqueue_send_job(kind, args.session, args.batch_size, tuple(args.delay))
+    return run(app, job_id, interval=args.interval)
+
+
+def cmd_resume(args):
+    import app
+    jobs = [app.job_queue.get_job(args.job)] if args.job else app.job_queue.unfinished_jobs()
+    jobs = [job for job in jobs if job and job['status'] in app.UNFINISHED]
+    if not jobs:
+        print('nothing to resume')
+        return True
+    ok = True
+    for job in jobs:
+        if args.reclaim:
+            print(f"reclaimed {app.job_queue.release_leases(job['id'])} leased rows of {job['id']}")
+        set_workers(app, job, args.workers)
+        ok = run(app, job['id'], args.processes, args.interval) and ok
+    return ok
+
+
+def cmd_status(args):
+    import app
+    jobs = app.job_queue.list_jobs(session_id=args.session, limit=args.limit)
+    print(f'{"job":<36} {"kind":<12} {"status":<8} {"done":>8} {"total":>8}  session')
+    for job in jobs:
+        print(f"{job['id']:<36} {job['kind']:<12} {job['status']:<8} {job['done']:>8} {job['total']:>8}  {job['session_id']}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='pixelsolve', description='Run PixelSolve campaigns without the web app.')
+    parser.add_argument('--db', help='email log database (default: DB_FILE from the environment / .env)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='read a lead sheet and generate its emails')
+    generate.add_argument('file')
+    generate.add_argument('--workers', type=int, help='concurrent generations per process (default GENERATION_WORKERS)')
+    generate.add_argument('--processes', type=int, default=1, help='processes sharing the job')
+    generate.add_argument('--mode', choices=('full', 'template'), help='override GENERATION_MODE')
+    generate.add_argument('--session', help='session id for the new campaign (default: a new one)')
+    generate.add_argument('--new', action='store_true', help="start over even if this sheet has an unfinished job")
+    generate.add_argument('--reclaim', action='store_true', help='when resuming, release rows leased by a killed run')
+    generate.add_argument('--interval', type=float, default=10, help='seconds between progress lines')
+    generate.set_defaults(handler=cmd_generate)
+
+    send = commands.add_parser('send', help="send a session's generated emails")
+    send.add_argument('--session')
+    send.add_argument('--retry-failed', action='store_true', help='retry every FAILED email instead')
+    send.add_argument('--batch-size', type=int, default=10)
+    send.add_argument('--delay', type=int, nargs=2, default=[8, 15], metavar=('MIN', 'MAX'),
+                      help='random pause in seconds after each batch (0 0 = none)')
+    send.add_argument('--interval', type=float, default=10)
+    send.set_defaults(handler=cmd_send)
+
+    resume = commands.add_parser('resume', help='finish unfinished jobs')
+    resume.add_argument('--job', help='only this job')
+    resume.add_argument('--workers', type=int, help='concurrent generations per process for generate jobs (default: as started)')
+    resume.add_argument('--processes', type=int, default=1)
+    resume.add_argument('--reclaim', action='store_true', help='release rows leased by a killed run first')
+    resume.add_argument('--interval', type=float, default=10)
+    resume.set_defaults(handler=cmd_resume)
+
+    status = commands.add_parser('status', help='list recent jobs')
+    status.add_argument('--session')
+    status.add_argument('--limit', type=int, default=20)
+    status.set_defaults(handler=cmd_status)
+
+    args = parser.parse_args()
+    configure(args)
+    sys.exit(0 if args.handler(args) else 1)
+
+
+if __name__ == '__main__':
+    main()
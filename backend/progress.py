@@ -0,0 +1,143 @@
+# --- Per-session progress tracking ---
+# Each campaign (session_id) gets its own progress dict, so concurrent jobs don't overwrite each other.
+# Every change is also published as a numbered delta event, which /api/progress/stream pushes to clients.
+import collections
+import threading
+import time
+
+lock = threading.Lock()
+sessions = collections.OrderedDict()  # least recently used first
+latest_session_id = None
+
+# Deltas kept per session; a client further behind than this gets a 'reset' and refetches the snapshot
+FEED_HISTORY = 5000
+# Finished sessions are dropped from memory beyond this many, or after this long without activity; they
+# are rebuilt from the DB (get_state's loader) the next time they are asked for. Running ones are kept.
+MAX_SESSIONS = 100
+SESSION_IDLE_SECONDS = 3600
+FINISHED_STATUSES = ('idle', 'done', 'error', 'failed')
+
+
+class Feed:
+    def __init__(self):
+        self.seq = 0
+        self.events = collections.deque(maxlen=FEED_HISTORY)
+        self.cond = threading.Condition()
+        self.updated = time.monotonic()
+        self.closed = False
+
+    def publish(self, event):
+        with self.cond:
+            self.seq += 1
+            event['seq'] = self.seq
+            self.events.append(event)
+            self.updated = time.monotonic()
+            self.cond.notify_all()
+
+    def close(self):
+        # The session was evicted: listeners get a reset and reattach to its rebuilt state
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def since(self, seq, timeout=0):
+        # Returns (events after seq, reset); blocks up to timeout seconds when there is nothing new
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            if seq > self.seq:
+                # The client's seq is from before this feed was rebuilt (restart or eviction)
+                return [], True
+            while self.seq <= seq and not self.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], False
+                self.cond.wait(remaining)
+            if self.closed or (self.events and self.events[0]['seq'] > seq + 1):
+                return [], True
+            return [e for e in self.events if e['seq'] > seq], False
+
+
+class SessionState(dict):
+    # A progress dict that publishes every top-level change to its feed
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.feed = Feed()
+        self.touched = time.monotonic()
+
+    def __setitem__(self, key, value):
+        changed = key not in self or self[key] != value
+        super().__setitem__(key, value)
+        if changed and key != 'emails':
+            self.feed.publish({'type': 'state', 'changes': {key: value}})
+
+    def set_email(self, email, data, publish=True):
+        self['emails'][email] = data
+        if publish:
+            self.feed.publish({'type': 'email', 'email': email, 'data': data})
+
+    def update_email(self, email, **fields):
+        if email in self['emails']:
+            self['emails'][email].update(fields)
+            self.feed.publish({'type': 'email', 'email': email, 'data': fields})
+
+    def snapshot(self):
+        # seq is read first: a client resuming from it may see a delta twice, never miss one
+        seq = self.feed.seq
+        snap = dict(self)
+        snap['emails'] = {email: dict(row) for email, row in list(self['emails'].items())}
+        snap['seq'] = seq
+        return snap
+
+
+def new_state(session_id):
+    return SessionState({
+        'session_id': session_id,
+        'job_id': None,
+        'total': 0,
+        'done': 0,
+        'emails': {},  # email: {name, business, model_output, status, error}
+        'status': 'idle',
+        'error': '',
+        'filename': '',
+        'message': '',
+        'batch_total': 0,
+        'batch_current': 0,
+        'wait_time': 0,
+        'throughput': {},  # send jobs: {sent, seconds, per_minute, by_account}
+        'current_session_id': session_id
+    })
+
+
+def get_state(session_id, loader=None):
+    # loader(session_id) -> state, used to rebuild progress from the DB after a restart
+    with lock:
+        state = sessions.get(session_id)
+        if state is None:
+            state = loader(session_id) if loader else None
+            state = state or new_state(session_id)
+            sessions[session_id] = state
+        else:
+            sessions.move_to_end(session_id)
+        state.touched = time.monotonic()
+        evict(keep=session_id)
+        return state
+
+
+def evict(keep=None):
+    # Caller holds lock. Walks from the least recently used end, skipping sessions that are still running
+    now = time.monotonic()
+    excess = len(sessions) - MAX_SESSIONS
+    for session_id, state in list(sessions.items()):
+        if session_id == keep or state['status'] not in FINISHED_STATUSES:
+            continue
+        idle = now - max(state.touched, state.feed.updated)
+        if excess <= 0 and idle < SESSION_IDLE_SECONDS:
+            continue
+        del sessions[session_id]
+        state.feed.close()
+        excess -= 1
+
+
+def set_latest(session_id):
+    global latest_session_id
+    latest_session_id = session_id
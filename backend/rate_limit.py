@@ -0,0 +1,133 @@
+# --- Adaptive send rate limiting ---
+# Token buckets per sender account and per recipient domain. Rates adapt AIMD-style: each delivery
+# nudges the rate up, each 4xx deferral from the provider halves it.
+import smtplib
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=1, min_rate=None, max_rate=None, increase=None, decrease=0.5):
+        self.rate = rate  # tokens (messages) per second
+        self.burst = burst
+        self.min_rate = min_rate if min_rate is not None else rate / 32
+        self.max_rate = max_rate if max_rate is not None else rate * 4
+        self.increase = increase if increase is not None else rate / 20
+        self.decrease = decrease
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        # now can predate a bucket created after the caller read the clock
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now):
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, now, pause=0.0):
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.tokens = min(self.tokens, 0)
+        self.blocked_until = max(self.blocked_until, now + pause)
+
+
+class SendScheduler:
+    def __init__(self, account_rate=1.0, domain_rate=0.5, domain_rates=None, burst=1,
+                 backoff_base=30, backoff_max=900):
+        self.account_rate = account_rate
+        self.domain_rate = domain_rate
+        self.domain_rates = domain_rates or {}  # e.g. {'gmail.com': 2.0}
+        self.burst = burst
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lock = threading.Lock()
+        self.accounts = {}
+        self.domains = {}
+        self.stats = {'sent': 0, 'deferred': 0, 'throttle_waits': 0}
+
+    def _bucket(self, table, key, rate):
+        bucket = table.get(key)
+        if bucket is None:
+            bucket = table[key] = TokenBucket(rate, burst=self.burst)
+        return bucket
+
+    def _buckets(self, account, domain):
+        return (self._bucket(self.accounts, account, self.account_rate),
+                self._bucket(self.domains, domain, self.domain_rates.get(domain, self.domain_rate)))
+
+    def reserve(self, account, domain):
+        # Takes a token from both buckets and returns 0, or returns how long to wait (taking nothing)
+        with self.lock:
+            now = time.monotonic()
+            buckets = self._buckets(account, domain)
+            wait = max(b.wait_time(now) for b in buckets)
+            if wait > 0:
+                self.stats['throttle_waits'] += 1
+                return wait
+            for b in buckets:
+                b.take(now)
+            return 0.0
+
+    def on_success(self, account, domain):
+        with self.lock:
+            for b in self._buckets(account, domain):
+                b.on_success()
+            self.stats['sent'] += 1
+
+    def on_deferral(self, account, domain, code, attempts):
+        # Back off the domain (and the account on 421, which is about the connection/sender);
+        # returns how long the deferred message should wait before it is retried
+        delay = min(self.backoff_max, self.backoff_base * 2 ** max(attempts - 1, 0))
+        with self.lock:
+            now = time.monotonic()
+            account_bucket, domain_bucket = self._buckets(account, domain)
+            domain_bucket.on_throttle(now, pause=delay / 2)
+            if code == 421:
+                account_bucket.on_throttle(now)
+            self.stats['deferred'] += 1
+        return delay
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'accounts': {k: round(b.rate, 3) for k, b in self.accounts.items()},
+                'domains': {k: round(b.rate, 3) for k, b in self.domains.items()},
+                **self.stats
+            }
+
+
+def smtp_reply_code(exc):
+    # The SMTP reply code behind a smtplib (or aiosmtplib) exception, if there is one
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in exc.recipients.values()]
+        return min(codes) if codes else None
+    if isinstance(getattr(exc, 'recipients', None), list):
+        codes = [r.code for r in exc.recipients if isinstance(getattr(r, 'code', None), int)]
+        return min(codes) if codes else None
+    code = getattr(exc, 'smtp_code', getattr(exc, 'code', None))
+    return code if isinstance(code, int) else None
+
+
+def is_transient(exc):
+    # Any 4xx reply means "try again later" rather than "never"
+    code = smtp_reply_code(exc)
+    if code is not None:
+        return 400 <= code < 500
+    # Providers that drop the session instead of replying, or only say so in free text
+    text = str(exc).lower()
+    return type(exc).__name__ == 'SMTPServerDisconnected' or 'rate' in text or 'limit' in text
+
+
+def recipient_domain(email):
+    return email.rsplit('@', 1)[-1].lower() if '@' in email else ''
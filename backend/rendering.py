@@ -0,0 +1,78 @@
+# --- Message assembly ---
+# Turns a model output into the subject/body that gets sent, once, at generation time; the send loop
+# only wraps the stored subject/body in a MIME message. Patterns are compiled once at import.
+import base64
+import re
+from email.charset import BASE64, Charset
+from email.header import Header
+from email.utils import formataddr
+
+FROM_NAME = 'The PixelSolve Team'
+DEFAULT_SUBJECT = 'PixelSolve Cold Email'
+
+PLACEHOLDER_RE = re.compile(r'\[(location|city|country)\]', re.IGNORECASE)
+# 'in ,' or 'in ' left over when the model had no location to put after 'in'
+DANGLING_IN_RE = re.compile(r'\bin\s*,')
+TRAILING_IN_RE = re.compile(r'\bin\s+$')
+# 'with:' is always followed by a newline
+WITH_COLON_RE = re.compile(r'(with:)\s*')
+# End of a complete email: a closing line ('Best regards,'), the team name, then the site on a line of its
+# own. The site mentioned anywhere else (e.g. in the opening line) doesn't end the email.
+SIGN_OFF_RE = re.compile(r'^[ \t]*[A-Za-z][A-Za-z ]{0,30},[ \t]*\n(?:[ \t]*\n)*'
+                         rf'[ \t]*{re.escape(FROM_NAME)}[ \t]*\n(?:[ \t]*\n)*'
+                         r'[ \t]*(?:https?://)?www\.pixelsolve\.co/?[ \t]*$', re.IGNORECASE | re.MULTILINE)
+
+
+def contains_placeholder(text):
+    # [Location], [LOCATION], [City], [Country] (case-insensitive)
+    return bool(PLACEHOLDER_RE.search(text))
+
+
+def sign_off_end(text):
+    # Index just past the sign-off block, or None while the email hasn't reached it
+    match = SIGN_OFF_RE.search(text)
+    return match.end() if match else None
+
+
+def parse_model_output(model_output):
+    # Returns (subject, body): the first 'Subject:' line (else the first line), and everything from the
+    # greeting ('Hi' / 'Hello', else the second line) on, post-processed
+    lines = (model_output or '').splitlines()
+    subject_line = None
+    body_start = None
+    for i, line in enumerate(lines):
+        lowered = line.strip().lower()
+        if subject_line is None and lowered.startswith('subject:'):
+            subject_line = line
+        if body_start is None and lowered.startswith(('hi', 'hello')):
+            body_start = i
+        if subject_line is not None and body_start is not None:
+            break
+    if subject_line is None:
+        subject_line = lines[0] if lines else DEFAULT_SUBJECT
+    subject = subject_line.replace('**', '').replace('Subject:', '').strip()
+    body = '\n'.join(lines[body_start if body_start is not None else 1:]).lstrip('\n')
+    body = DANGLING_IN_RE.sub('', body)
+    body = TRAILING_IN_RE.sub('', body)
+    body = WITH_COLON_RE.sub(r'\1\n', body)
+    return subject, body
+
+
+# Base64 for non-ASCII subjects: the default utf-8 charset tries quoted-printable too, and measuring
+# that is most of the cost of building a message with email.mime
+UTF8 = Charset('utf-8')
+UTF8.header_encoding = BASE64
+
+
+def build_message(subject, body, sender, recipient):
+    # Same wire format MIMEText(body, 'plain') produces (7bit for ASCII bodies, base64 otherwise),
+    # assembled directly instead of through the email package's generator
+    if body.isascii():
+        headers = 'Content-Type: text/plain; charset="us-ascii"\nMIME-Version: 1.0\nContent-Transfer-Encoding: 7bit\n'
+        payload = body
+    else:
+        headers = 'Content-Type: text/plain; charset="utf-8"\nMIME-Version: 1.0\nContent-Transfer-Encoding: base64\n'
+        payload = base64.encodebytes(body.encode('utf-8')).decode('ascii')
+    if not subject.isascii():
+        subject = Header(subject, UTF8, header_name='Subject').encode(linesep='\n')
+    return f'{headers}Subject: {subject}\nFrom: {formataddr((FROM_NAME, sender))}\nTo: {recipient}\n\n{payload}'
@@ -0,0 +1,226 @@
+# --- Email log DB schema, as ordered migrations (applied by db.migrate) ---
+import sqlite3
+
+from rendering import parse_model_output
+
+MIGRATIONS = [
+    # 1: original tables
+    (1, [
+        '''CREATE TABLE IF NOT EXISTS emails (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            email TEXT,
+            business_type TEXT,
+            status TEXT,
+            model_output TEXT,
+            error TEXT,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            session_id TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS sent_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            email TEXT,
+            subject TEXT,
+            body TEXT,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+    ]),
+    # 2: durable job queue
+    (2, [
+        '''CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT,
+            session_id TEXT,
+            status TEXT,
+            params TEXT,
+            total INTEGER DEFAULT 0,
+            done INTEGER DEFAULT 0,
+            ingest_done INTEGER DEFAULT 0,
+            error TEXT DEFAULT '',
+            created_at REAL,
+            updated_at REAL
+        )''',
+        '''CREATE TABLE IF NOT EXISTS job_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT,
+            seq INTEGER,
+            payload TEXT,
+            status TEXT DEFAULT 'pending',
+            lease_until REAL DEFAULT 0,
+            attempts INTEGER DEFAULT 0,
+            error TEXT DEFAULT ''
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_job_items_job_status ON job_items(job_id, status)',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_session ON jobs(session_id)',
+    ]),
+    # 3: indexes for the hot queries (send / retry / resend selection, upload dedup, logs, stats)
+    (3, [
+        'CREATE INDEX IF NOT EXISTS idx_emails_session_status ON emails(session_id, status)',
+        'CREATE INDEX IF NOT EXISTS idx_emails_status_email ON emails(status, email)',
+        'CREATE INDEX IF NOT EXISTS idx_emails_email ON emails(email)',
+        'CREATE INDEX IF NOT EXISTS idx_emails_sent_at ON emails(sent_at)',
+        'CREATE INDEX IF NOT EXISTS idx_sent_log_sent_at ON sent_log(sent_at)',
+        'ANALYZE',
+    ]),
+]
+
+
+# --- 4: structured send stats ---
+def legacy_country(body):
+    # Country guessed from a sent body, as /api/stats used to do on every request
+    country = 'Unknown'
+    for l in body.split('\n'):
+        if 'café in' in l or 'coffee shop in' in l:
+            parts = l.split(' in ')
+            if len(parts) > 1:
+                loc = parts[1].split(' and')[0].split(',')
+                country = loc[-1].strip() if len(loc) > 1 else loc[0].strip()
+    return country
+
+
+def legacy_business_type(body):
+    business_type = 'Unknown'
+    for l in body.split('\n'):
+        if 'help coffee shops like yours' in l or 'help businesses like yours' in l:
+            if 'coffee shop' in l:
+                business_type = 'Coffee Shop'
+            elif 'café' in l:
+                business_type = 'Café'
+            elif 'restaurant' in l:
+                business_type = 'Restaurant'
+    return business_type
+
+
+def backfill_sent_stats(conn):
+    # Parse historical bodies once, then build the rollup from the structured columns
+    rows = conn.execute('SELECT id, body FROM sent_log').fetchall()
+    conn.executemany('UPDATE sent_log SET country = ?, business_type = ? WHERE id = ?',
+                     [(legacy_country(body or ''), legacy_business_type(body or ''), row_id) for row_id, body in rows])
+    conn.execute("UPDATE sent_log SET send_day = DATE(sent_at, 'localtime'), session_id = COALESCE(session_id, '')")
+    conn.execute('''INSERT INTO stats_rollup (session_id, day, country, business_type, sent)
+                    SELECT session_id, send_day, country, business_type, COUNT(*) FROM sent_log
+                    GROUP BY session_id, send_day, country, business_type''')
+
+
+MIGRATIONS.append((4, [
+    'ALTER TABLE emails ADD COLUMN country TEXT',
+    'ALTER TABLE sent_log ADD COLUMN country TEXT',
+    'ALTER TABLE sent_log ADD COLUMN business_type TEXT',
+    'ALTER TABLE sent_log ADD COLUMN send_day TEXT',
+    'ALTER TABLE sent_log ADD COLUMN session_id TEXT',
+    '''CREATE TABLE IF NOT EXISTS stats_rollup (
+        session_id TEXT NOT NULL DEFAULT '',
+        day TEXT NOT NULL,
+        country TEXT NOT NULL,
+        business_type TEXT NOT NULL,
+        sent INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (session_id, day, country, business_type)
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_stats_rollup_day ON stats_rollup(day)',
+    backfill_sent_stats,
+]))
+
+
+# --- 5: subject/body rendered once at generation time, so sending doesn't re-parse model output ---
+def backfill_rendered_messages(conn):
+    rows = conn.execute('SELECT id, model_output FROM emails').fetchall()
+    conn.executemany('UPDATE emails SET subject = ?, body = ? WHERE id = ?',
+                     [parse_model_output(model_output) + (row_id,) for row_id, model_output in rows])
+
+
+MIGRATIONS.append((5, [
+    'ALTER TABLE emails ADD COLUMN subject TEXT',
+    'ALTER TABLE emails ADD COLUMN body TEXT',
+    backfill_rendered_messages,
+]))
+
+
+# --- 6: per-account daily send quotas, and which account sent each message ---
+MIGRATIONS.append((6, [
+    '''CREATE TABLE IF NOT EXISTS send_quota (
+        account TEXT NOT NULL,
+        day TEXT NOT NULL,
+        sent INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (account, day)
+    )''',
+    'ALTER TABLE sent_log ADD COLUMN account TEXT',
+]))
+
+
+# --- 7: upload dedup by indexed lookup, plus the suppression list ---
+MIGRATIONS.append((7, [
+    'CREATE INDEX IF NOT EXISTS idx_emails_lower_email_status ON emails(lower(email), status)',
+    '''CREATE TABLE IF NOT EXISTS suppressions (
+        address TEXT PRIMARY KEY,
+        reason TEXT,
+        source TEXT,
+        created_at REAL
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS suppressed_domains (
+        domain TEXT PRIMARY KEY,
+        reason TEXT,
+        created_at REAL
+    ) WITHOUT ROWID''',
+    'CREATE INDEX IF NOT EXISTS idx_suppressions_created_at ON suppressions(created_at)',
+]))
+
+
+# --- 8: log browsing (email_logs.py): indexes in (sent_at, id) order per filter, and full-text search ---
+def create_log_search(conn):
+    # External-content FTS5 index over the generated emails, kept in sync by triggers. Status updates
+    # (every send) don't touch indexed columns, so they don't fire the update trigger.
+    try:
+        conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5(
+            name, email, business_type, subject, body, content='emails', content_rowid='id')''')
+    except sqlite3.OperationalError:
+        return  # SQLite built without FTS5: /api/logs?q= falls back to LIKE
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS emails_fts_insert AFTER INSERT ON emails BEGIN
+        INSERT INTO emails_fts (rowid, name, email, business_type, subject, body)
+        VALUES (new.id, new.name, new.email, new.business_type, new.subject, new.body);
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS emails_fts_delete AFTER DELETE ON emails BEGIN
+        INSERT INTO emails_fts (emails_fts, rowid, name, email, business_type, subject, body)
+        VALUES ('delete', old.id, old.name, old.email, old.business_type, old.subject, old.body);
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS emails_fts_update AFTER UPDATE OF name, email, business_type, subject, body ON emails BEGIN
+        INSERT INTO emails_fts (emails_fts, rowid, name, email, business_type, subject, body)
+        VALUES ('delete', old.id, old.name, old.email, old.business_type, old.subject, old.body);
+        INSERT INTO emails_fts (rowid, name, email, business_type, subject, body)
+        VALUES (new.id, new.name, new.email, new.business_type, new.subject, new.body);
+    END''')
+    conn.execute("INSERT INTO emails_fts (emails_fts) VALUES ('rebuild')")
+
+
+MIGRATIONS.append((8, [
+    # sent_at alone is idx_emails_sent_at (migration 3); rowid is the implicit last column of each index
+    'CREATE INDEX IF NOT EXISTS idx_emails_session_sent_at ON emails(session_id, sent_at)',
+    'CREATE INDEX IF NOT EXISTS idx_emails_status_sent_at ON emails(status, sent_at)',
+    "CREATE INDEX IF NOT EXISTS idx_emails_domain_sent_at ON emails(lower(substr(email, instr(email, '@') + 1)), sent_at)",
+    create_log_search,
+    'ANALYZE',
+]))
+
+
+# --- 9: one generated email per lead and campaign ---
+def dedupe_emails(conn):
+    # Rows generated twice for one lead (a lapsed lease let two workers finish the same item): keep the one
+    # that was sent, else the oldest, so the index below can be created
+    conn.execute('''DELETE FROM emails WHERE id IN (
+        SELECT id FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY session_id, lower(email)
+                                                      ORDER BY status IN ('SENT', 'RESENT') DESC, id) AS copy
+                        FROM emails WHERE session_id IS NOT NULL)
+        WHERE copy > 1)''')
+
+
+MIGRATIONS.append((9, [
+    dedupe_emails,
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_emails_session_lower_email ON emails(session_id, lower(email))',
+]))
+
+
+# --- 10: per-campaign stats (/api/stats?session_id=) read sent_log in id order without a scan ---
+MIGRATIONS.append((10, [
+    'CREATE INDEX IF NOT EXISTS idx_sent_log_session_id ON sent_log(session_id, id)',
+    'ANALYZE',
+]))
@@ -0,0 +1,319 @@
+# --- Concurrent delivery across sender accounts ---
+# An asyncio engine that keeps many SMTP sessions busy at once, spread over a pool of sender accounts.
+# Each recipient maps to an account by rendezvous hashing (stable as long as the account list is), falling
+# through to the next account when one has used up its daily quota. Quotas are counted in the email log DB.
+import asyncio
+import contextvars
+import datetime
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import aiosmtplib
+    aiosmtplib_available = True
+except ImportError:
+    aiosmtplib_available = False
+
+import db
+import metrics
+import rendering
+from rate_limit import is_transient, smtp_reply_code, recipient_domain
+from smtp_pool import SMTPPool
+
+
+class Account:
+    def __init__(self, user, password, host, port=465, use_ssl=True, daily_quota=0, sessions=2,
+                 max_messages=100, noop_after=30):
+        self.user = user or ''
+        self.password = password
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.daily_quota = daily_quota  # 0 = unlimited
+        self.sessions = sessions
+        self.max_messages = max_messages  # rotate a session after this many messages
+        self.noop_after = noop_after  # NOOP-probe sessions idle for longer than this (seconds)
+        # Blocking sessions, used when aiosmtplib isn't installed
+        self.pool = SMTPPool(host, port, user, password, size=sessions, max_messages=max_messages,
+                             noop_after=noop_after, use_ssl=use_ssl)
+
+
+def parse_accounts(spec, default):
+    # SMTP_ACCOUNTS: JSON list of {"user", "password", "host", "port", "use_ssl", "daily_quota", "sessions"};
+    # missing keys (and an empty list) fall back to the single SMTP_* account in `default`
+    entries = json.loads(spec) if (spec or '').strip() else [{}]
+    return [Account(**dict(default, **entry)) for entry in entries]
+
+
+def rendezvous_order(email, accounts):
+    # Highest-random-weight order: every recipient gets a stable preference list of accounts
+    return sorted(accounts, key=lambda a: hashlib.sha1(f'{a.user}|{email.lower()}'.encode('utf-8')).digest(), reverse=True)
+
+
+def seconds_until_tomorrow():
+    now = datetime.datetime.now()
+    return (datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time()) - now).total_seconds()
+
+
+class QuotaBook:
+    # Messages sent per account today, counted in send_quota. A send reserves its slot there up front with
+    # one conditional upsert, so the quota holds across every process sending from the same account.
+    def __init__(self, db_file):
+        self.db_file = db_file
+
+    def try_take(self, account):
+        # The day charged, or None when the account's quota is used up; pass it back to give_back()
+        day = datetime.date.today().isoformat()
+        cur = db.execute(self.db_file, '''INSERT INTO send_quota (account, day, sent) VALUES (?, ?, 1)
+                                          ON CONFLICT (account, day) DO UPDATE SET sent = sent + 1 WHERE ? = 0 OR sent < ?''',
+                         (account.user, day, account.daily_quota, account.daily_quota))
+        return day if cur.rowcount else None
+
+    def give_back(self, account, day):
+        db.execute(self.db_file, 'UPDATE send_quota SET sent = sent - 1 WHERE account = ? AND day = ? AND sent > 0', (account.user, day))
+
+    def usage(self, account):
+        row = db.query_one(self.db_file, 'SELECT sent FROM send_quota WHERE account = ? AND day = ?',
+                           (account.user, datetime.date.today().isoformat()))
+        return row[0] if row else 0
+
+
+class Delivery:
+    # outcome: 'sent', 'failed', 'deferred' (provider said try later) or 'held' (not attempted: our own
+    # rate limit or every account's quota); delay is when a deferred/held message should be retried
+    def __init__(self, outcome, account=None, error='', delay=0.0, code=None):
+        self.outcome = outcome
+        self.account = account
+        self.error = error
+        self.delay = delay
+        self.code = code  # SMTP reply code of a failure, when there was one
+
+
+class SendEngine:
+    def __init__(self, accounts, quota, scheduler, concurrency=None, max_inline_wait=2):
+        self.accounts = list(accounts)
+        self.quota = quota
+        self.scheduler = scheduler
+        self.concurrency = concurrency or sum(a.sessions for a in self.accounts)
+        self.max_inline_wait = max_inline_wait
+        self.lock = threading.Lock()
+        self.stats = {a.user: {'sent': 0, 'failed': 0, 'deferred': 0} for a in self.accounts}
+
+    def set_accounts(self, accounts):
+        self.close_idle()
+        self.accounts = list(accounts)
+        self.concurrency = sum(a.sessions for a in self.accounts)
+        with self.lock:
+            for a in self.accounts:
+                self.stats.setdefault(a.user, {'sent': 0, 'failed': 0, 'deferred': 0})
+
+    def count(self, account, key):
+        with self.lock:
+            self.stats[account.user][key] += 1
+        metrics.SEND_MESSAGES.inc(account=account.user, outcome=key)
+
+    def pick_account(self, email):
+        # (account, day its quota was charged), or (None, None) when every account is out of quota
+        for account in rendezvous_order(email, self.accounts):
+            day = self.quota.try_take(account)
+            if day:
+                return account, day
+        return None, None
+
+    async def deliver(self, sessions, email, subject, body, attempts=1, max_attempts=5):
+        # Quota reservations are SQLite writes: keep them off the event loop
+        account, day = await asyncio.to_thread(self.pick_account, email)
+        if account is None:
+            metrics.RATE_LIMIT_EVENTS.inc(event='quota')
+            return Delivery('held', error='Daily quota reached on every sender account', delay=seconds_until_tomorrow())
+        domain = recipient_domain(email)
+        wait = self.scheduler.reserve(account.user, domain)
+        while 0 < wait <= self.max_inline_wait:
+            metrics.RATE_LIMIT_EVENTS.inc(event='inline_wait')
+            with metrics.RATE_LIMIT_WAIT_SECONDS.time():
+                await asyncio.sleep(wait)
+            wait = self.scheduler.reserve(account.user, domain)
+        if wait:
+            await asyncio.to_thread(self.quota.give_back, account, day)
+            metrics.RATE_LIMIT_EVENTS.inc(event='held')
+            return Delivery('held', account, delay=wait)
+        try:
+            await sessions.send(account, email, rendering.build_message(subject, body, account.user, email))
+        except Exception as e:
+            await asyncio.to_thread(self.quota.give_back, account, day)
+            if is_transient(e) and attempts < max_attempts:
+                self.count(account, 'deferred')
+                metrics.RATE_LIMIT_EVENTS.inc(event=f'deferral_{smtp_reply_code(e) or "disconnect"}')
+                delay = self.scheduler.on_deferral(account.user, domain, smtp_reply_code(e), attempts)
+                return Delivery('deferred', account, str(e), delay)
+            self.count(account, 'failed')
+            return Delivery('failed', account, str(e), code=smtp_reply_code(e))
+        self.scheduler.on_success(account.user, domain)
+        self.count(account, 'sent')
+        return Delivery('sent', account)
+
+    def sessions(self):
+        return AsyncSessions() if aiosmtplib_available else ThreadedSessions(self.concurrency)
+
+    def close_idle(self):
+        for account in self.accounts:
+            account.pool.close_idle()
+
+    def report(self):
+        with self.lock:
+            stats = {user: dict(s) for user, s in self.stats.items()}
+        return [{'user': a.user, 'host': a.host, 'daily_quota': a.daily_quota, 'sent_today': self.quota.usage(a),
+                 'sessions': a.sessions, **stats.get(a.user, {})} for a in self.accounts]
+
+
+class ThreadedSessions:
+    # Fallback transport: each account's blocking SMTPPool, driven from one worker thread per delivery
+    # slot (asyncio's default executor is sized by CPU count, far below the number of open sessions)
+    def __init__(self, concurrency):
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='smtp')
+
+    async def send(self, account, recipient, message):
+        # Run in a copy of the caller's context so SMTP timings are charged to the running job
+        call = contextvars.copy_context().run
+        await asyncio.get_running_loop().run_in_executor(self.executor, call, account.pool.sendmail, account.user, [recipient], message)
+
+    async def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class AsyncConnection:
+    def __init__(self, client):
+        self.client = client
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+    async def close(self):
+        try:
+            await self.client.quit()
+        except Exception:
+            self.client.close()
+
+
+class AsyncSessions:
+    # aiosmtplib clients, opened lazily per account (up to account.sessions) and reused for one run. Kept
+    # the same way as SMTPPool: idle sessions are NOOP-probed before reuse, rotated after max_messages, and
+    # a session that drops mid-send is reconnected once and the message resent
+    def __init__(self):
+        self.idle = {}
+        self.open = {}
+        self.available = {}  # user: asyncio.Condition, notified when a session is checked in or a slot frees up
+
+    async def _connect(self, account):
+        # Without use_ssl, aiosmtplib upgrades with STARTTLS whenever the server offers it
+        client = aiosmtplib.SMTP(hostname=account.host, port=account.port, use_tls=account.use_ssl)
+        try:
+            with metrics.SMTP_SECONDS.time(phase='connect'):
+                await client.connect()
+            if account.user:
+                with metrics.SMTP_SECONDS.time(phase='login'):
+                    await client.login(account.user, account.password)
+        except Exception:
+            client.close()
+            raise
+        return AsyncConnection(client)
+
+    async def _is_alive(self, conn):
+        if not conn.client.is_connected:
+            return False
+        try:
+            with metrics.SMTP_SECONDS.time(phase='noop'):
+                return (await conn.client.noop()).code == 250
+        except Exception:
+            return False
+
+    async def _checkout(self, account):
+        idle = self.idle.setdefault(account.user, [])
+        available = self.available.setdefault(account.user, asyncio.Condition())
+        while True:
+            async with available:
+                # Re-checked on every wakeup: a discarded session frees a slot instead of handing one back
+                while not idle and self.open.get(account.user, 0) >= account.sessions:
+                    await available.wait()
+                conn = idle.pop() if idle else None
+                if conn is None:
+                    self.open[account.user] = self.open.get(account.user, 0) + 1
+            if conn is None:
+                try:
+                    return await self._connect(account)
+                except Exception:
+                    await self._release(account)
+                    raise
+            if time.monotonic() - conn.last_used > account.noop_after and not await self._is_alive(conn):
+                conn.client.close()
+                await self._release(account)
+                continue
+            return conn
+
+    async def _checkin(self, account, conn):
+        conn.last_used = time.monotonic()
+        if conn.sent >= account.max_messages:
+            await conn.close()
+            await self._release(account)
+            return
+        available = self.available[account.user]
+        async with available:
+            self.idle[account.user].append(conn)
+            available.notify()
+
+    async def _release(self, account):
+        available = self.available[account.user]
+        async with available:
+            self.open[account.user] -= 1
+            available.notify()
+
+    async def send(self, account, recipient, message):
+        conn = await self._checkout(account)
+        try:
+            try:
+                with metrics.SMTP_SECONDS.time(phase='send'):
+                    await conn.client.sendmail(account.user, [recipient], message)
+            except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPTimeoutError, ConnectionError):
+                # Session dropped under us: reconnect once and resend
+                conn.client.close()
+                conn = await self._connect(account)
+                with metrics.SMTP_SECONDS.time(phase='send'):
+                    await conn.client.sendmail(account.user, [recipient], message)
+        except aiosmtplib.SMTPRecipientsRefused:
+            # Session is still fine; only this recipient was refused
+            await self._checkin(account, conn)
+            raise
+        except Exception:
+            conn.client.close()
+            await self._release(account)
+            raise
+        conn.sent += 1
+        await self._checkin(account, conn)
+
+    async def close(self):
+        for idle in self.idle.values():
+            while idle:
+                await idle.pop().close()
+        self.idle.clear()
+        self.open.clear()
+        self.available.clear()
+
+
+class Throughput:
+    # Messages per minute over a run, overall and per account
+    def __init__(self):
+        self.start = time.monotonic()
+        self.sent = 0
+        self.by_account = {}
+
+    def record(self, delivery):
+        if delivery.outcome == 'sent':
+            self.sent += 1
+            self.by_account[delivery.account.user] = self.by_account.get(delivery.account.user, 0) + 1
+
+    def snapshot(self):
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        return {'sent': self.sent, 'seconds': round(elapsed, 1), 'per_minute': round(self.sent / elapsed * 60, 1),
+                'by_account': dict(self.by_account)}
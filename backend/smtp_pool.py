@@ -0,0 +1,157 @@
+# --- Pooled SMTP sender ---
+# Keeps authenticated SMTP sessions open and reuses them across messages and batches.
+import queue
+import smtplib
+import socket
+import ssl
+import threading
+import time
+
+import metrics
+
+# Errors that mean the session itself dropped (worth one reconnect and resend). SMTP replies such as
+# 421/451/550 are SMTPResponseExceptions and go straight to the caller, which decides whether to retry.
+DISCONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout)
+
+
+class PooledConnection:
+    def __init__(self, server):
+        self.server = server
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.sent = 0
+
+    def close(self):
+        try:
+            self.server.quit()
+        except Exception:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+
+
+class SMTPPool:
+    def __init__(self, host, port, user, password, size=2, max_messages=100, noop_after=30,
+                 use_ssl=True, timeout=30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = size
+        self.max_messages = max_messages  # rotate a session after this many messages
+        self.noop_after = noop_after  # NOOP-probe sessions idle for longer than this (seconds)
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        # Signalled whenever a session is checked in or a slot frees up (discard, failed connect)
+        self.available = threading.Condition(self.lock)
+        self.open_count = 0
+        self.stats = {'connects': 0, 'reuses': 0, 'reconnects': 0, 'rotations': 0, 'sent': 0}
+
+    def _connect(self):
+        with metrics.SMTP_SECONDS.time(phase='connect'):
+            if self.use_ssl:
+                server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+            else:
+                server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if not self.use_ssl:
+                # Plain connection (e.g. port 587): upgrade to TLS whenever the server offers it, so the
+                # password and messages never go out in clear text
+                with metrics.SMTP_SECONDS.time(phase='connect'):
+                    server.ehlo()
+                    if server.has_extn('starttls'):
+                        server.starttls(context=ssl.create_default_context())
+                        server.ehlo()
+            if self.user:
+                with metrics.SMTP_SECONDS.time(phase='login'):
+                    server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.stats['connects'] += 1
+        return PooledConnection(server)
+
+    def _is_alive(self, conn):
+        try:
+            with metrics.SMTP_SECONDS.time(phase='noop'):
+                return conn.server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self):
+        while True:
+            with self.available:
+                # Wait for an idle session or a free slot; re-checked on every wakeup, since a discarded
+                # session frees a slot rather than handing back a connection
+                while self.idle.empty() and self.open_count >= self.size:
+                    self.available.wait()
+                try:
+                    conn = self.idle.get_nowait()
+                except queue.Empty:
+                    conn = None
+                    self.open_count += 1
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._release()
+                    raise
+            if time.monotonic() - conn.last_used > self.noop_after and not self._is_alive(conn):
+                self._discard(conn)
+                continue
+            self.stats['reuses'] += 1
+            return conn
+
+    def _checkin(self, conn):
+        conn.last_used = time.monotonic()
+        if conn.sent >= self.max_messages:
+            self.stats['rotations'] += 1
+            self._discard(conn)
+        else:
+            with self.available:
+                self.idle.put(conn)
+                self.available.notify()
+
+    def _release(self):
+        with self.available:
+            self.open_count -= 1
+            self.available.notify()
+
+    def _discard(self, conn):
+        conn.close()
+        self._release()
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        conn = self._checkout()
+        try:
+            try:
+                with metrics.SMTP_SECONDS.time(phase='send'):
+                    conn.server.sendmail(from_addr, to_addrs, msg)
+            except DISCONNECT_ERRORS:
+                # Session dropped under us: reconnect once and resend
+                self.stats['reconnects'] += 1
+                conn.close()
+                conn = self._connect()
+                with metrics.SMTP_SECONDS.time(phase='send'):
+                    conn.server.sendmail(from_addr, to_addrs, msg)
+        except smtplib.SMTPRecipientsRefused:
+            # smtplib already issued RSET, the session is still usable
+            self._checkin(conn)
+            raise
+        except Exception:
+            self._discard(conn)
+            raise
+        conn.sent += 1
+        self.stats['sent'] += 1
+        self._checkin(conn)
+
+    def close_idle(self):
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
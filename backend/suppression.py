@@ -0,0 +1,101 @@
+# --- Upload dedup and suppression ---
+# Answers "may we email this address?" for a whole batch of addresses at once with indexed lookups:
+# earlier campaigns (emails, via the lower(email) index), suppressed addresses (bounces, unsubscribes)
+# and suppressed domains. Cost per batch depends on the batch, not on how much history there is.
+import re
+import time
+
+import db
+from ingest import DOMAIN_RE, VALID_EMAIL_RE
+
+# SQLite's default limit on host parameters is well above this
+LOOKUP_CHUNK = 500
+# emails.status values meaning a previous campaign already has (or had) a message for the address
+CONTACTED_STATUSES = ('SENT', 'Ready')
+# Hard bounces suppressed automatically: replies saying the mailbox doesn't exist. An enhanced status code
+# decides when the reply has one (5.1.x: bad mailbox, address or domain); otherwise 551 (user not local) or
+# 553 (mailbox name not allowed). Other 5xx (e.g. 550 5.7.1 policy/spam blocks) fail without suppressing.
+MAILBOX_UNKNOWN_CODES = (551, 553)
+ENHANCED_STATUS_RE = re.compile(r'(?<![\d.])([245])\.(\d{1,3})\.(\d{1,3})(?![\d.])')
+
+
+def normalize(address):
+    return (address or '').strip().lower()
+
+
+def domain_of(address):
+    return address.rsplit('@', 1)[-1] if '@' in address else ''
+
+
+def invalid_entries(addresses=(), domains=()):
+    # Entries that aren't a well-formed address / domain (same syntax the lead import accepts)
+    return ([a for a in addresses if not re.fullmatch(VALID_EMAIL_RE, normalize(a))] +
+            [d for d in domains if not re.fullmatch(DOMAIN_RE, normalize(d).lstrip('@'))])
+
+
+def is_mailbox_unknown(code, error=''):
+    # code: SMTP reply code of a failed delivery; error: the reply text (where enhanced codes appear)
+    if code is None or not 500 <= code < 600:
+        return False
+    status = ENHANCED_STATUS_RE.search(error or '')
+    if status:
+        return status.group(1) == '5' and status.group(2) == '1'
+    return code in MAILBOX_UNKNOWN_CODES
+
+
+class SuppressionIndex:
+    def __init__(self, db_file):
+        self.db_file = db_file
+
+    def _rows(self, sql, keys):
+        # sql has one IN ({}) slot; keys are looked up LOOKUP_CHUNK at a time
+        keys = list(keys)
+        for i in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[i:i + LOOKUP_CHUNK]
+            yield from db.query(self.db_file, sql.format(','.join('?' * len(chunk))), chunk)
+
+    def blocked(self, addresses, include_contacted=True):
+        # {normalized address: reason} for every address that must not get a new email
+        addresses = {normalize(a) for a in addresses if a}
+        if not addresses:
+            return {}
+        db.flush(self.db_file)
+        reasons = {}
+        if include_contacted:
+            statuses = ','.join(f"'{s}'" for s in CONTACTED_STATUSES)
+            for (address,) in self._rows(f'SELECT DISTINCT lower(email) FROM emails WHERE lower(email) IN ({{}}) AND status IN ({statuses})', addresses):
+                reasons[address] = 'contacted'
+        for address, reason in self._rows('SELECT address, reason FROM suppressions WHERE address IN ({})', addresses):
+            reasons[address] = reason or 'suppressed'
+        domains = {domain_of(a) for a in addresses} - {''}
+        suppressed_domains = dict(self._rows('SELECT domain, reason FROM suppressed_domains WHERE domain IN ({})', domains))
+        for address in addresses:
+            domain = domain_of(address)
+            if domain in suppressed_domains:
+                reasons[address] = suppressed_domains[domain] or 'domain suppressed'
+        return reasons
+
+    # --- Maintenance ---
+    def add(self, addresses, reason='manual', source=''):
+        rows = [(normalize(a), reason, source, time.time()) for a in addresses if normalize(a)]
+        db.executemany(self.db_file, 'INSERT OR REPLACE INTO suppressions (address, reason, source, created_at) VALUES (?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def add_domains(self, domains, reason='manual'):
+        rows = [(normalize(d).lstrip('@'), reason, time.time()) for d in domains if normalize(d)]
+        db.executemany(self.db_file, 'INSERT OR REPLACE INTO suppressed_domains (domain, reason, created_at) VALUES (?, ?, ?)', rows)
+        return len(rows)
+
+    def remove(self, addresses=(), domains=()):
+        db.executemany(self.db_file, 'DELETE FROM suppressions WHERE address = ?', [(normalize(a),) for a in addresses])
+        db.executemany(self.db_file, 'DELETE FROM suppressed_domains WHERE domain = ?', [(normalize(d).lstrip('@'),) for d in domains])
+
+    def listing(self, limit=100, offset=0):
+        addresses = db.query(self.db_file, 'SELECT address, reason, source, created_at FROM suppressions ORDER BY created_at DESC LIMIT ? OFFSET ?', (limit, offset))
+        domains = db.query(self.db_file, 'SELECT domain, reason, created_at FROM suppressed_domains ORDER BY domain')
+        total = db.query_one(self.db_file, 'SELECT COUNT(*) FROM suppressions')[0]
+        return {
+            'addresses': [dict(zip(['address', 'reason', 'source', 'created_at'], row)) for row in addresses],
+            'domains': [dict(zip(['domain', 'reason', 'created_at'], row)) for row in domains],
+            'total_addresses': total
+        }
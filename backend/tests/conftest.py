@@ -0,0 +1,24 @@
+# Tests import the backend modules the way app.py does (flat, from backend/), and the stand-in servers
+# from benchmarks/fakes.py
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [BACKEND_DIR, os.path.join(BACKEND_DIR, 'benchmarks')]
+
+
+@pytest.fixture(scope='session')
+def backend_app(tmp_path_factory):
+    # app.py opens its databases and upload folder on import: point them at a scratch directory first
+    tmp = tmp_path_factory.mktemp('app')
+    os.environ.update(DB_FILE=str(tmp / 'email_log.db'), UPLOAD_FOLDER=str(tmp / 'uploads'),
+                      GENERATION_CACHE_FILE=str(tmp / 'generation_cache.db'))
+    import app
+    return app
+
+
+@pytest.fixture
+def client(backend_app):
+    return backend_app.app.test_client()
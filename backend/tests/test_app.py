@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from bench_ingest import write_sheet
+
+
+@pytest.fixture
+def sheet(tmp_path):
+    path = str(tmp_path / 'leads.xlsx')
+    write_sheet(path, 3)
+    return path
+
+
+def upload(client, sheet, **form):
+    with open(sheet, 'rb') as f:
+        return client.post('/api/upload', data=dict(form, file=(f, 'leads.xlsx')), content_type='multipart/form-data')
+
+
+@pytest.mark.parametrize('workers', ['abc', '0', '-2', '1.5'])
+def test_upload_rejects_invalid_workers(client, sheet, workers):
+    r = upload(client, sheet, workers=workers)
+    assert r.status_code == 400
+    assert 'workers' in r.get_json()['error']
+
+
+def test_upload_caps_workers(backend_app, client, sheet, monkeypatch):
+    monkeypatch.setattr(backend_app, 'start_job', lambda job_id: None)
+    r = upload(client, sheet, workers=str(backend_app.GENERATION_MAX_WORKERS + 100))
+    assert r.status_code == 200
+    job = backend_app.job_queue.get_job(r.get_json()['job_id'])
+    assert job['params']['workers'] == backend_app.GENERATION_MAX_WORKERS
+    assert os.path.exists(job['params']['filepath'])
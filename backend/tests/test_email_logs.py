@@ -0,0 +1,55 @@
+import pytest
+
+import db
+import email_logs
+
+ROWS = [  # (email, sent_at): two pairs share a timestamp, so pages must break ties by id
+    ('a@example.com', '2026-01-01 10:00:00'), ('b@example.com', '2026-01-02 10:00:00'),
+    ('c@example.com', '2026-01-02 10:00:00'), ('d@example.org', '2026-01-03 10:00:00'),
+    ('e@example.com', '2026-01-03 10:00:00'), ('f@example.com', '2026-01-04 10:00:00'),
+]
+
+
+@pytest.fixture
+def logged(backend_app, request):
+    session_id = request.node.name
+    db.executemany(backend_app.DB_FILE, 'INSERT INTO emails (name, email, status, session_id, sent_at) VALUES (?, ?, ?, ?, ?)',
+                   [(email.split('@')[0], email, 'SENT', session_id, sent_at) for email, sent_at in ROWS])
+    return session_id
+
+
+def pages(client, **params):
+    emails, cursor = [], None
+    while True:
+        query = dict(params, **({'cursor': cursor} if cursor else {}))
+        body = client.get('/api/logs', query_string=query).get_json()
+        emails.append([row['email'] for row in body['logs']])
+        cursor = body['next_cursor']
+        if not cursor:
+            return emails
+
+
+def test_cursor_walks_every_row_once_newest_first(client, logged):
+    assert pages(client, session_id=logged, limit=2, fields='email') == [
+        ['f@example.com', 'e@example.com'], ['d@example.org', 'c@example.com'], ['b@example.com', 'a@example.com']]
+
+
+def test_cursor_with_filters(client, logged):
+    assert pages(client, session_id=logged, domain='example.com', limit=3, fields='email,sent_at') == [
+        ['f@example.com', 'e@example.com', 'c@example.com'], ['b@example.com', 'a@example.com']]
+
+
+def test_last_page_has_no_cursor(client, logged):
+    body = client.get('/api/logs', query_string={'session_id': logged, 'limit': 6}).get_json()
+    assert len(body['logs']) == 6 and body['next_cursor'] is None
+
+
+@pytest.mark.parametrize('cursor', ['not-base64!', email_logs.encode_cursor('2026-01-01', 'x'), 'WzFd'])
+def test_invalid_cursor_is_a_400(client, cursor):
+    r = client.get('/api/logs', query_string={'cursor': cursor})
+    assert r.status_code == 400
+    assert r.get_json()['error'] == 'Invalid cursor'
+
+
+def test_cursor_round_trip():
+    assert email_logs.decode_cursor(email_logs.encode_cursor('2026-01-02 10:00:00', 7)) == ('2026-01-02 10:00:00', 7)
@@ -0,0 +1,53 @@
+import json
+
+import email_template
+
+LEADS = [{'Business Name': 'Cafe One', 'Email': 'one@cafe.com'}, {'Business Name': 'Cafe Two', 'Email': 'two@cafe.com'}]
+
+
+def answer(*entries):
+    return json.dumps({'emails': list(entries)})
+
+
+def entry(i, email, name):
+    return {'id': i, 'email': email, 'subject': f'Hello {name} ☕', 'opening': f'Opening for {name}.', 'hook': ''}
+
+
+def test_batch_matched_by_id_and_echoed_email():
+    text = answer(entry(2, 'two@cafe.com', 'Cafe Two'), entry(1, 'ONE@cafe.com', 'Cafe One'))
+    (first, p1), (second, p2) = email_template.parse_batch(text, LEADS)
+    assert (p1, p2) == (None, None)
+    assert first['subject'] == 'Hello Cafe One ☕'
+    assert second['subject'] == 'Hello Cafe Two ☕'
+
+
+def test_batch_numbered_from_zero_is_rejected_whole():
+    text = answer(entry(0, 'one@cafe.com', 'Cafe One'), entry(1, 'two@cafe.com', 'Cafe Two'))
+    assert email_template.parse_batch(text, LEADS) == [(None, 'mismatch'), (None, 'mismatch')]
+
+
+def test_batch_with_missing_or_duplicate_ids_is_rejected_whole():
+    assert email_template.parse_batch(answer(entry(1, 'one@cafe.com', 'Cafe One')), LEADS) == [(None, 'mismatch')] * 2
+    text = answer(entry(1, 'one@cafe.com', 'Cafe One'), entry(1, 'two@cafe.com', 'Cafe Two'))
+    assert email_template.parse_batch(text, LEADS) == [(None, 'mismatch')] * 2
+    text = answer(entry('1', 'one@cafe.com', 'Cafe One'), entry(2, 'two@cafe.com', 'Cafe Two'))
+    assert email_template.parse_batch(text, LEADS) == [(None, 'mismatch')] * 2
+
+
+def test_batch_entry_for_the_wrong_business_falls_back():
+    text = answer(entry(1, 'two@cafe.com', 'Cafe Two'), entry(2, 'two@cafe.com', 'Cafe Two'))
+    results = email_template.parse_batch(text, LEADS)
+    assert results[0] == (None, 'mismatch')
+    assert results[1][1] is None
+
+
+def test_batch_not_json():
+    assert email_template.parse_batch('Sure! Here are your emails', LEADS) == [(None, 'invalid_json')] * 2
+
+
+def test_slot_checks():
+    assert email_template.parse_slots('{"subject": "Hi [City]", "opening": "x"}')[1] == 'placeholder'
+    assert email_template.parse_slots(json.dumps({'subject': 'Hi', 'opening': 'word ' * 50}))[1] == 'too_long'
+    assert email_template.parse_slots('{"subject": "Hi"}')[1] == 'invalid_json'
+    slots, problem = email_template.parse_slots('noise {"subject": "**Hi**  there", "opening": "Yes."} noise')
+    assert problem is None and slots['subject'] == 'Hi there'
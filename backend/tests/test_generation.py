@@ -0,0 +1,54 @@
+import pytest
+
+import rendering
+from fakes import FakeOllama
+
+PAYLOAD = {'model': 'llama3', 'prompt': 'Write an email.\nBusiness Name: Cafe One\n'}
+
+
+def no_placeholder(text):
+    return 'placeholder' if rendering.contains_placeholder(text) else None
+
+
+@pytest.fixture
+def stream(backend_app):
+    return backend_app.stream_generation
+
+
+def test_placeholder_stops_the_stream(stream):
+    with FakeOllama(latency=0, placeholder_every=1) as ollama:
+        text, problem = stream(ollama.url, PAYLOAD, no_placeholder, require_sign_off=True)
+    assert problem == 'placeholder'
+    assert 'PixelSolve Team' not in text  # aborted mid-email, not after it
+
+
+def test_overlong_output_stops_the_stream(stream):
+    with FakeOllama(latency=0) as ollama:
+        text, problem = stream(ollama.url, PAYLOAD, lambda t: 'too_long' if len(t.split()) > 20 else None)
+    assert problem == 'too_long'
+    assert len(text.split()) <= 21
+
+
+def test_chatter_after_the_sign_off_is_cut(stream):
+    partials = []
+    with FakeOllama(latency=0, chatter=True) as ollama:
+        text, problem = stream(ollama.url, PAYLOAD, no_placeholder, on_partial=partials.append, require_sign_off=True)
+    assert problem is None
+    assert text.rstrip().endswith('www.pixelsolve.co')
+    assert 'Let me know' not in text
+    assert partials and not any('Let me know' in p for p in partials)  # stopped before the chatter streamed
+
+
+def test_missing_sign_off_is_a_problem(stream):
+    with FakeOllama(latency=0) as ollama:
+        text, problem = stream(ollama.url, dict(PAYLOAD, format='json'), no_placeholder, require_sign_off=True)
+    assert problem == 'no_sign_off'
+    assert text.startswith('{')
+
+
+def test_chat_api_chunks(backend_app, stream):
+    payload = {'model': 'llama3', 'messages': [{'role': 'user', 'content': 'Business Name: Cafe One'}]}
+    with FakeOllama(latency=0) as ollama:
+        text, problem = stream(ollama.url.replace('/api/generate', '/api/chat'), payload, no_placeholder, require_sign_off=True)
+    assert problem is None
+    assert text.startswith('Subject: Boost Cafe One')
@@ -0,0 +1,39 @@
+import pandas as pd
+
+import ingest
+
+
+def normalize(**columns):
+    rows = len(next(iter(columns.values())))
+    frame = pd.DataFrame(dict({'Business Name': [f'Business {i}' for i in range(rows)]}, **columns))
+    return ingest.normalize_chunk(frame, 0, 'session', set())
+
+
+def test_email_column_is_taken_as_written():
+    out = normalize(Email=['john+promo@gmail.com', "o'brien@x.ie", ' Mixed.Case@Example.com '])
+    assert out['Email'].tolist() == ['john+promo@gmail.com', "o'brien@x.ie", 'Mixed.Case@Example.com']
+    assert out[ingest.KEY].tolist() == ['john+promo@gmail.com', "o'brien@x.ie", 'mixed.case@example.com']
+
+
+def test_invalid_email_column_drops_the_row_instead_of_extracting_part_of_it():
+    out = normalize(Email=['not an address john@x.com', 'ok@example.com'], Contact=['', ''])
+    assert out['Email'].tolist() == ['ok@example.com']
+
+
+def test_contact_extraction_only_when_email_is_empty():
+    out = normalize(Email=['', 'kept@example.com', ''],
+                    Contact=["Call 555-0100 or mail 'ann+leads@example.org'.", 'other@example.com', 'no address here'])
+    assert out['Email'].tolist() == ['ann+leads@example.org', 'kept@example.com']
+
+
+def test_extract_email_keeps_plus_and_apostrophe():
+    assert ingest.extract_email("write to o'brien+sales@x.ie today") == "o'brien+sales@x.ie"
+
+
+def test_duplicates_are_dropped_case_insensitively_across_chunks():
+    seen = set()
+    first = ingest.normalize_chunk(pd.DataFrame({'Email': ['A@x.com', 'a@X.com', 'b@x.com']}), 0, 's', seen)
+    second = ingest.normalize_chunk(pd.DataFrame({'Email': ['B@x.com', 'c@x.com']}), 3, 's', seen)
+    assert first['Email'].tolist() == ['A@x.com', 'b@x.com']
+    assert second['Email'].tolist() == ['c@x.com']
+    assert second['_row'].tolist() == [4]
@@ -0,0 +1,70 @@
+import time
+
+import db
+from jobs import JobQueue
+from schema import MIGRATIONS
+
+INSERT_EMAIL = 'INSERT INTO emails (name, email, status, session_id) VALUES (?, ?, ?, ?) ON CONFLICT DO NOTHING'
+
+
+def make_queue(tmp_path, lease_seconds=300):
+    path = str(tmp_path / 'jobs.db')
+    db.migrate(path, MIGRATIONS)
+    return JobQueue(path, lease_seconds=lease_seconds)
+
+
+def emails(queue):
+    return db.query(queue.db_file, 'SELECT email FROM emails')
+
+
+def test_complete_after_a_lapsed_lease_applies_only_once(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.05)
+    job_id = queue.create_job('generate', 's1', ingest_done=True)
+    queue.add_items(job_id, [{'Email': 'a@example.com'}])
+    [(item_id, _)] = queue.lease(job_id, 1)
+    time.sleep(0.1)
+    assert [i for i, _ in queue.lease(job_id, 1)] == [item_id]  # lapsed: a second worker takes it
+    for worker in ('first', 'second'):
+        queue.complete(job_id, item_id, writes=[(INSERT_EMAIL, (worker, 'a@example.com', 'Ready', 's1'))])
+    db.flush(queue.db_file)
+    assert db.query(queue.db_file, 'SELECT name FROM emails') == [('first',)]
+    assert queue.get_job(job_id)['done'] == 1
+
+
+def test_renewed_lease_is_not_handed_out_again(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.2)
+    job_id = queue.create_job('generate', 's1', ingest_done=True)
+    queue.add_items(job_id, [{'Email': 'a@example.com'}])
+    [(item_id, _)] = queue.lease(job_id, 1)
+    time.sleep(0.15)
+    queue.renew([item_id])
+    time.sleep(0.1)
+    assert queue.lease(job_id, 1) == []
+
+
+def test_one_email_per_address_and_session(tmp_path):
+    queue = make_queue(tmp_path)
+    db.executemany(queue.db_file, INSERT_EMAIL, [('a', 'A@example.com', 'Ready', 's1'), ('b', 'a@example.com', 'Ready', 's1'),
+                                                 ('c', 'a@example.com', 'Ready', 's2')])
+    assert sorted(emails(queue)) == [('A@example.com',), ('a@example.com',)]
+
+
+def test_item_values_seed_a_resumed_ingest(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = queue.create_job('generate', 's1')
+    queue.add_items(job_id, [{'Email': 'Ann@Example.com'}, {'Email': 'bob@example.com'}])
+    assert queue.item_values(job_id, 'Email') == {'ann@example.com', 'bob@example.com'}
+
+
+def test_deferred_item_is_leased_again_after_its_delay(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = queue.create_job('send', 's1', ingest_done=True)
+    queue.add_items(job_id, [{'email': 'a@example.com'}, {'email': 'b@example.com'}])
+    (first, _), (second, _) = queue.lease(job_id, 2)
+    queue.defer(first, 0.1, '451 try again later')
+    queue.defer(second, 0.1, refund=True)  # held back by our own rate limit: not an attempt
+    db.flush(queue.db_file)
+    assert queue.lease(job_id, 2) == [] and queue.outstanding(job_id) == 2
+    time.sleep(0.15)
+    assert sorted(i for i, _ in queue.lease(job_id, 2)) == sorted([first, second])
+    assert (queue.attempts(first), queue.attempts(second)) == (2, 1)
@@ -0,0 +1,65 @@
+import smtplib
+
+import pytest
+
+from rate_limit import SendScheduler, TokenBucket, is_transient, recipient_domain
+
+
+def test_rate_grows_additively_and_halves_on_deferral():
+    scheduler = SendScheduler(account_rate=1.0, domain_rate=1.0)
+    for _ in range(4):
+        scheduler.on_success('me', 'example.com')
+    assert scheduler.snapshot()['domains']['example.com'] == pytest.approx(1.2)
+    scheduler.on_deferral('me', 'example.com', 451, attempts=1)
+    rates = scheduler.snapshot()
+    assert rates['domains']['example.com'] == pytest.approx(0.6)
+    assert rates['accounts']['me'] == pytest.approx(1.2)  # a 451 is about the recipient domain only
+    scheduler.on_deferral('me', 'example.com', 421, attempts=1)
+    assert scheduler.snapshot()['accounts']['me'] == pytest.approx(0.6)
+
+
+def test_rate_stays_within_bounds():
+    bucket = TokenBucket(1.0)
+    for _ in range(200):
+        bucket.on_success()
+    assert bucket.rate == 4.0
+    for _ in range(20):
+        bucket.on_throttle(0.0)
+    assert bucket.rate == 1.0 / 32
+
+
+def test_deferral_backoff_doubles_up_to_the_cap():
+    scheduler = SendScheduler(backoff_base=30, backoff_max=900)
+    assert [scheduler.on_deferral('me', 'example.com', 451, n) for n in (1, 2, 3, 6, 10)] == [30, 60, 120, 900, 900]
+
+
+def test_deferral_pauses_the_domain():
+    scheduler = SendScheduler(account_rate=100, domain_rate=100)
+    assert scheduler.reserve('me', 'example.com') == 0
+    scheduler.on_deferral('me', 'example.com', 451, attempts=1)
+    assert scheduler.reserve('me', 'example.com') == pytest.approx(15, abs=0.1)
+    assert scheduler.reserve('you', 'other.com') == 0
+
+
+def test_reserve_waits_for_a_token_without_taking_it():
+    scheduler = SendScheduler(account_rate=100, domain_rate=2)
+    assert scheduler.reserve('me', 'example.com') == 0
+    assert scheduler.reserve('me', 'example.com') == pytest.approx(0.5, abs=0.05)
+    assert scheduler.stats['throttle_waits'] == 1
+
+
+@pytest.mark.parametrize('exc, transient', [
+    (smtplib.SMTPResponseException(451, b'4.7.1 Try again later'), True),
+    (smtplib.SMTPSenderRefused(421, b'Too many connections', 'me@example.com'), True),
+    (smtplib.SMTPRecipientsRefused({'a@example.com': (452, b'Mailbox full')}), True),
+    (smtplib.SMTPResponseException(550, b'5.1.1 User unknown'), False),
+    (smtplib.SMTPResponseException(554, b'5.7.1 Message rejected'), False),
+    (smtplib.SMTPServerDisconnected('Connection unexpectedly closed'), True),
+])
+def test_is_transient(exc, transient):
+    assert is_transient(exc) == transient
+
+
+def test_recipient_domain():
+    assert recipient_domain('Ann@Example.COM') == 'example.com'
+    assert recipient_domain('no-at-sign') == ''
@@ -0,0 +1,28 @@
+from fakes import CANNED_EMAIL
+
+import rendering
+
+EMAIL = CANNED_EMAIL.format(name='Cafe One')
+
+
+def test_sign_off_block_ends_the_email():
+    end = rendering.sign_off_end(EMAIL + '\n\nP.S. Let me know!')
+    assert end == len(EMAIL)
+
+
+def test_site_mentioned_in_the_body_is_not_the_sign_off():
+    opening = 'Subject: Hi\n\nHi Cafe One Team,\n\nHave a look at www.pixelsolve.co first.\n'
+    assert rendering.sign_off_end(opening) is None
+    assert rendering.sign_off_end(opening + '\nAt PixelSolve, we help cafés.') is None
+
+
+def test_sign_off_tolerates_markdown_line_breaks_and_other_closings():
+    assert rendering.sign_off_end('Body.\n\nWarm wishes,  \nThe PixelSolve Team  \nwww.pixelsolve.co  ') is not None
+    assert rendering.sign_off_end('Body.\n\nBest regards,\nThe PixelSolve Team\nwww.pixelsolve.co/demo') is None
+
+
+def test_parse_model_output_splits_subject_and_body():
+    subject, body = rendering.parse_model_output(EMAIL)
+    assert subject.startswith('Boost Cafe One')
+    assert body.startswith('Hi Cafe One Team,')
+    assert body.rstrip().endswith('www.pixelsolve.co')
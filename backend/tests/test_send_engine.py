@@ -0,0 +1,56 @@
+import asyncio
+
+import db
+from fakes import SMTPSink
+from rate_limit import SendScheduler
+from schema import MIGRATIONS
+from send_engine import Account, QuotaBook, SendEngine
+
+
+def test_quota_is_shared_by_every_process(tmp_path):
+    path = str(tmp_path / 'quota.db')
+    db.migrate(path, MIGRATIONS)
+    account = Account('me@example.com', 'secret', 'localhost', daily_quota=3)
+    first, second = QuotaBook(path), QuotaBook(path)  # e.g. the server and a CLI run
+    days = [first.try_take(account), second.try_take(account), first.try_take(account)]
+    assert all(days)
+    assert second.try_take(account) is None
+    second.give_back(account, days[0])
+    assert first.usage(account) == 2
+    assert second.try_take(account) == days[0]
+    assert first.try_take(account) is None
+
+
+def test_unlimited_account_still_counts(tmp_path):
+    path = str(tmp_path / 'quota.db')
+    db.migrate(path, MIGRATIONS)
+    account = Account('me@example.com', 'secret', 'localhost', daily_quota=0)
+    quota = QuotaBook(path)
+    assert all(quota.try_take(account) for _ in range(5))
+    assert quota.usage(account) == 5
+
+
+def test_provider_deferral_requeues_and_backs_off(tmp_path):
+    path = str(tmp_path / 'quota.db')
+    db.migrate(path, MIGRATIONS)
+    scheduler = SendScheduler(account_rate=1000, domain_rate=1000, backoff_base=30)
+    with SMTPSink(domain_limits={'example.com': 1}) as sink:
+        account = Account('me@example.com', 'secret', *sink.address, use_ssl=False, daily_quota=10)
+        engine = SendEngine([account], QuotaBook(path), scheduler)
+
+        async def send_three():
+            sessions = engine.sessions()
+            try:
+                return [await engine.deliver(sessions, f'lead{i}@example.com', 'Hi', 'Hello') for i in range(3)]
+            finally:
+                await sessions.close()
+
+        sent, deferred, held = asyncio.run(send_three())
+        engine.close_idle()
+    assert sent.outcome == 'sent'
+    assert (deferred.outcome, deferred.delay) == ('deferred', 30)
+    # The domain is paused for half the backoff: the next message isn't even tried
+    assert held.outcome == 'held' and 14 < held.delay <= 15
+    assert sink.stats['mail_from'] == 2
+    assert engine.quota.usage(account) == 1  # only the delivered message counts
+    assert scheduler.snapshot()['domains']['example.com'] < 1000
@@ -0,0 +1,25 @@
+import smtplib
+
+import pytest
+
+from fakes import SMTPSink
+from smtp_pool import SMTPPool
+
+
+def test_sessions_are_reused():
+    with SMTPSink() as sink:
+        pool = SMTPPool(*sink.address, 'me@example.com', 'secret', size=1, use_ssl=False)
+        for i in range(3):
+            pool.sendmail('me@example.com', [f'lead{i}@example.com'], 'Subject: hi\r\n\r\nhello')
+        pool.close_idle()
+    assert (sink.stats['connections'], sink.stats['logins'], sink.stats['messages']) == (1, 1, 3)
+    assert pool.stats['reuses'] == 2
+
+
+def test_plain_connection_upgrades_before_login():
+    with SMTPSink(starttls=True) as sink:
+        pool = SMTPPool(*sink.address, 'me@example.com', 'secret', size=1, use_ssl=False)
+        with pytest.raises(smtplib.SMTPResponseException):
+            pool.sendmail('me@example.com', ['lead@example.com'], 'Subject: hi\r\n\r\nhello')
+    assert sink.stats['starttls'] == 1
+    assert sink.stats['logins'] == 0
@@ -0,0 +1,40 @@
+import pytest
+
+from suppression import invalid_entries, is_mailbox_unknown
+
+
+def test_invalid_entries():
+    assert invalid_entries(['Ann+news@Example.com', "o'brien@x.ie", 'no-at-sign', 'a@b'],
+                           ['@Example.co.uk', 'localhost', 'bad domain.com']) == ['no-at-sign', 'a@b', 'localhost', 'bad domain.com']
+
+
+@pytest.mark.parametrize('code, error, unknown', [
+    (550, '5.1.1 <ann@example.com>: Recipient address rejected: User unknown', True),
+    (550, '5.7.1 Message rejected as spam', False),  # policy block: the mailbox may well exist
+    (553, 'mailbox name not allowed', True),
+    (550, 'Requested action not taken', False),
+    (452, '4.1.1 Mailbox temporarily unavailable', False),
+    (None, '5.1.1 User unknown', False),
+    (550, 'delivery to 10.5.1.2 failed', False),  # an IP address, not an enhanced status code
+])
+def test_is_mailbox_unknown(code, error, unknown):
+    assert is_mailbox_unknown(code, error) == unknown
+
+
+@pytest.mark.parametrize('body', [{'emails': 'ann@example.com'}, {'domains': 'example.com'}, {'emails': [1]}])
+def test_suppression_endpoints_require_lists_of_strings(client, body):
+    for method in (client.post, client.delete):
+        r = method('/api/suppressions', json=body)
+        assert r.status_code == 400
+    assert client.get('/api/suppressions').get_json()['total_addresses'] == 0
+
+
+def test_add_and_remove_suppressions(client):
+    r = client.post('/api/suppressions', json={'emails': ['ann@example.com', 'not an address']})
+    assert r.status_code == 400 and r.get_json()['invalid'] == ['not an address']
+    r = client.post('/api/suppressions', json={'emails': ['Ann@Example.com'], 'domains': ['@spam.example'], 'reason': 'unsubscribe'})
+    assert r.get_json() == {'added': 1, 'added_domains': 1}
+    blocked = client.post('/api/suppressions/check', json={'emails': ['ann@example.com', 'bob@spam.example', 'cy@ok.com']}).get_json()['blocked']
+    assert set(blocked) == {'ann@example.com', 'bob@spam.example'}
+    client.delete('/api/suppressions', json={'emails': ['ann@example.com'], 'domains': ['spam.example']})
+    assert client.post('/api/suppressions/check', json={'emails': ['ann@example.com', 'bob@spam.example']}).get_json()['blocked'] == {}
@@ -15,6 +15,16 @@ function extractSubjectAndBody(email) {
   return { subject, body };
 }
 
+// Merge one /api/progress/stream delta into the progress snapshot
+function applyProgressEvent(progress, event) {
+  if (event.type === 'state') return { ...progress, ...event.changes, seq: event.seq };
+  if (event.type === 'email') {
+    const prev = (progress.emails || {})[event.email] || {};
+    return { ...progress, emails: { ...progress.emails, [event.email]: { ...prev, ...event.data } }, seq: event.seq };
+  }
+  return progress;
+}
+
 function EmailSubject({ email }) {
   const { subject } = extractSubjectAndBody(email);
   return <span>{subject}</span>;
@@ -86,7 +96,7 @@ function App() {
   const [logs, setLogs] = useState([]);
   const [showLogs, setShowLogs] = useState(false);
   const [sending, setSending] = useState(false);
-  const intervalRef = useRef();
+  const eventSourceRef = useRef();
   const [uploadMsg, setUploadMsg] = useState('');
   const [showStats, setShowStats] = useState(false);
   const [batchSize, setBatchSize] = useState(10);
@@ -94,23 +104,33 @@ function App() {
   const [delayMax, setDelayMax] = useState(15);
   const [sessionId, setSessionId] = useState(null); // NEW: store session_id
 
-  // Poll progress
+  // Live progress: load one snapshot, then apply the deltas pushed over SSE, resuming from its seq
   useEffect(() => {
-    if (progress.status === 'generating' || progress.status === 'sending') {
-      intervalRef.current = setInterval(fetchProgress, 2000);
-    } else {
-      clearInterval(intervalRef.current);
+    if (!sessionId) return undefined;
+    let closed = false;
+    function connect() {
+      fetch(`${API_URL}/progress?session_id=${encodeURIComponent(sessionId)}`)
+        .then(res => res.json())
+        .then(snapshot => {
+          if (closed) return;
+          setProgress(snapshot);
+          const source = new EventSource(`${API_URL}/progress/stream?session_id=${encodeURIComponent(sessionId)}&since=${snapshot.seq || 0}`);
+          source.onmessage = e => setProgress(p => applyProgressEvent(p, JSON.parse(e.data)));
+          // Server dropped deltas we never saw: start over from a fresh snapshot
+          source.addEventListener('reset', () => {
+            source.close();
+            if (!closed) connect();
+          });
+          eventSourceRef.current = source;
+        })
+        .catch(() => {});
     }
-    return () => clearInterval(intervalRef.current);
-    // eslint-disable-next-line
-  }, [progress.status]);
-
-  function fetchProgress() {
-    fetch(`${API_URL}/progress`)
-      .then(res => res.json())
-      .then(setProgress)
-      .catch(() => {});
-  }
+    connect();
+    return () => {
+      closed = true;
+      if (eventSourceRef.current) eventSourceRef.current.close();
+    };
+  }, [sessionId]);
 
   function handleFileChange(e) {
     setFile(e.target.files[0]);
@@ -133,7 +153,6 @@ function App() {
         setUploadMsg(data.message || 'File uploaded. Generating emails...');
         setProgress({ ...progress, status: 'generating', filename: data.filename, message: data.message });
         setSessionId(data.session_id || null); // NEW: store session_id
-        fetchProgress();
       })
       .catch(() => setUploading(false));
   }
@@ -154,7 +173,6 @@ function App() {
       .then(() => {
         setSending(false);
         setProgress({ ...progress, status: 'sending' });
-        fetchProgress();
       })
       .catch(() => setSending(false));
   }
@@ -163,12 +181,10 @@ function App() {
     fetch(`${API_URL}/retry_failed`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ batch_size: batchSize, delay_min: delayMin, delay_max: delayMax })
+      body: JSON.stringify({ batch_size: batchSize, delay_min: delayMin, delay_max: delayMax, session_id: sessionId })
     })
       .then(res => res.json())
-      .then(() => {
-        fetchProgress();
-      });
+      .then(() => setProgress(p => ({ ...p, status: 'retrying' })));
   }
 
   function fetchLogs() {
@@ -187,7 +203,8 @@ function App() {
     ...data,
   }));
 
-  const allReady = progress.total > 0 && progress.done === progress.total && rows.every(r => r.status === 'Ready');
+  // While a sheet is still being parsed, done can briefly catch up with total
+  const allReady = progress.status !== 'generating' && progress.total > 0 && progress.done === progress.total && rows.every(r => r.status === 'Ready');
 
   let statusMsg = '';
   if (progress.status === 'generating') statusMsg = 'Generating emails...';
@@ -228,10 +245,10 @@ function App() {
           <input
             id="file-upload"
             type="file"
-            accept=".xlsx"
+            accept=".xlsx,.csv"
             onChange={handleFileChange}
           />
-          <button onClick={handleUpload} disabled={uploading || !file} className="btn-main" title="Upload your Excel file">
+          <button onClick={handleUpload} disabled={uploading || !file} className="btn-main" title="Upload your Excel or CSV file">
             {uploading ? 'Uploading...' : 'Upload Excel'}
           </button>
           {file && <span className="upload-filename">{file.name}</span>}